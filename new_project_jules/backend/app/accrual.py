@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Leave accrual engine.
+
+    python -m app.accrual --period 2026-10
+    python -m app.accrual            # current month, every tenant
+    python -m app.accrual --tenant acme
+
+Credits each active user's monthly accrual from their policy, and in January
+caps carried-over balances. Runs are idempotent per period, so the command can
+be repeated or resumed after a failure. The same run is available as the
+`accrual_task` background job.
+"""
+import argparse
+import typing as t
+from datetime import date, datetime
+
+from app.db import crud, schemas, tenancy
+from app.db.session import SessionLocal, tenants
+
+
+def parse_period(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def run_period(
+    period: str, chunk_size: int = crud.ACCRUAL_CHUNK_SIZE, tenant: t.Optional[str] = None
+) -> schemas.AccrualRun:
+    with tenancy.use(tenant or tenancy.current_tenant.get()), SessionLocal() as db:
+        return crud.run_accrual(db, parse_period(period), chunk_size=chunk_size)
+
+
+def parse_args(argv: t.Optional[t.List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Credit leave accruals for a period.")
+    parser.add_argument("--period", default=date.today().strftime("%Y-%m"), help="YYYY-MM (default: current month)")
+    parser.add_argument("--chunk-size", type=int, default=crud.ACCRUAL_CHUNK_SIZE, help="Users per transaction.")
+    parser.add_argument("--tenant", action="append", choices=tenants.names, help="Only this tenant (repeatable).")
+    args = parser.parse_args(argv)
+    try:
+        parse_period(args.period)
+    except ValueError:
+        parser.error("--period must be formatted as YYYY-MM")
+    return args
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    args = parse_args(argv)
+    for tenant in args.tenant or tenants.names:
+        result = run_period(args.period, chunk_size=args.chunk_size, tenant=tenant)
+        print(f"{tenant} {result.period}: credited {result.accrued} user(s), capped carry-over for {result.expired}")
+
+
+if __name__ == "__main__":
+    main()
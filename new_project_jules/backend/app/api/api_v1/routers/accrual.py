@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from datetime import date
+import typing as t
+
+from app import tasks
+from app.accrual import parse_period
+from app.db.session import get_db
+from app.db import crud, schemas, tenancy
+from app.core.auth import get_current_active_claims, get_current_active_superuser
+
+accrual_router = r = APIRouter()
+
+
+@r.get("/accrual/balance", response_model=schemas.AccrualBalance)
+async def my_accrual_balance(
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+):
+    """
+    The current user's accrued entitlement minus approved annual leave.
+    """
+    return crud.get_accrual_balance(db, current_user.id)
+
+
+@r.get("/admin/accrual/policies", response_model=t.List[schemas.AccrualPolicy])
+async def accrual_policies_list(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+):
+    """
+    Admin: List accrual policies.
+    """
+    return crud.get_accrual_policies(db)
+
+
+@r.post("/admin/accrual/policies", response_model=schemas.AccrualPolicy, status_code=201)
+async def accrual_policy_create(
+    policy: schemas.AccrualPolicyCreate,
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+):
+    """
+    Admin: Create an accrual policy. A new default replaces the previous one.
+    """
+    return crud.create_accrual_policy(db, policy)
+
+
+@r.post("/admin/accrual/runs", status_code=202)
+async def accrual_run(
+    period: t.Optional[str] = None,
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+):
+    """
+    Admin: Queue an accrual run for a YYYY-MM period (default: current month).
+    """
+    period = period or date.today().strftime("%Y-%m")
+    try:
+        parse_period(period)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="period must be formatted as YYYY-MM")
+    # Workers don't inherit the request context, so name the tenant explicitly.
+    tasks.enqueue("accrual_task", period=period, tenant=tenancy.current_tenant.get())
+    return {"period": period, "status": "queued"}
@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+import json
+import typing as t
+
+from app.db.session import get_db, tenants
+from app.db import crud, schemas, tenancy
+from app.core import audit
+from app.core.auth import get_current_active_superuser
+from app.api.dependencies.cursor import cursor_param, encode_cursor
+
+admin_router = r = APIRouter()
+
+
+@r.get("/admin/queue", response_model=schemas.QueuePage)
+async def admin_pending_queue(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    cursor: t.Optional[list] = Depends(cursor_param),
+    limit: int = Query(default=50, ge=1, le=200),
+):
+    """
+    Admin: Pending leave and WFH requests of all users, oldest first.
+    Follow next_cursor to page through the queue.
+    """
+    after = None
+    if cursor is not None:
+        try:
+            created_at, kind, item_id = cursor
+            after = (datetime.fromisoformat(created_at), str(kind), int(item_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    rows = crud.get_pending_queue(db, after=after, limit=limit)
+    items = [
+        schemas.QueueItem(
+            **{key: row[key] for key in schemas.QueueItem.model_fields if key != "owner"},
+            owner=schemas.QueueOwner(
+                id=row["user_id"],
+                email=row["email"],
+                first_name=row["first_name"],
+                last_name=row["last_name"],
+            ),
+        )
+        for row in rows
+    ]
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor([last.created_at.isoformat(), last.kind, last.id])
+    return schemas.QueuePage(items=items, next_cursor=next_cursor)
+
+
+@r.get("/admin/capacity", response_model=schemas.CapacityHeatmap)
+async def admin_capacity(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    start: date = Query(alias="from"),
+    end: date = Query(alias="to"),
+    group: str = "all",
+    include_pending: bool = False,
+    min_available: t.Optional[int] = Query(default=None, ge=0),
+):
+    """
+    Admin: Per-day leave/WFH headcounts for a group over a date range (at most 366 days).
+    group is "all" or "team:<manager_id>". Days with fewer than min_available people
+    not on leave are listed in shortfall.
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (end - start).days >= 366:
+        raise HTTPException(status_code=400, detail="Date range is limited to 366 days")
+    manager_id = None
+    if group != "all":
+        kind, _, value = group.partition(":")
+        if kind != "team" or not value.isdigit():
+            raise HTTPException(status_code=400, detail="group must be 'all' or 'team:<manager_id>'")
+        manager_id = int(value)
+    return crud.get_capacity(
+        db, start, end, manager_id=manager_id, include_pending=include_pending, min_available=min_available
+    )
+
+
+@r.get("/admin/tenants", response_model=t.List[schemas.TenantMetrics])
+async def admin_tenant_metrics(
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+):
+    """
+    Admin: Request, query and pool counters per tenant since the process started.
+    Admins of the default tenant see every tenant, others only their own.
+    """
+    tenant = tenancy.current_tenant.get()
+    names = tenants.names if tenant == tenancy.DEFAULT_TENANT else [tenant]
+    return [tenants.snapshot(name) for name in names]
+
+
+@r.get("/admin/audit", response_model=schemas.AuditPage)
+async def admin_audit_log(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    entity: t.Optional[t.Literal["leave", "wfh", "user"]] = None,
+    entity_id: t.Optional[int] = None,
+    actor_id: t.Optional[int] = None,
+    since: t.Optional[datetime] = None,
+    until: t.Optional[datetime] = None,
+    cursor: t.Optional[list] = Depends(cursor_param),
+    limit: int = Query(default=50, ge=1, le=200),
+):
+    """
+    Admin: Audit log entries, newest first. entity_id only applies together with entity.
+    """
+    before = None
+    if cursor is not None:
+        try:
+            occurred_at, entry_id = cursor
+            before = (datetime.fromisoformat(occurred_at), int(entry_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Include entries this process still holds in its write-behind buffer.
+    audit.buffer.flush()
+    rows = crud.get_audit_log(
+        db, entity=entity, entity_id=entity_id, actor_id=actor_id,
+        since=since, until=until, before=before, limit=limit,
+    )
+    items = [
+        schemas.AuditEntry(
+            id=row.id,
+            occurred_at=row.occurred_at,
+            actor_id=row.actor_id,
+            entity=row.entity,
+            entity_id=row.entity_id,
+            action=row.action,
+            changes=json.loads(row.changes),
+        )
+        for row in rows
+    ]
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor([last.occurred_at.isoformat(), last.id])
+    return schemas.AuditPage(items=items, next_cursor=next_cursor)
+
+
+@r.get("/admin/search", response_model=schemas.SearchPage)
+async def admin_search(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    q: str = Query(min_length=1, max_length=200),
+    kind: t.Optional[t.List[t.Literal["user", "leave", "wfh"]]] = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0, le=10000),
+):
+    """
+    Admin: Full-text search over user names and emails and leave/WFH comments,
+    best matches first. Every word must match, as a prefix. Repeat kind to
+    restrict the result to some of user, leave and wfh; follow next_offset to page.
+    """
+    return crud.search_documents(db, q, kinds=kind, limit=limit, offset=offset)
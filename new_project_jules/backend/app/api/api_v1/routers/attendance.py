@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+import typing as t
+
+from app.db.session import get_db
+from app.db import crud, models, schemas
+from app.core.auth import get_current_active_claims, get_current_active_superuser
+
+attendance_router = r = APIRouter()
+
+
+def _month_param(month: t.Optional[str] = Query(default=None, description="YYYY-MM, default: current month")) -> date:
+    if month is None:
+        return date.today().replace(day=1)
+    try:
+        return datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be formatted as YYYY-MM")
+
+
+def _sheet(db: Session, user_ids: t.List[int], month: date) -> schemas.AttendanceSheet:
+    codes = crud.get_attendance(db, user_ids, month)
+    return schemas.AttendanceSheet(
+        month=month.strftime("%Y-%m"),
+        legend=crud.ATTENDANCE_CODES,
+        rows=[schemas.AttendanceRow(user_id=user_id, codes=codes[user_id]) for user_id in user_ids],
+    )
+
+
+@r.get("/attendance", response_model=schemas.AttendanceSheet)
+async def my_attendance(
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+    month: date = Depends(_month_param),
+):
+    """
+    The current user's attendance for a month as one status code per day.
+    """
+    return _sheet(db, [current_user.id], month)
+
+
+@r.get("/admin/attendance", response_model=schemas.AttendanceSheet)
+async def admin_attendance(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    month: date = Depends(_month_param),
+    skip: int = 0,
+    limit: int = Query(default=100, le=500),
+):
+    """
+    Admin: Attendance of all users for a month, one row per user ordered by id.
+    """
+    user_ids = [
+        user_id for (user_id,) in
+        db.query(models.User.id).order_by(models.User.id).offset(skip).limit(limit)
+    ]
+    return _sheet(db, user_ids, month)
+
+
+@r.get("/holidays", response_model=t.List[schemas.Holiday])
+async def holidays_list(
+    db: Session = Depends(get_db),
+    year: t.Optional[int] = None,
+):
+    """
+    Public holidays of a year (default: current year).
+    """
+    return crud.get_holidays(db, year or date.today().year)
+
+
+@r.post("/admin/holidays", response_model=schemas.Holiday, status_code=201)
+async def holiday_create(
+    holiday: schemas.HolidayCreate,
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+):
+    """
+    Admin: Add a public holiday.
+    """
+    return crud.create_holiday(db, holiday)
+
+
+@r.delete("/admin/holidays/{holiday_id}", response_model=schemas.Holiday)
+async def holiday_delete(
+    holiday_id: int,
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+):
+    """
+    Admin: Remove a public holiday.
+    """
+    return crud.delete_holiday(db, holiday_id)
@@ -3,7 +3,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 
 from app.db.session import get_db
-from app.db import schemas # Added import
+from app.db import schemas, tenancy # Added import
 from app.core import security
 from app.core.auth import authenticate_user, sign_up_new_user
 
@@ -31,7 +31,13 @@ async def login(
     else:
         permissions = "user"
     access_token = security.create_access_token(
-        data={"sub": user.email, "permissions": permissions},
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "permissions": permissions,
+            "ver": user.token_version or 0,
+            "tid": tenancy.current_tenant.get(),
+        },
         expires_delta=access_token_expires,
     )
     return schemas.Token(access_token=access_token, token_type="bearer")
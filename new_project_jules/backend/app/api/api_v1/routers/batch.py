@@ -0,0 +1,204 @@
+"""
+POST /batch: many API operations in one HTTP request.
+
+Each operation names a method and path of the regular API and runs as an
+in-process sub-request through the app's own route: the same dependencies,
+validation, permission checks, errors and headers as when it is called
+directly, with the batch's Authorization header, whose token is decoded and
+checked against revocation once for the whole batch. The sub-requests share the
+batch's database session, and each gets its own status, body and headers
+(ETag, Location, Content-Range) in the results, in order. By default every
+write commits on its own and a failed operation doesn't stop the others; with
+atomic=true the batch is one transaction, and the first failure rolls back
+every write (the other operations then report 424).
+
+A run of consecutive get-by-id reads (e.g. GET /admin/leaves/{id} per row)
+is served by one IN query per table instead of one query each; a write in
+between ends the run, so reads still see the writes listed before them.
+"""
+import json
+import typing as t
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.routing import Match
+
+from app.core import config
+from app.core.auth import RESOLVED_CLAIMS, get_current_active_claims
+from app.db import crud, models, schemas
+from app.db.session import SHARED_SESSION, get_db, deferred_commit
+
+batch_router = r = APIRouter()
+
+# Not available in a batch: nested batches and long-lived event streams.
+_EXCLUDED = {f"{config.API_V1_STR}/batch", f"{config.API_V1_STR}/events"}
+
+# Get-by-id routes (their crud getters use db.get) and their models, for
+# loading a run of them at once.
+_BY_ID = {
+    f"{config.API_V1_STR}/leaves/{{leave_id}}": (models.Leave, "leave_id"),
+    f"{config.API_V1_STR}/admin/leaves/{{leave_id}}": (models.Leave, "leave_id"),
+    f"{config.API_V1_STR}/wfh/{{wfh_id}}": (models.WFH, "wfh_id"),
+    f"{config.API_V1_STR}/admin/wfh/{{wfh_id}}": (models.WFH, "wfh_id"),
+}
+
+# Request headers passed on to every operation, and response headers kept.
+_FORWARDED_HEADERS = {b"authorization", b"accept-language", b"user-agent"}
+RESULT_HEADERS = ("etag", "location", "content-range")
+
+
+def _sub_scope(
+    request: Request, operation: schemas.BatchOperation, db: Session, claims: schemas.TokenData,
+) -> t.Optional[dict]:
+    url = urlsplit(operation.path)
+    path = url.path
+    if not path.startswith(config.API_V1_STR + "/"):
+        path = config.API_V1_STR + path
+    if path in _EXCLUDED:
+        return None
+    headers = [(name, value) for name, value in request.scope["headers"] if name in _FORWARDED_HEADERS]
+    if operation.body is not None:
+        headers.append((b"content-type", b"application/json"))
+    if operation.if_match is not None:
+        headers.append((b"if-match", operation.if_match.encode("latin-1")))
+    # The batch request's scope (app, tenant, exception handlers) with this operation's request line.
+    scope = {key: value for key, value in request.scope.items() if key not in ("route", "endpoint", "path_params")}
+    scope.update(
+        method=operation.method, path=path, raw_path=path.encode(), query_string=url.query.encode("latin-1"),
+        headers=headers,
+    )
+    scope[SHARED_SESSION] = db
+    scope[RESOLVED_CLAIMS] = claims
+    return scope
+
+
+def _by_id(request: Request, scope: t.Optional[dict]) -> t.Optional[t.Tuple[t.Any, int]]:
+    """The (model, id) a get-by-id operation reads, or None for any other operation."""
+    if scope is None or scope["method"] != "GET":
+        return None
+    for route in request.app.router.routes:
+        match, child = route.matches(scope)
+        if match == Match.FULL:
+            target = _BY_ID.get(getattr(route, "path", None))
+            value = child["path_params"].get(target[1]) if target else None
+            return (target[0], int(value)) if value is not None and value.isdigit() else None
+    return None
+
+
+def _prefetch(request: Request, db: Session, scopes: t.List[t.Optional[dict]], start: int) -> list:
+    # Load the get-by-id reads from start up to the next write with one IN
+    # query per table; the routes then find their rows in the identity map,
+    # which only holds them as long as the caller keeps the returned list.
+    wanted: t.Dict[t.Any, t.List[int]] = {}
+    for scope in scopes[start:]:
+        if scope is not None and scope["method"] != "GET":
+            break
+        target = _by_id(request, scope)
+        if target is not None:
+            wanted.setdefault(target[0], []).append(target[1])
+    rows = []
+    for model, ids in wanted.items():
+        if len(ids) > 1:
+            rows += crud.get_by_ids(db, model, list(dict.fromkeys(ids)))
+    return rows
+
+
+async def _dispatch(request: Request, scope: dict, body: bytes) -> t.Tuple[int, t.Dict[str, str], t.Any]:
+    """Run one sub-request through the app's routes: (status, result headers, body)."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    status, raw_headers, chunks = 500, [], []
+
+    async def send(message):
+        nonlocal status, raw_headers
+        if message["type"] == "http.response.start":
+            status, raw_headers = message["status"], message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await request.app.router(scope, receive, send)
+    except StarletteHTTPException as e:
+        # Raised by the router itself (no route, or not this method).
+        return e.status_code, {}, {"detail": e.detail}
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in raw_headers}
+    content = b"".join(chunks)
+    if not content:
+        payload = None
+    elif headers.get("content-type", "").startswith("application/json"):
+        payload = json.loads(content)
+    else:
+        payload = content.decode("utf-8", "replace")
+    return status, {name: headers[name] for name in RESULT_HEADERS if name in headers}, payload
+
+
+class _Abort(Exception):
+    pass
+
+
+@r.post("/batch", response_model=schemas.BatchResponse)
+async def batch(
+    batch_request: schemas.BatchRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+):
+    """
+    Run up to BATCH_MAX_OPERATIONS API operations in order, each with its own
+    status, body and headers, exactly as the API answers them on their own.
+    With atomic, the operations run in one transaction.
+    """
+    operations = batch_request.operations
+    if not operations:
+        raise HTTPException(status_code=400, detail="operations must not be empty")
+    if len(operations) > config.BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {config.BATCH_MAX_OPERATIONS} operations per batch")
+
+    scopes = [_sub_scope(request, operation, db, current_user) for operation in operations]
+    results: t.List[t.Optional[schemas.BatchResult]] = [None] * len(operations)
+
+    async def run(index: int) -> bool:
+        operation, scope = operations[index], scopes[index]
+        if scope is None:
+            results[index] = schemas.BatchResult(
+                id=operation.id, status=400, body={"detail": "Not available in a batch"},
+            )
+            return False
+        body = json.dumps(operation.body).encode() if operation.body is not None else b""
+        status, headers, payload = await _dispatch(request, scope, body)
+        results[index] = schemas.BatchResult(id=operation.id, status=status, body=payload, headers=headers)
+        return status < 400
+
+    async def run_all(atomic: bool) -> None:
+        reading, prefetched = False, []
+        for index, operation in enumerate(operations):
+            is_read = operation.method == "GET"
+            if is_read and not reading:
+                prefetched = _prefetch(request, db, scopes, index)  # Held for the run of reads
+            reading = is_read
+            if not await run(index):
+                if atomic:
+                    raise _Abort(index)
+                if not is_read:
+                    db.rollback()
+
+    if not batch_request.atomic:
+        await run_all(atomic=False)
+    else:
+        try:
+            with deferred_commit(db):
+                await run_all(atomic=True)
+        except _Abort as e:
+            (failed,) = e.args
+            for index, operation in enumerate(operations):
+                if index != failed:
+                    results[index] = schemas.BatchResult(
+                        id=operation.id, status=424,
+                        body={"detail": f"Not applied: operation {failed} failed and the batch was rolled back"},
+                    )
+    return schemas.BatchResponse(results=results)
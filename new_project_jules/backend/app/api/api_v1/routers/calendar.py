@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+
+from app.db import session, tenancy
+from app.db.session import get_db
+from app.db import crud, schemas
+from app.core import calendar, compression, config, revocation
+from app.core.auth import get_current_active_claims
+
+calendar_router = r = APIRouter()
+
+
+def _not_modified(request: Request, feed: calendar.Feed) -> bool:
+    # If-None-Match wins over If-Modified-Since when both are sent.
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or feed.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return feed.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@r.get("/calendar/{token}.ics", name="calendar_feed", response_class=Response)
+async def calendar_feed(token: str, request: Request, db: Session = Depends(get_db)):
+    """
+    iCalendar feed of approved leave and WFH. The signed token in the URL is the
+    only credential; get one from /calendar/links.
+    """
+    claims = calendar.read_token(token)
+    if claims is None or claims[3] not in session.tenants:
+        raise HTTPException(status_code=404, detail="Calendar not found")
+    kind, owner_id, version, tenant = claims
+    # The token, not the host, says whose database this feed comes from.
+    db.info["tenant"] = tenant
+    with tenancy.use(tenant):
+        entry = revocation.lookup(db, owner_id)
+    if entry is None or entry != (version, True):
+        raise HTTPException(status_code=404, detail="Calendar not found")
+
+    key = (tenant, kind, owner_id)
+    feed = calendar.cache.get(key)
+    if feed is None:
+        team = kind == "team"
+        since = date.today() - timedelta(days=config.CALENDAR_HISTORY_DAYS)
+        rows = crud.get_calendar_rows(db, owner_id, team=team, since=since)
+        members = crud.get_group_member_ids(db, owner_id) if team else [owner_id]
+        name = "Team leave" if team else "My leave"
+        feed = calendar.cache.put(key, calendar.render(rows, name, team), members)
+
+    headers = {
+        "ETag": feed.etag,
+        "Last-Modified": format_datetime(feed.last_modified, usegmt=True),
+        "Cache-Control": f"private, max-age={config.CALENDAR_CACHE_TTL_SECONDS}",
+    }
+    encoding = compression.negotiate(request.headers.get("accept-encoding"))
+    if encoding is not None and len(feed.body) < config.COMPRESSION_MIN_SIZE:
+        encoding = None
+    if encoding is not None:
+        headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding", "ETag": "W/" + feed.etag})
+    if _not_modified(request, feed):
+        return Response(status_code=304, headers=headers)
+    # Served precompressed from the cache; the middleware leaves encoded responses alone.
+    body = feed.encoded(encoding) if encoding is not None else feed.body
+    return Response(content=body, media_type="text/calendar; charset=utf-8", headers=headers)
+
+
+@r.get("/calendar/links", response_model=schemas.CalendarLinks)
+async def calendar_links(
+    request: Request,
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+):
+    """
+    Subscription URLs for the current user's own calendar and their team's.
+    They stop working when the password changes.
+    """
+    tenant = tenancy.current_tenant.get()
+    return schemas.CalendarLinks(**{
+        name: str(request.url_for(
+            "calendar_feed", token=calendar.make_token(kind, current_user.id, current_user.version, tenant)
+        ))
+        for name, kind in (("personal", "user"), ("team", "team"))
+    })
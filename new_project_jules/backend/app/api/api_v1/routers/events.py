@@ -0,0 +1,113 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+import typing as t
+
+from app.db.session import get_db, SessionLocal
+from app.db import schemas
+from app.core import events
+from app.core.auth import get_current_claims, get_current_active_claims
+
+events_router = r = APIRouter()
+
+# EventSource and browser WebSockets cannot set an Authorization header, so the
+# token may also be passed as ?access_token=.
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token", auto_error=False)
+
+HEARTBEAT_SECONDS = 15
+
+
+async def get_stream_claims(
+    db=Depends(get_db),
+    header_token: t.Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: t.Optional[str] = Query(default=None),
+) -> schemas.TokenData:
+    token = header_token or access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    claims = await get_current_claims(db=db, token=token)
+    return await get_current_active_claims(db=db, claims=claims)
+
+
+def _subscribe(claims: schemas.TokenData, scope: str) -> events.Subscription:
+    if scope == "admin":
+        if claims.permissions != "admin":
+            raise HTTPException(
+                status_code=403, detail="The user doesn't have enough privileges"
+            )
+        return events.broker.subscribe(admin=True)
+    return events.broker.subscribe(user_id=claims.id)
+
+
+@r.get("/events")
+async def event_stream(
+    claims: schemas.TokenData = Depends(get_stream_claims),
+    scope: str = Query(default="user", pattern="^(user|admin)$"),
+):
+    """
+    Server-sent events for leave and WFH changes.
+    scope=user streams the caller's own requests; scope=admin (superusers only) streams every change.
+    """
+    sub = _subscribe(claims, scope)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = await sub.get(timeout=HEARTBEAT_SECONDS)
+                if sub.overflowed:
+                    sub.overflowed = False
+                    yield "event: resync\ndata: {}\n\n"
+                if event is None:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event.entity}\ndata: {event.to_json()}\n\n"
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@r.websocket("/events/ws")
+async def event_socket(
+    websocket: WebSocket,
+    access_token: str = Query(...),
+    scope: str = Query(default="user", pattern="^(user|admin)$"),
+):
+    """
+    WebSocket variant of /events. Messages are the same JSON change events;
+    {"type": "resync"} asks the client to refetch.
+    """
+    db = SessionLocal()
+    try:
+        claims = await get_stream_claims(db=db, header_token=None, access_token=access_token)
+        sub = _subscribe(claims, scope)
+    except HTTPException as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc.detail))
+        return
+    finally:
+        db.close()
+
+    await websocket.accept()
+    try:
+        while True:
+            event = await sub.get(timeout=HEARTBEAT_SECONDS)
+            if sub.overflowed:
+                sub.overflowed = False
+                await websocket.send_text('{"type":"resync"}')
+            if event is None:
+                await websocket.send_text('{"type":"ping"}')
+                continue
+            await websocket.send_text(event.to_json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sub.close()
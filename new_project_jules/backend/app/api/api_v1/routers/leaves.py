@@ -1,46 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 import typing as t
 
 from app.db.session import get_db
-from app.db import crud, schemas
-from app.core.auth import get_current_active_user, get_current_active_superuser
-from app.db.models import User
+from app.db import crud, models, schemas
+from app.core.auth import get_current_active_claims, get_current_active_superuser
+from app.api.dependencies.etag import if_match_version, set_etag
+from app.api.dependencies.ids import parse_ids
+from app.api.dependencies.fields import fields_param, sparse_response
 
 leaves_router = r = APIRouter()
 
+leave_fields = fields_param(schemas.Leave)
+
 # Regular user endpoints (prefixed with /user for clarity, or keep as is if preferred)
 
 @r.post("/leaves", response_model=schemas.Leave, status_code=201)
 async def create_leave_request_for_self(
     leave_in: schemas.LeaveCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
 ):
     """
     Create a new leave request for the current user.
+    Requests that break a policy (see /leaves/validate) are rejected with 422.
+    """
+    if leave_in.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="user_id in payload must match authenticated user.")
+    return crud.create_user_leave(db=db, leave=leave_in, user_id=current_user.id, enforce="user")
+
+@r.post("/leaves/validate", response_model=schemas.PolicyReport)
+async def validate_leave_request_for_self(
+    leave_in: schemas.LeaveCreate,
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+):
+    """
+    Check a leave request against the leave policies without creating it.
+    Reports every violated rule at once.
     """
     if leave_in.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="user_id in payload must match authenticated user.")
-    return crud.create_user_leave(db=db, leave=leave_in, user_id=current_user.id)
+    return crud.validate_request(db, models.Leave, leave_in.model_dump(exclude={"user_id"}), current_user.id)
 
 @r.get("/leaves", response_model=t.List[schemas.Leave])
 async def get_my_leave_requests(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
     skip: int = 0,
     limit: int = Query(default=100, lte=100),
+    fields: t.Optional[t.FrozenSet[str]] = Depends(leave_fields),
 ):
     """
     Get all leave requests for the current user.
+    Pass fields (e.g. id,from_date,to_date,status) to get only those.
     """
-    return crud.get_user_leaves(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    rows = crud.get_user_leaves(db=db, user_id=current_user.id, skip=skip, limit=limit, columns=fields)
+    return sparse_response(schemas.Leave, fields, rows)
 
 @r.get("/leaves/{leave_id}", response_model=schemas.Leave)
 async def get_leave_request(
     leave_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
 ):
     """
     Get a specific leave request by ID for the current user.
@@ -48,45 +71,44 @@ async def get_leave_request(
     leave = crud.get_leave(db=db, leave_id=leave_id, user_id=current_user.id)
     if not leave:
         raise HTTPException(status_code=404, detail="Leave request not found")
+    set_etag(response, leave.version)
     return leave
 
 @r.put("/leaves/{leave_id}", response_model=schemas.Leave)
 async def update_leave_request(
     leave_id: int,
     leave_in: schemas.LeaveEdit,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+    expected_version: t.Optional[int] = Depends(if_match_version),
 ):
     """
     Update a specific leave request by ID for the current user.
     Only certain fields can be updated, and status updates might be restricted based on business logic (not implemented here).
+    Send the ETag from a previous GET as If-Match to get a 412 instead of overwriting a concurrent change.
     """
-    # Ensure the leave exists and belongs to the user before attempting update
-    existing_leave = crud.get_leave(db=db, leave_id=leave_id, user_id=current_user.id)
-    if not existing_leave:
-        raise HTTPException(status_code=404, detail="Leave request not found or not owned by user")
-
     # Prevent user from updating user_id if it's part of LeaveEdit schema
     if hasattr(leave_in, 'user_id') and leave_in.user_id is not None and leave_in.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Cannot change ownership of the leave request.")
 
-    return crud.update_leave(db=db, leave_id=leave_id, leave_update=leave_in, user_id=current_user.id)
+    updated_leave = crud.update_leave(
+        db=db, leave_id=leave_id, leave_update=leave_in, user_id=current_user.id, expected_version=expected_version,
+        enforce="user",
+    )
+    set_etag(response, updated_leave.version)
+    return updated_leave
 
 @r.delete("/leaves/{leave_id}", response_model=schemas.Leave)
 async def delete_leave_request(
     leave_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
 ):
     """
     Delete a specific leave request by ID for the current user.
     Deletion might be restricted based on status (e.g., cannot delete an approved leave - not implemented here).
     """
-    # Ensure the leave exists and belongs to the user before attempting deletion
-    existing_leave = crud.get_leave(db=db, leave_id=leave_id, user_id=current_user.id)
-    if not existing_leave:
-        raise HTTPException(status_code=404, detail="Leave request not found or not owned by user")
-
     return crud.delete_leave(db=db, leave_id=leave_id, user_id=current_user.id)
 
 
@@ -96,7 +118,7 @@ async def delete_leave_request(
 async def admin_create_leave_for_user(
     leave_in: schemas.LeaveCreate, # Contains user_id for target user
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
 ):
     """
     Admin: Create a new leave request for a specified user.
@@ -107,29 +129,47 @@ async def admin_create_leave_for_user(
     if not user:
         raise HTTPException(status_code=404, detail=f"User with id {leave_in.user_id} not found.")
     # The user_id from the payload (leave_in.user_id) is passed to crud.create_user_leave
-    return crud.create_user_leave(db=db, leave=leave_in, user_id=leave_in.user_id)
+    return crud.create_user_leave(db=db, leave=leave_in, user_id=leave_in.user_id, enforce="admin")
 
 @r.get("/admin/users/{user_id}/leaves", response_model=t.List[schemas.Leave], tags=["admin"])
 async def admin_get_user_leave_requests(
     user_id: int,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
     skip: int = 0,
     limit: int = Query(default=100, lte=100),
+    fields: t.Optional[t.FrozenSet[str]] = Depends(leave_fields),
 ):
     """
     Admin: Get all leave requests for a specific user.
+    Pass fields to get only those.
     """
     user = crud.get_user(db, user_id) # Validate user exists
     if not user:
         raise HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
-    return crud.get_user_leaves(db=db, user_id=user_id, skip=skip, limit=limit)
+    rows = crud.get_user_leaves(db=db, user_id=user_id, skip=skip, limit=limit, columns=fields)
+    return sparse_response(schemas.Leave, fields, rows)
+
+@r.get("/admin/leaves", response_model=t.List[schemas.Leave], tags=["admin"])
+async def admin_get_leave_requests_by_ids(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    ids: str = Query(description="Comma-separated ids, e.g. 1,2,3"),
+    fields: t.Optional[t.FrozenSet[str]] = Depends(leave_fields),
+):
+    """
+    Admin: Get several leave requests in one call, in the order of ids.
+    Ids that don't exist are left out.
+    """
+    rows = crud.get_by_ids(db, models.Leave, parse_ids(ids), columns=fields)
+    return sparse_response(schemas.Leave, fields, rows)
 
 @r.get("/admin/leaves/{leave_id}", response_model=schemas.Leave, tags=["admin"])
 async def admin_get_leave_request_by_id(
     leave_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
 ):
     """
     Admin: Get a specific leave request by its ID.
@@ -137,32 +177,39 @@ async def admin_get_leave_request_by_id(
     leave = crud.get_leave_by_id_admin(db=db, leave_id=leave_id)
     if not leave:
         raise HTTPException(status_code=404, detail="Leave request not found")
+    set_etag(response, leave.version)
     return leave
 
 @r.put("/admin/leaves/{leave_id}", response_model=schemas.Leave, tags=["admin"])
 async def admin_update_leave_request(
     leave_id: int,
     leave_in: schemas.LeaveEdit,
+    response: Response,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    expected_version: t.Optional[int] = Depends(if_match_version),
 ):
     """
     Admin: Update a specific leave request by its ID.
+    Honours If-Match like the user endpoint.
     """
     # crud.update_leave_admin will fetch the leave by ID and update it.
     # It also handles the case where the leave doesn't exist.
     # Note: LeaveEdit schema does not (and should not) contain user_id to change ownership.
     # If changing user_id was a requirement, the schema and logic would need adjustment.
-    updated_leave = crud.update_leave_admin(db=db, leave_id=leave_id, leave_update=leave_in)
+    updated_leave = crud.update_leave_admin(
+        db=db, leave_id=leave_id, leave_update=leave_in, expected_version=expected_version, enforce="admin"
+    )
     if not updated_leave: # Should be handled by HTTPException in crud if not found
         raise HTTPException(status_code=404, detail="Leave request not found or failed to update")
+    set_etag(response, updated_leave.version)
     return updated_leave
 
 @r.delete("/admin/leaves/{leave_id}", response_model=schemas.Leave, tags=["admin"])
 async def admin_delete_leave_request(
     leave_id: int,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
 ):
     """
     Admin: Delete a specific leave request by its ID.
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import date
+import typing as t
+
+from app.db.session import get_db
+from app.db import crud, schemas
+from app.core.auth import get_current_active_claims
+
+team_router = r = APIRouter()
+
+
+def _resolve_manager(current_user: schemas.TokenData, manager_id: t.Optional[int]) -> int:
+    # Everyone sees their own reporting subtree; admins may look at anyone's.
+    if manager_id is None or manager_id == current_user.id:
+        return current_user.id
+    if current_user.permissions != "admin":
+        raise HTTPException(status_code=403, detail="The user doesn't have enough privileges")
+    return manager_id
+
+
+@r.get("/team/leaves", response_model=t.List[schemas.Leave])
+async def team_leave_requests(
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+    manager_id: t.Optional[int] = None,
+    skip: int = 0,
+    limit: int = Query(default=100, le=500),
+):
+    """
+    Leave requests of everyone reporting (directly or indirectly) to the current user,
+    or to manager_id for admins.
+    """
+    manager = _resolve_manager(current_user, manager_id)
+    return crud.get_team_leaves(db, manager, skip=skip, limit=limit)
+
+
+@r.get("/team/wfh", response_model=t.List[schemas.WFH])
+async def team_wfh_requests(
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+    manager_id: t.Optional[int] = None,
+    skip: int = 0,
+    limit: int = Query(default=100, le=500),
+):
+    """
+    WFH requests of everyone in the current user's (or manager_id's) reporting subtree.
+    """
+    manager = _resolve_manager(current_user, manager_id)
+    return crud.get_team_wfhs(db, manager, skip=skip, limit=limit)
+
+
+@r.get("/team/availability", response_model=schemas.TeamAvailability)
+async def team_availability(
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+    manager_id: t.Optional[int] = None,
+    on: t.Optional[date] = Query(default=None, alias="date"),
+):
+    """
+    Who in the reporting subtree is on approved leave or WFH on a given date (default: today).
+    """
+    manager = _resolve_manager(current_user, manager_id)
+    return crud.get_team_availability(db, manager, on or date.today())
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import date
+import typing as t
+
+from app.db.session import get_db
+from app.db import crud, schemas
+from app.core.auth import get_current_active_claims, get_current_active_superuser
+from app.api.dependencies.cursor import cursor_param, encode_cursor
+
+timeline_router = r = APIRouter()
+
+
+def _timeline_page(
+    db: Session,
+    user_id: int,
+    window_start: t.Optional[date],
+    window_end: t.Optional[date],
+    cursor: t.Optional[list],
+    limit: int,
+) -> schemas.TimelinePage:
+    after = None
+    if cursor is not None:
+        try:
+            from_date, kind, item_id = cursor
+            after = (date.fromisoformat(from_date), str(kind), int(item_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    if window_start and window_end and window_start > window_end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+    rows = crud.get_user_timeline(
+        db, user_id, window_start=window_start, window_end=window_end, after=after, limit=limit
+    )
+    items = [
+        schemas.TimelineItem(**{**row, "status": row["status"].value})
+        for row in rows
+    ]
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor([last.from_date.isoformat(), last.kind, last.id])
+    return schemas.TimelinePage(items=items, next_cursor=next_cursor)
+
+
+@r.get("/timeline", response_model=schemas.TimelinePage)
+async def my_timeline(
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+    window_start: t.Optional[date] = Query(default=None, alias="from"),
+    window_end: t.Optional[date] = Query(default=None, alias="to"),
+    cursor: t.Optional[list] = Depends(cursor_param),
+    limit: int = Query(default=100, ge=1, le=500),
+):
+    """
+    Leave and WFH requests of the current user as one date-ordered stream.
+    from/to restrict it to requests overlapping that window.
+    """
+    return _timeline_page(db, current_user.id, window_start, window_end, cursor, limit)
+
+
+@r.get("/admin/users/{user_id}/timeline", response_model=schemas.TimelinePage, tags=["admin"])
+async def admin_user_timeline(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    window_start: t.Optional[date] = Query(default=None, alias="from"),
+    window_end: t.Optional[date] = Query(default=None, alias="to"),
+    cursor: t.Optional[list] = Depends(cursor_param),
+    limit: int = Query(default=100, ge=1, le=500),
+):
+    """
+    Admin: Timeline of a specific user.
+    """
+    return _timeline_page(db, user_id, window_start, window_end, cursor, limit)
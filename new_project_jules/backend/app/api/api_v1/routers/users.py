@@ -1,19 +1,27 @@
-from fastapi import APIRouter, Request, Depends, Response, encoders
+from fastapi import APIRouter, Request, Depends, Query, Response, encoders
 import typing as t
 
 from app.db.session import get_db
 from app.db.crud import (
     get_users,
+    get_by_ids,
+    count_users,
+    lookup_users,
     get_user,
     create_user,
     delete_user,
     edit_user,
 )
-from app.db.schemas import UserCreate, UserEdit, User, UserOut
+from app.db.models import User as UserModel
+from app.db.schemas import UserCreate, UserEdit, User, UserLookup, UserOut
 from app.core.auth import get_current_active_user, get_current_active_superuser
+from app.api.dependencies.ids import ids_param
+from app.api.dependencies.fields import fields_param, sparse_response
 
 users_router = r = APIRouter()
 
+user_fields = fields_param(User)
+
 
 @r.get(
     "/users",
@@ -24,14 +32,43 @@ async def users_list(
     response: Response,
     db=Depends(get_db),
     current_user=Depends(get_current_active_superuser),
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=500),
+    ids: t.Optional[t.List[int]] = Depends(ids_param),
+    fields: t.Optional[t.FrozenSet[str]] = Depends(user_fields),
+):
+    """
+    Get users by id, a page at a time, or just the users listed in ids.
+    Pass fields (e.g. id,email,first_name,last_name) to get only those.
+    """
+    if ids is not None:
+        users = get_by_ids(db, UserModel, ids, columns=fields)
+        content_range = f"0-{len(users) - 1}/{len(users)}" if users else "*/0"
+    else:
+        users = get_users(db, skip=skip, limit=limit, columns=fields)
+        # This is necessary for react-admin to work: the page's range and the total.
+        shown = f"{skip}-{skip + len(users) - 1}" if users else "*"
+        content_range = f"{shown}/{count_users(db)}"
+    if fields is not None:
+        # A Response returned as is doesn't carry headers set on `response`.
+        response = sparse_response(User, fields, users, exclude_none=True)
+    response.headers["Content-Range"] = content_range
+    return users if fields is None else response
+
+
+@r.get("/users/lookup", response_model=t.List[UserLookup], response_model_exclude_none=True)
+async def users_lookup(
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_superuser),
+    prefix: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+    include_inactive: bool = False,
 ):
     """
-    Get all users
+    Typeahead: users whose email, first name or last name starts with prefix
+    (case-insensitive), or whose name starts with "first last"
     """
-    users = get_users(db)
-    # This is necessary for react-admin to work
-    response.headers["Content-Range"] = f"0-9/{len(users)}"
-    return users
+    return lookup_users(db, prefix, limit=limit, include_inactive=include_inactive)
 
 
 @r.get("/users/me", response_model=User, response_model_exclude_none=True)
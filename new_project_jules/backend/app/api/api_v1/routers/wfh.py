@@ -1,46 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 import typing as t
 
 from app.db.session import get_db
-from app.db import crud, schemas
-from app.core.auth import get_current_active_user, get_current_active_superuser
-from app.db.models import User
+from app.db import crud, models, schemas
+from app.core.auth import get_current_active_claims, get_current_active_superuser
+from app.api.dependencies.etag import if_match_version, set_etag
+from app.api.dependencies.ids import parse_ids
+from app.api.dependencies.fields import fields_param, sparse_response
 
 wfh_router = r = APIRouter()
 
+wfh_fields = fields_param(schemas.WFH)
+
 # Regular user endpoints
 
 @r.post("/wfh", response_model=schemas.WFH, status_code=201)
 async def create_wfh_request_for_self(
     wfh_in: schemas.WFHCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
 ):
     """
     Create a new WFH request for the current user.
+    Requests that break a policy (see /wfh/validate) are rejected with 422.
+    """
+    if wfh_in.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="user_id in payload must match authenticated user.")
+    return crud.create_user_wfh(db=db, wfh=wfh_in, user_id=current_user.id, enforce="user")
+
+@r.post("/wfh/validate", response_model=schemas.PolicyReport)
+async def validate_wfh_request_for_self(
+    wfh_in: schemas.WFHCreate,
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+):
+    """
+    Check a WFH request against the policies without creating it.
+    Reports every violated rule at once.
     """
     if wfh_in.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="user_id in payload must match authenticated user.")
-    return crud.create_user_wfh(db=db, wfh=wfh_in, user_id=current_user.id)
+    return crud.validate_request(db, models.WFH, wfh_in.model_dump(exclude={"user_id"}), current_user.id)
 
 @r.get("/wfh", response_model=t.List[schemas.WFH])
 async def get_my_wfh_requests(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
     skip: int = 0,
     limit: int = Query(default=100, lte=100),
+    fields: t.Optional[t.FrozenSet[str]] = Depends(wfh_fields),
 ):
     """
     Get all WFH requests for the current user.
+    Pass fields (e.g. id,from_date,to_date,status) to get only those.
     """
-    return crud.get_user_wfhs(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    rows = crud.get_user_wfhs(db=db, user_id=current_user.id, skip=skip, limit=limit, columns=fields)
+    return sparse_response(schemas.WFH, fields, rows)
 
 @r.get("/wfh/{wfh_id}", response_model=schemas.WFH)
 async def get_wfh_request(
     wfh_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
 ):
     """
     Get a specific WFH request by ID for the current user.
@@ -48,40 +71,41 @@ async def get_wfh_request(
     wfh = crud.get_wfh(db=db, wfh_id=wfh_id, user_id=current_user.id)
     if not wfh:
         raise HTTPException(status_code=404, detail="WFH request not found")
+    set_etag(response, wfh.version)
     return wfh
 
 @r.put("/wfh/{wfh_id}", response_model=schemas.WFH)
 async def update_wfh_request(
     wfh_id: int,
     wfh_in: schemas.WFHEdit,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
+    expected_version: t.Optional[int] = Depends(if_match_version),
 ):
     """
     Update a specific WFH request by ID for the current user.
+    Send the ETag from a previous GET as If-Match to get a 412 instead of overwriting a concurrent change.
     """
-    existing_wfh = crud.get_wfh(db=db, wfh_id=wfh_id, user_id=current_user.id)
-    if not existing_wfh:
-        raise HTTPException(status_code=404, detail="WFH request not found or not owned by user")
-
     if hasattr(wfh_in, 'user_id') and wfh_in.user_id is not None and wfh_in.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Cannot change ownership of the WFH request.")
 
-    return crud.update_wfh(db=db, wfh_id=wfh_id, wfh_update=wfh_in, user_id=current_user.id)
+    updated_wfh = crud.update_wfh(
+        db=db, wfh_id=wfh_id, wfh_update=wfh_in, user_id=current_user.id, expected_version=expected_version,
+        enforce="user",
+    )
+    set_etag(response, updated_wfh.version)
+    return updated_wfh
 
 @r.delete("/wfh/{wfh_id}", response_model=schemas.WFH)
 async def delete_wfh_request(
     wfh_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: schemas.TokenData = Depends(get_current_active_claims),
 ):
     """
     Delete a specific WFH request by ID for the current user.
     """
-    existing_wfh = crud.get_wfh(db=db, wfh_id=wfh_id, user_id=current_user.id)
-    if not existing_wfh:
-        raise HTTPException(status_code=404, detail="WFH request not found or not owned by user")
-
     return crud.delete_wfh(db=db, wfh_id=wfh_id, user_id=current_user.id)
 
 
@@ -91,7 +115,7 @@ async def delete_wfh_request(
 async def admin_create_wfh_for_user(
     wfh_in: schemas.WFHCreate, # Contains user_id for target user
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
 ):
     """
     Admin: Create a new WFH request for a specified user.
@@ -101,29 +125,47 @@ async def admin_create_wfh_for_user(
     if not user:
         raise HTTPException(status_code=404, detail=f"User with id {wfh_in.user_id} not found.")
     # The user_id from the payload (wfh_in.user_id) is passed to crud.create_user_wfh
-    return crud.create_user_wfh(db=db, wfh=wfh_in, user_id=wfh_in.user_id)
+    return crud.create_user_wfh(db=db, wfh=wfh_in, user_id=wfh_in.user_id, enforce="admin")
 
 @r.get("/admin/users/{user_id}/wfh", response_model=t.List[schemas.WFH], tags=["admin"])
 async def admin_get_user_wfh_requests(
     user_id: int,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
     skip: int = 0,
     limit: int = Query(default=100, lte=100),
+    fields: t.Optional[t.FrozenSet[str]] = Depends(wfh_fields),
 ):
     """
     Admin: Get all WFH requests for a specific user.
+    Pass fields to get only those.
     """
     user = crud.get_user(db, user_id) # Validate user exists
     if not user:
         raise HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
-    return crud.get_user_wfhs(db=db, user_id=user_id, skip=skip, limit=limit)
+    rows = crud.get_user_wfhs(db=db, user_id=user_id, skip=skip, limit=limit, columns=fields)
+    return sparse_response(schemas.WFH, fields, rows)
+
+@r.get("/admin/wfh", response_model=t.List[schemas.WFH], tags=["admin"])
+async def admin_get_wfh_requests_by_ids(
+    db: Session = Depends(get_db),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    ids: str = Query(description="Comma-separated ids, e.g. 1,2,3"),
+    fields: t.Optional[t.FrozenSet[str]] = Depends(wfh_fields),
+):
+    """
+    Admin: Get several WFH requests in one call, in the order of ids.
+    Ids that don't exist are left out.
+    """
+    rows = crud.get_by_ids(db, models.WFH, parse_ids(ids), columns=fields)
+    return sparse_response(schemas.WFH, fields, rows)
 
 @r.get("/admin/wfh/{wfh_id}", response_model=schemas.WFH, tags=["admin"])
 async def admin_get_wfh_request_by_id(
     wfh_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
 ):
     """
     Admin: Get a specific WFH request by its ID.
@@ -131,28 +173,35 @@ async def admin_get_wfh_request_by_id(
     wfh = crud.get_wfh_by_id_admin(db=db, wfh_id=wfh_id)
     if not wfh:
         raise HTTPException(status_code=404, detail="WFH request not found")
+    set_etag(response, wfh.version)
     return wfh
 
 @r.put("/admin/wfh/{wfh_id}", response_model=schemas.WFH, tags=["admin"])
 async def admin_update_wfh_request(
     wfh_id: int,
     wfh_in: schemas.WFHEdit,
+    response: Response,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
+    expected_version: t.Optional[int] = Depends(if_match_version),
 ):
     """
     Admin: Update a specific WFH request by its ID.
+    Honours If-Match like the user endpoint.
     """
-    updated_wfh = crud.update_wfh_admin(db=db, wfh_id=wfh_id, wfh_update=wfh_in)
+    updated_wfh = crud.update_wfh_admin(
+        db=db, wfh_id=wfh_id, wfh_update=wfh_in, expected_version=expected_version, enforce="admin"
+    )
     if not updated_wfh: # Should be handled by HTTPException in crud if not found
         raise HTTPException(status_code=404, detail="WFH request not found or failed to update")
+    set_etag(response, updated_wfh.version)
     return updated_wfh
 
 @r.delete("/admin/wfh/{wfh_id}", response_model=schemas.WFH, tags=["admin"])
 async def admin_delete_wfh_request(
     wfh_id: int,
     db: Session = Depends(get_db),
-    current_superuser: User = Depends(get_current_active_superuser),
+    current_superuser: schemas.TokenData = Depends(get_current_active_superuser),
 ):
     """
     Admin: Delete a specific WFH request by its ID.
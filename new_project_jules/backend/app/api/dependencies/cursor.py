@@ -0,0 +1,23 @@
+from fastapi import HTTPException, Query
+import base64
+import json
+import typing as t
+
+
+def encode_cursor(values: t.Sequence[t.Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def cursor_param(cursor: t.Optional[str] = Query(default=None)) -> t.Optional[list]:
+    """Decode an opaque keyset cursor produced by encode_cursor."""
+    if cursor is None:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,30 @@
+from fastapi import Header, HTTPException, Response, status
+import typing as t
+
+
+def etag_for(version: int) -> str:
+    return f'"{version}"'
+
+
+def set_etag(response: Response, version: int) -> None:
+    response.headers["ETag"] = etag_for(version)
+
+
+def if_match_version(if_match: t.Optional[str] = Header(default=None)) -> t.Optional[int]:
+    """
+    The version a client expects to overwrite, taken from If-Match.
+    None (no header, or "*") means the update is applied unconditionally.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    if not value.isdigit():
+        # An ETag we never issued can't match the current representation.
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match does not match the current version",
+        )
+    return int(value)
@@ -0,0 +1,54 @@
+from fastapi import HTTPException, Query, Response
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+import typing as t
+
+
+@lru_cache(maxsize=256)
+def sparse_adapter(schema: t.Type[BaseModel], fields: t.FrozenSet[str]) -> TypeAdapter:
+    """
+    List adapter for schema narrowed to fields, built once per combination:
+    requests only validate and serialize their rows.
+    """
+    model = create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (info.annotation, info) for name, info in schema.model_fields.items() if name in fields},
+    )
+    return TypeAdapter(t.List[model])
+
+
+def fields_param(schema: t.Type[BaseModel]):
+    """
+    Dependency for ?fields=id,from_date,status: the set of schema fields to
+    return (id always included), or None for all of them.
+    """
+    known = frozenset(schema.model_fields)
+
+    def dependency(
+        fields: t.Optional[str] = Query(default=None, description="Comma-separated fields to return"),
+    ) -> t.Optional[t.FrozenSet[str]]:
+        if fields is None:
+            return None
+        wanted = frozenset(name.strip() for name in fields.split(",") if name.strip())
+        unknown = wanted - known
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {sorted(unknown)[0]}")
+        return wanted | (known & {"id"})
+
+    return dependency
+
+
+def sparse_response(
+    schema: t.Type[BaseModel], fields: t.Optional[t.FrozenSet[str]], rows: t.Sequence[t.Any],
+    exclude_none: bool = False,
+):
+    """
+    Rows serialized with only the requested fields, bypassing the route's full
+    response_model; the rows as they are when no fields were asked for.
+    """
+    if fields is None:
+        return rows
+    adapter = sparse_adapter(schema, fields)
+    body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True), exclude_none=exclude_none)
+    return Response(content=body, media_type="application/json")
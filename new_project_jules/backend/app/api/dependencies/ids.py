@@ -0,0 +1,21 @@
+from fastapi import HTTPException, Query
+import typing as t
+
+from app.core import config
+
+
+def parse_ids(value: str) -> t.List[int]:
+    """Comma-separated ids, duplicates dropped, in the order given."""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not ids:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(ids) > config.MAX_IDS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {config.MAX_IDS_PER_REQUEST} ids per request")
+    return ids
+
+
+def ids_param(ids: t.Optional[str] = Query(default=None, description="Comma-separated ids")) -> t.Optional[t.List[int]]:
+    return parse_ids(ids) if ids is not None else None
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Archive closed leave and WFH requests, or bring them back.
+
+    python -m app.archive run                          # everything past the horizon, every tenant
+    python -m app.archive run --tenant acme
+    python -m app.archive restore --year 2023          # leave and wfh archived for 2023
+    python -m app.archive restore --year 2023 --entity leave --user-id 42
+
+`run` moves closed requests that ended more than ARCHIVE_AFTER_DAYS ago into
+per-year archive tables (see app/db/archive.py); the scheduler runs it nightly.
+Both commands work in chunks of --chunk-size rows per transaction and can be
+rerun after an interruption.
+"""
+import argparse
+import typing as t
+
+from app.core import config
+from app.db import archive, tenancy
+from app.db.session import SessionLocal, tenants
+
+
+def parse_args(argv: t.Optional[t.List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Move closed requests to or from the archive tables.")
+    parser.add_argument("--tenant", action="append", choices=tenants.names, help="Only this tenant (repeatable).")
+    parser.add_argument("--chunk-size", type=int, default=config.ARCHIVE_CHUNK_SIZE, help="Rows per transaction.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run", help="Archive closed requests older than the horizon.")
+    restore = commands.add_parser("restore", help="Move archived requests back.")
+    restore.add_argument("--year", type=int, required=True, help="Archive year (the requests' from_date year).")
+    restore.add_argument("--entity", action="append", choices=sorted(archive.ENTITIES), help="Default: both.")
+    restore.add_argument("--user-id", type=int, help="Only this user's requests.")
+    return parser.parse_args(argv)
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    args = parse_args(argv)
+    for tenant in args.tenant or tenants.names:
+        with tenancy.use(tenant), SessionLocal() as db:
+            if args.command == "run":
+                moved = archive.archive_closed(db, chunk_size=args.chunk_size)
+                print(f"{tenant}: archived " + ", ".join(f"{count} {entity}" for entity, count in moved.items()))
+                continue
+            for entity in args.entity or sorted(archive.ENTITIES):
+                restored, skipped = archive.restore(
+                    db, entity, args.year, user_id=args.user_id, chunk_size=args.chunk_size
+                )
+                print(f"{tenant} {entity} {args.year}: restored {restored}, skipped {skipped} (id in use)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Append-only audit log with write-behind batching.
+
+crud records a before/after diff for each audited change after it commits;
+`record` only appends to an in-memory buffer, so requests never wait on the
+audit insert. A flusher task (started in the app lifespan) writes the buffer
+with one bulk INSERT per tenant every AUDIT_FLUSH_INTERVAL_SECONDS, or as soon
+as AUDIT_BATCH_SIZE entries are waiting, and drains it at shutdown. Outside the
+app (scripts, CLIs) a full batch is flushed inline and the rest at exit.
+
+The actor is the authenticated user of the current request (`current_actor`),
+or SYSTEM for changes the app makes on its own, such as scheduled jobs, which
+run under `acting_as(SYSTEM)`.
+"""
+import asyncio
+import atexit
+import enum
+import json
+import logging
+import threading
+import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+
+from sqlalchemy import insert
+
+from app.core import config
+from app.db import models, tenancy
+from app.db.session import SessionLocal, after_commit
+
+logger = logging.getLogger(__name__)
+
+current_actor: ContextVar[t.Optional[int]] = ContextVar("audit_actor", default=None)
+
+SYSTEM = None  # actor_id of changes not made by a user
+
+
+@contextmanager
+def acting_as(actor_id: t.Optional[int]):
+    token = current_actor.set(actor_id)
+    try:
+        yield
+    finally:
+        current_actor.reset(token)
+
+REDACTED_FIELDS = {"hashed_password"}
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def diff(before: t.Optional[dict], after: t.Optional[dict]) -> t.Dict[str, list]:
+    """{field: [old, new]} for every field whose value differs."""
+    before, after = before or {}, after or {}
+    changes = {}
+    for field in sorted(set(before) | set(after)):
+        old, new = _plain(before.get(field)), _plain(after.get(field))
+        if old != new:
+            if field in REDACTED_FIELDS:
+                old, new = ("***" if old is not None else None), ("***" if new is not None else None)
+            changes[field] = [old, new]
+    return changes
+
+
+class AuditBuffer:
+    def __init__(self, batch_size: int, max_entries: int, interval: float):
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._entries: t.List[t.Tuple[str, dict]] = []
+        self._loop: t.Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: t.Optional[asyncio.Event] = None
+        self._task: t.Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(
+        self, entity: str, entity_id: int, action: str, changes: t.Dict[str, list], actor_id: t.Optional[int],
+    ) -> None:
+        if not changes and action == "updated":
+            return
+        entry = {
+            "occurred_at": datetime.utcnow(),
+            "actor_id": actor_id,
+            "entity": entity,
+            "entity_id": entity_id,
+            "action": action,
+            "changes": json.dumps(changes, default=str, separators=(",", ":")),
+        }
+        with self._lock:
+            self._entries.append((tenancy.current_tenant.get(), entry))
+            full = len(self._entries) >= self.batch_size
+        if full:
+            if self._task is not None:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            else:
+                self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered so far. Returns the number of entries written."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+            if not entries:
+                return 0
+            by_tenant: t.Dict[str, t.List[dict]] = {}
+            for tenant, entry in entries:
+                by_tenant.setdefault(tenant, []).append(entry)
+            written = 0
+            for tenant, rows in by_tenant.items():
+                try:
+                    with tenancy.use(tenant), SessionLocal() as db:
+                        db.execute(insert(models.AuditLog), rows)
+                        db.commit()
+                    written += len(rows)
+                except Exception:
+                    logger.exception("Audit flush for tenant %s failed; keeping %d entries", tenant, len(rows))
+                    self._requeue(tenant, rows)
+            return written
+
+    def _requeue(self, tenant: str, rows: t.List[dict]) -> None:
+        with self._lock:
+            self._entries[:0] = [(tenant, row) for row in rows]
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                logger.error("Audit buffer full, dropping %d oldest entries", overflow)
+                del self._entries[:overflow]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+buffer = AuditBuffer(
+    batch_size=config.AUDIT_BATCH_SIZE,
+    max_entries=config.AUDIT_MAX_BUFFER,
+    interval=config.AUDIT_FLUSH_INTERVAL_SECONDS,
+)
+atexit.register(buffer.flush)
+
+
+def record(entity: str, entity_id: int, action: str, before: t.Optional[dict], after: t.Optional[dict]) -> None:
+    changes = diff(before, after)
+    # The actor is taken now: after_commit may run the callback later.
+    actor_id = current_actor.get()
+    after_commit(lambda: buffer.record(entity, entity_id, action, changes, actor_id))
@@ -1,15 +1,32 @@
+import typing as t
+
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from jwt import PyJWTError
 
-from app.db import models, schemas, session
+from app.db import models, schemas, session, replication, tenancy
 from app.db.crud import get_user_by_email, create_user
-from app.core import security
+from app.core import audit, security, revocation
 
+# Scope key of the claims a batch request (routers/batch.py) already resolved
+# for its operations, which carry the same token.
+RESOLVED_CLAIMS = "app.resolved_claims"
 
-async def get_current_user(
-    db=Depends(session.get_db), token: str = Depends(security.oauth2_scheme)
-):
+
+def _resolved_claims(request: t.Optional[Request]) -> t.Optional[schemas.TokenData]:
+    return request.scope.get(RESOLVED_CLAIMS) if request is not None else None
+
+
+async def get_current_claims(
+    db=Depends(session.get_db), token: str = Depends(security.oauth2_scheme), request: Request = None
+) -> schemas.TokenData:
+    """
+    Authorize a request from the token claims alone. The only state consulted
+    is the in-memory token version map, so no user row is loaded.
+    """
+    resolved = _resolved_claims(request)
+    if resolved is not None:
+        return resolved
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -20,15 +37,50 @@ async def get_current_user(
             token, security.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
         email: str = payload.get("sub")
-        if email is None:
+        user_id: int = payload.get("uid")
+        version: int = payload.get("ver")
+        if email is None or user_id is None or version is None:
+            raise credentials_exception
+        if payload.get("tid", tenancy.DEFAULT_TENANT) != tenancy.current_tenant.get():
+            # Issued by another tenant: its uid means a different user here.
             raise credentials_exception
         permissions: str = payload.get("permissions")
-        token_data = schemas.TokenData(email=email, permissions=permissions)
+        token_data = schemas.TokenData(
+            id=user_id, email=email, permissions=permissions, version=version
+        )
     except PyJWTError:
         raise credentials_exception
-    user = get_user_by_email(db, token_data.email)
-    if user is None:
+    replication.current_user_id.set(token_data.id)
+    audit.current_actor.set(token_data.id)
+    if not revocation.is_current(db, token_data.id, token_data.version):
         raise credentials_exception
+    return token_data
+
+
+async def get_current_active_claims(
+    db=Depends(session.get_db),
+    claims: schemas.TokenData = Depends(get_current_claims),
+    request: Request = None,
+) -> schemas.TokenData:
+    if _resolved_claims(request) is claims:
+        return claims  # Checked by the batch request
+    _, is_active = revocation.lookup(db, claims.id)
+    if not is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return claims
+
+
+async def get_current_user(
+    db=Depends(session.get_db),
+    claims: schemas.TokenData = Depends(get_current_claims),
+):
+    user = db.get(models.User, claims.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
@@ -41,13 +93,13 @@ async def get_current_active_user(
 
 
 async def get_current_active_superuser(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
-    if not current_user.is_superuser:
+    claims: schemas.TokenData = Depends(get_current_active_claims),
+) -> schemas.TokenData:
+    if claims.permissions != "admin":
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
-    return current_user
+    return claims
 
 
 def authenticate_user(db, email: str, password: str):
@@ -0,0 +1,171 @@
+"""
+Per-user day bitsets for capacity planning.
+
+For every (user, year) the index keeps one bitset per category (approved or
+pending leave/WFH) where bit n means "away on day n of the year". Bitsets are
+Python ints, i.e. compact digit arrays, and are built with range masks rather
+than by expanding dates day by day. A heatmap over a group is a column-wise
+popcount: the group's bitsets are summed with a bit-sliced adder, so each step
+works on a whole year of days at once.
+
+There is one index per tenant and process. Years are loaded on first use.
+Leave/WFH writes mark the owner dirty through an events listener (writes in
+other worker processes arrive through the events relay), and dirty users are
+rebuilt from their own rows (one indexed query) before the next read. As a
+backstop for changes that publish no event, such as edits made directly in the
+database, the whole index is reloaded once it is AVAILABILITY_INDEX_TTL_SECONDS
+old.
+"""
+import threading
+import time
+import typing as t
+from datetime import date, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.core import config, events
+from app.db import archive, models, tenancy
+
+CATEGORIES = ("leave", "wfh", "leave_pending", "wfh_pending")
+
+_SOURCES = (
+    ("leave", models.Leave, models.LeaveStatus),
+    ("wfh", models.WFH, models.WFHStatus),
+)
+
+
+def _range_mask(start: date, end: date, year: int) -> int:
+    """Bits for the days of [start, end] that fall inside `year`."""
+    first = max(start, date(year, 1, 1))
+    last = min(end, date(year, 12, 31))
+    if first > last:
+        return 0
+    offset = first.timetuple().tm_yday - 1
+    return ((1 << ((last - first).days + 1)) - 1) << offset
+
+
+def column_counts(bitsets: t.Iterable[int], width: int) -> t.List[int]:
+    """
+    For each bit position below `width`, how many of `bitsets` have it set.
+    Bit-sliced addition: slices[k] holds bit k of every per-day counter.
+    """
+    slices: t.List[int] = []
+    for bits in bitsets:
+        carry = bits
+        for k in range(len(slices)):
+            if not carry:
+                break
+            current = slices[k]
+            slices[k] = current ^ carry
+            carry = current & carry
+        if carry:
+            slices.append(carry)
+    return [
+        sum(((plane >> day) & 1) << k for k, plane in enumerate(slices))
+        for day in range(width)
+    ]
+
+
+class AvailabilityIndex:
+    def __init__(self, ttl: float = config.AVAILABILITY_INDEX_TTL_SECONDS):
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        # (category, year) -> {user_id: bitset}
+        self._bits: t.Dict[t.Tuple[str, int], t.Dict[int, int]] = {}
+        self._years: t.Set[int] = set()
+        self._dirty: t.Set[int] = set()
+        self._expires = time.monotonic() + ttl
+
+    def _reset(self) -> None:
+        self._bits.clear()
+        self._years.clear()
+        self._dirty.clear()
+        self._expires = time.monotonic() + self.ttl
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def mark_dirty(self, user_id: int) -> None:
+        with self._lock:
+            self._dirty.add(user_id)
+
+    def _rows(self, db: Session, years: t.Iterable[int], user_ids: t.Optional[t.Iterable[int]] = None):
+        years = sorted(years)
+        start, end = date(years[0], 1, 1), date(years[-1], 12, 31)
+        for kind, model, status_enum in _SOURCES:
+            rows = archive.source(db, model, start, end).c
+            query = db.query(rows.user_id, rows.from_date, rows.to_date, rows.status).filter(
+                rows.status.in_([status_enum.APPROVED, status_enum.PENDING]),
+                rows.from_date <= end,
+                rows.to_date >= start,
+            )
+            if user_ids is not None:
+                query = query.filter(rows.user_id.in_(list(user_ids)))
+            for user_id, from_date, to_date, status in query:
+                category = kind if status == status_enum.APPROVED else f"{kind}_pending"
+                yield category, user_id, from_date, to_date
+
+    def _apply_rows(self, rows, years: t.Iterable[int]) -> None:
+        for category, user_id, from_date, to_date in rows:
+            for year in years:
+                mask = _range_mask(from_date, to_date, year)
+                if mask:
+                    per_user = self._bits.setdefault((category, year), {})
+                    per_user[user_id] = per_user.get(user_id, 0) | mask
+
+    def _ensure(self, db: Session, years: t.Set[int]) -> None:
+        if time.monotonic() >= self._expires:
+            self._reset()
+        missing = years - self._years
+        if missing:
+            self._apply_rows(list(self._rows(db, missing)), missing)
+            self._years |= missing
+        if self._dirty and self._years:
+            dirty, self._dirty = self._dirty, set()
+            for per_user in self._bits.values():
+                for user_id in dirty:
+                    per_user.pop(user_id, None)
+            self._apply_rows(list(self._rows(db, self._years, dirty)), self._years)
+
+    def counts(
+        self,
+        db: Session,
+        user_ids: t.Collection[int],
+        start: date,
+        end: date,
+        categories: t.Sequence[str],
+    ) -> t.Dict[str, t.List[int]]:
+        """Per-day number of `user_ids` away in each category over [start, end]."""
+        years = set(range(start.year, end.year + 1))
+        members = set(user_ids)
+        result: t.Dict[str, t.List[int]] = {category: [] for category in categories}
+        with self._lock:
+            self._ensure(db, years)
+            for year in sorted(years):
+                first = max(start, date(year, 1, 1))
+                last = min(end, date(year, 12, 31))
+                offset = first.timetuple().tm_yday - 1
+                width = (last - first).days + 1
+                for category in categories:
+                    per_user = self._bits.get((category, year), {})
+                    bitsets = (bits >> offset for uid, bits in per_user.items() if uid in members)
+                    result[category].extend(column_counts(bitsets, width))
+        return result
+
+
+_indexes: t.Dict[str, AvailabilityIndex] = {}
+
+
+def index_for(tenant: t.Optional[str] = None) -> AvailabilityIndex:
+    """The index of `tenant` (default: the current one)."""
+    return _indexes.setdefault(tenant or tenancy.current_tenant.get(), AvailabilityIndex())
+
+
+@events.on_change
+def _invalidate(event: events.ChangeEvent) -> None:
+    index_for(event.tenant).mark_dirty(event.user_id)
+
+
+def days(start: date, end: date) -> t.List[date]:
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
@@ -0,0 +1,174 @@
+"""
+iCalendar feeds of approved leave and WFH.
+
+Feed URLs carry a signed token instead of a bearer token, since calendar apps
+can't send headers. The token names the tenant, the feed (a user's own or
+their team's) and the owner's token_version, so changing the password or deactivating the
+account revokes every link handed out before.
+
+Calendar apps poll every few minutes, so rendered feeds are cached per process
+with an ETag and Last-Modified for conditional requests, along with their
+compressed variants. Leave/WFH change events drop every cached feed that
+includes the affected user; entries also expire after
+CALENDAR_CACHE_TTL_SECONDS to pick up writes made by other processes.
+"""
+import hashlib
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app.core import compression, config, events, security
+from app.db import tenancy
+
+FEED_KINDS = ("user", "team")
+
+_serializer = URLSafeSerializer(security.SECRET_KEY, salt="calendar-feed")
+
+
+def make_token(kind: str, owner_id: int, version: int, tenant: str = tenancy.DEFAULT_TENANT) -> str:
+    return _serializer.dumps([kind, owner_id, version, tenant])
+
+
+def read_token(token: str) -> t.Optional[t.Tuple[str, int, int, str]]:
+    try:
+        kind, owner_id, version, tenant = _serializer.loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    if kind not in FEED_KINDS or not isinstance(owner_id, int) or not isinstance(version, int):
+        return None
+    return kind, owner_id, version, tenant
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> str:
+    # RFC 5545: lines longer than 75 octets continue on lines starting with a space.
+    data = line.encode()
+    if len(data) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(data):
+        end = min(start + (75 if not parts else 74), len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1  # Don't split a UTF-8 sequence
+        parts.append(data[start:end].decode())
+        start = end
+    return "\r\n ".join(parts)
+
+
+def _summary(row, team: bool) -> str:
+    what = "WFH" if row.kind == "wfh" else f"{row.leave_type.value.capitalize()} leave"
+    if not team:
+        return what
+    who = " ".join(part for part in (row.first_name, row.last_name) if part) or row.email
+    return f"{who}: {what}"
+
+
+def render(rows: t.Iterable, name: str, team: bool) -> bytes:
+    # Everything is derived from the rows (DTSTAMP is the request's created_at),
+    # so re-rendering unchanged data gives the same bytes and the same ETag.
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:-//{_escape(config.PROJECT_NAME)}//Leave calendar//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+    for row in rows:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{row.kind}-{row.id}@leave-calendar",
+            f"DTSTAMP:{row.created_at.strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTSTART;VALUE=DATE:{row.from_date.strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{(row.to_date + timedelta(days=1)).strftime('%Y%m%d')}",
+            f"SUMMARY:{_escape(_summary(row, team))}",
+            "TRANSP:TRANSPARENT",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode()
+
+
+@dataclass
+class Feed:
+    body: bytes
+    etag: str
+    last_modified: datetime
+    members: t.FrozenSet[int]  # Users whose writes change this feed
+    expires: float
+    variants: t.Dict[str, bytes] = field(default_factory=dict)  # encoding -> compressed body
+
+    def encoded(self, encoding: str) -> bytes:
+        # Compressed once per encoding and kept with the entry, so cache hits
+        # are served without compressing again.
+        body = self.variants.get(encoding)
+        if body is None:
+            body = self.variants[encoding] = compression.compress(self.body, encoding)
+        return body
+
+
+class FeedCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # (tenant, kind, owner_id) -> Feed
+        self._entries: "OrderedDict[t.Tuple[str, str, int], Feed]" = OrderedDict()
+
+    def get(self, key: t.Tuple[str, str, int]) -> t.Optional[Feed]:
+        with self._lock:
+            feed = self._entries.get(key)
+            if feed is None:
+                return None
+            if feed.expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return feed
+
+    def put(self, key: t.Tuple[str, str, int], body: bytes, members: t.Iterable[int]) -> Feed:
+        feed = Feed(
+            body=body,
+            etag='"%s"' % hashlib.sha1(body).hexdigest()[:20],
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+            members=frozenset(members),
+            expires=time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            self._entries[key] = feed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return feed
+
+    def invalidate_user(self, tenant: str, user_id: int) -> None:
+        with self._lock:
+            for key in [key for key, feed in self._entries.items() if key[0] == tenant and user_id in feed.members]:
+                del self._entries[key]
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, feed in self._entries.items() if feed.expires <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+cache = FeedCache(config.CALENDAR_CACHE_SIZE, config.CALENDAR_CACHE_TTL_SECONDS)
+
+
+@events.on_change
+def _invalidate(event: events.ChangeEvent) -> None:
+    cache.invalidate_user(event.tenant, event.user_id)
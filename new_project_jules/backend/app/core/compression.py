@@ -0,0 +1,209 @@
+"""
+Response compression.
+
+CompressionMiddleware negotiates an encoding from Accept-Encoding among
+COMPRESSION_ENCODINGS (server preference breaks ties in the client's q-values)
+and compresses JSON, text and calendar responses of at least
+COMPRESSION_MIN_SIZE bytes. zstd and br need the optional zstandard and
+brotli packages and are skipped without them; gzip is always available.
+Streamed responses are compressed chunk by chunk once COMPRESSION_MIN_SIZE
+bytes have arrived, each chunk flushed so the client isn't kept waiting;
+event streams are left alone.
+
+A response that already has a Content-Encoding passes through untouched,
+which is how cached payloads are served: a cache keeps each compressed
+variant next to the entry (see calendar.Feed.encoded) and compresses it once,
+not on every hit.
+"""
+import gzip
+import typing as t
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core import config
+
+try:
+    import brotli
+except ImportError:  # Optional: br is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd is not offered without it
+    zstandard = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Dynamic responses: most of the ratio at a fraction of the CPU of 11
+ZSTD_LEVEL = 3
+
+_AVAILABLE = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+ENCODINGS: t.Tuple[str, ...] = tuple(
+    name for name in (part.strip() for part in config.COMPRESSION_ENCODINGS.split(",")) if _AVAILABLE.get(name)
+)
+
+COMPRESSIBLE_TYPES = {"application/json", "application/javascript", "application/xml", "image/svg+xml"}
+
+
+def negotiate(accept_encoding: t.Optional[str]) -> t.Optional[str]:
+    """The encoding to use for a request's Accept-Encoding, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights: t.Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class StreamCompressor:
+    """Incremental compression; every chunk comes out flushed."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._z = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._z = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._z.process(data) + self._z.flush()
+        return self._z.compress(data) + self._z.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._z.finish()
+        return self._z.flush()
+
+
+def compressible(status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 304) or "content-encoding" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", ""):
+        return False
+    content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith("text/") or content_type.endswith("+json") or content_type in COMPRESSIBLE_TYPES
+
+
+def encoded_headers(headers: MutableHeaders, encoding: str, length: t.Optional[int]) -> None:
+    """Mark a response as encoded: Content-Encoding, Vary, a length (None when streamed) and a weak ETag."""
+    headers["Content-Encoding"] = encoding
+    if length is None:
+        if "content-length" in headers:
+            del headers["content-length"]
+    else:
+        headers["Content-Length"] = str(length)
+    headers.add_vary_header("Accept-Encoding")
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        # Byte-for-byte different from the identity representation.
+        headers["ETag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware, so streamed responses stay streamed."""
+
+    def __init__(self, app, minimum_size: int = config.COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: t.Optional[dict] = None
+        passthrough = False
+        sized = False  # Content-Length known: compress the whole body at once
+        pending: t.List[bytes] = []
+        stream: t.Optional[StreamCompressor] = None
+
+        async def compressing_send(message):
+            nonlocal start, passthrough, sized, stream
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                length = headers.get("content-length")
+                passthrough = not compressible(message["status"], headers) or (
+                    length is not None and int(length) < self.minimum_size
+                )
+                sized = length is not None
+                if passthrough:
+                    await send(message)
+                else:
+                    # Held until the body shows whether it is worth compressing.
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None:
+                # Bodies often arrive in several messages even when they are
+                # small: collect them until there is enough to compress, or
+                # all of it when the length is known.
+                pending.append(body)
+                size = sum(len(chunk) for chunk in pending)
+                if more_body and (sized or size < self.minimum_size):
+                    return
+                body = b"".join(pending)
+                if not more_body:
+                    if size < self.minimum_size:
+                        await send(start)
+                        await send({"type": "http.response.body", "body": body})
+                        return
+                    body = compress(body, encoding)
+                    headers = MutableHeaders(raw=list(start["headers"]))
+                    encoded_headers(headers, encoding, len(body))
+                    await send({**start, "headers": headers.raw})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                stream = StreamCompressor(encoding)
+                headers = MutableHeaders(raw=list(start["headers"]))
+                encoded_headers(headers, encoding, None)
+                await send({**start, "headers": headers.raw})
+
+            data = stream.compress(body) if body else b""
+            if not more_body:
+                data += stream.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
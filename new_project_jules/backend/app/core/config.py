@@ -1,3 +1,136 @@
+import os
+
 PROJECT_NAME = "My FastAPI React App"
 
 API_V1_STR = "/api/v1"
+
+# Background job queue (see app/tasks.py)
+JOB_QUEUE_CONCURRENCY = int(os.getenv("JOB_QUEUE_CONCURRENCY", "4"))
+JOB_QUEUE_MAX_RETRIES = int(os.getenv("JOB_QUEUE_MAX_RETRIES", "3"))
+JOB_QUEUE_RETRY_BACKOFF = float(os.getenv("JOB_QUEUE_RETRY_BACKOFF", "0.5"))
+JOB_QUEUE_DRAIN_TIMEOUT = float(os.getenv("JOB_QUEUE_DRAIN_TIMEOUT", "10"))
+# Path of a local SQLite file used to persist queued jobs across restarts.
+# Leave empty to keep jobs in memory only.
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "")
+# Persisted jobs are claimed by one process at a time. The claim is renewed
+# while that process runs; once it lapses (the process died), the next queue
+# to start takes the job over.
+JOB_QUEUE_LEASE_SECONDS = float(os.getenv("JOB_QUEUE_LEASE_SECONDS", "60"))
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+# Comma-separated read replica URLs. GET requests are served from these unless
+# the caller wrote recently (see app/db/replication.py).
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+# How far (in seconds) a replica may trail the primary and still serve reads.
+# Also the read-your-writes window: a user's reads go to the primary for this
+# long after their own write.
+REPLICA_MAX_STALENESS_SECONDS = float(os.getenv("REPLICA_MAX_STALENESS_SECONDS", "5"))
+# SQLite replicas are kept in sync by copying the primary file this often.
+# 0 disables the in-process copy step.
+REPLICA_SYNC_INTERVAL_SECONDS = float(os.getenv("REPLICA_SYNC_INTERVAL_SECONDS", "0"))
+# Run that copy in the app lifespan. app.serve runs it once in its master
+# instead and turns this off for the workers it forks.
+REPLICA_SYNC_IN_APP = os.getenv("REPLICA_SYNC_IN_APP", "1").lower() in ("1", "true", "yes")
+
+# Migrate every tenant database in the app lifespan. app.serve migrates once
+# in the master instead and turns this off for the workers it forks.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+
+# Scheduled maintenance jobs (see app/scheduler.py). When enabled, every
+# process runs the scheduler loop and a lock row in the database makes sure
+# each run happens in only one of them.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "0").lower() in ("1", "true", "yes")
+# How long a claimed run may take before another process may take it over.
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "900"))
+# Pending requests are cancelled in chunks of this many rows per transaction.
+EXPIRE_PENDING_CHUNK_SIZE = int(os.getenv("EXPIRE_PENDING_CHUNK_SIZE", "500"))
+# Cached attendance months older than this are purged.
+ATTENDANCE_CACHE_TTL_DAYS = int(os.getenv("ATTENDANCE_CACHE_TTL_DAYS", "30"))
+
+# iCalendar feeds (see app/core/calendar.py)
+# Rendered feeds kept per process, and how long one is served before it is
+# re-rendered even without a local write (writes in other processes aren't
+# seen here).
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "1000"))
+CALENDAR_CACHE_TTL_SECONDS = int(os.getenv("CALENDAR_CACHE_TTL_SECONDS", "300"))
+# Requests that ended more than this many days ago are left out of feeds.
+CALENDAR_HISTORY_DAYS = int(os.getenv("CALENDAR_HISTORY_DAYS", "365"))
+
+# Multi-tenant mode (see app/db/tenancy.py): comma-separated name=url pairs,
+# e.g. "acme=sqlite:///./acme.db,globex=sqlite:///./globex.db". Requests for
+# acme.<domain>, or carrying a token issued by acme, use acme's database.
+# Empty: single tenant on DATABASE_URL.
+TENANT_DATABASE_URLS = {
+    name.strip().lower(): url.strip()
+    for name, _, url in (
+        item.partition("=") for item in os.getenv("TENANT_DATABASE_URLS", "").split(",") if "=" in item
+    )
+    if name.strip() and url.strip()
+}
+
+# Audit log (see app/core/audit.py): entries are buffered in memory and
+# written in batches of AUDIT_BATCH_SIZE, or every AUDIT_FLUSH_INTERVAL_SECONDS.
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "2"))
+# Entries kept while the database is unreachable; the oldest are dropped beyond this.
+AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", "10000"))
+
+# Archival (see app/db/archive.py): closed requests that ended more than
+# ARCHIVE_AFTER_DAYS ago move to per-year archive tables, in chunks of
+# ARCHIVE_CHUNK_SIZE rows per transaction. Raising the horizon later doesn't
+# bring rows back by itself: restore the affected years (python -m app.archive
+# restore) after changing it.
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "1000"))
+
+# Full-text search index (see app/db/search.py): "auto" uses FTS5 on SQLite
+# builds that have it and LIKE matching otherwise; "fts5" or "like" forces one.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto").lower()
+
+# How long GET /users serves a cached total count (Content-Range) before
+# recounting; user writes in this process drop it right away.
+USER_COUNT_CACHE_SECONDS = int(os.getenv("USER_COUNT_CACHE_SECONDS", "60"))
+
+# Leave/WFH request policies (see app/core/policy.py): path to a JSON file.
+# Unset: only the built-in checks (valid dates and num_days, no overlaps).
+LEAVE_POLICY_FILE = os.getenv("LEAVE_POLICY_FILE")
+
+# Idempotency-Key support for POSTs (see app/core/idempotency.py): successful
+# responses are kept in the idempotency_key table and replayed to retries for
+# this long.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A key reserved by a request that never finished (its worker died) is freed
+# after this long.
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+# Larger responses aren't kept.
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", "65536"))
+
+# Batch API (POST /api/v1/batch) and get-many (?ids=1,2,3) limits.
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "100"))
+MAX_IDS_PER_REQUEST = int(os.getenv("MAX_IDS_PER_REQUEST", "200"))
+
+# Response compression (see app/core/compression.py): encodings in order of
+# preference (zstd and br only when the zstandard/brotli packages are
+# installed), and the smallest response worth compressing, in bytes.
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").lower()
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Change events (see app/core/events.py) are shared between worker processes
+# through the change_event_log table, which each process polls this often, in
+# seconds. 0 keeps events in the process that made the change, which is only
+# correct with a single worker.
+EVENTS_RELAY_INTERVAL_SECONDS = float(os.getenv("EVENTS_RELAY_INTERVAL_SECONDS", "1"))
+# Relayed events are deleted after this long.
+EVENTS_RELAY_RETENTION_SECONDS = int(os.getenv("EVENTS_RELAY_RETENTION_SECONDS", "300"))
+
+# Capacity planning bitsets (see app/core/availability.py) are reloaded from the
+# database once they are this old, picking up changes that published no event.
+AVAILABILITY_INDEX_TTL_SECONDS = float(os.getenv("AVAILABILITY_INDEX_TTL_SECONDS", "300"))
+
+# Token revocation (see app/core/revocation.py): how long a user's cached
+# token_version/is_active is trusted before it is re-read from the database,
+# which bounds how late other processes (or direct database edits) take effect.
+REVOCATION_CACHE_TTL_SECONDS = float(os.getenv("REVOCATION_CACHE_TTL_SECONDS", "30"))
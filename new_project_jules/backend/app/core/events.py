@@ -0,0 +1,241 @@
+"""
+Change events for leave and WFH requests.
+
+crud publishes a compact ChangeEvent after each committed create/update/delete.
+The broker fans events out to per-user and admin-wide subscribers (the SSE and
+WebSocket endpoints in routers/events.py), and to any in-process listeners
+registered with `on_change`. A subscriber is just a small bounded queue, so an
+idle connection costs one sleeping coroutine and no polling.
+
+With several worker processes, the relay (started in the app lifespan) also
+writes each event to the change_event_log table and polls it every
+EVENTS_RELAY_INTERVAL_SECONDS, delivering the other workers' events here too,
+so subscribers and cache listeners see every write within about that long.
+"""
+import asyncio
+import json
+import logging
+import time
+import typing as t
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from app.core import config
+from app.db import models, tenancy
+from app.db.session import after_commit, tenants
+
+logger = logging.getLogger(__name__)
+
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    entity: str  # "leave" or "wfh"
+    action: str  # "created", "updated" or "deleted"
+    id: int
+    user_id: int
+    status: t.Optional[str] = None
+    tenant: str = tenancy.DEFAULT_TENANT
+
+    @classmethod
+    def from_row(cls, entity: str, action: str, row) -> "ChangeEvent":
+        status = getattr(row, "status", None)
+        return cls(
+            entity=entity,
+            action=action,
+            id=row.id,
+            user_id=row.user_id,
+            status=getattr(status, "value", status),
+            tenant=tenancy.current_tenant.get(),
+        )
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        del data["tenant"]  # Implied by the connection
+        return json.dumps(data, separators=(",", ":"))
+
+
+class Subscription:
+    def __init__(self, broker: "Broker", user_id: t.Optional[int], admin: bool):
+        self.broker = broker
+        self.tenant = tenancy.current_tenant.get()
+        self.user_id = user_id
+        self.admin = admin
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when events were dropped because the client fell behind; the
+        # stream then tells the client to refetch instead of trusting deltas.
+        self.overflowed = False
+
+    def push(self, event: ChangeEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> t.Optional[ChangeEvent]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self):
+        # Keyed by tenant too: user ids repeat across tenant databases.
+        self._by_user: t.Dict[t.Tuple[str, int], t.Set[Subscription]] = {}
+        self._admins: t.Dict[str, t.Set[Subscription]] = {}
+        self._loop: t.Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._admins.values()) + sum(len(s) for s in self._by_user.values())
+
+    def subscribe(self, user_id: t.Optional[int] = None, admin: bool = False) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        sub = Subscription(self, user_id, admin)
+        if admin:
+            self._admins.setdefault(sub.tenant, set()).add(sub)
+        else:
+            self._by_user.setdefault((sub.tenant, user_id), set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        registry, key = (self._admins, sub.tenant) if sub.admin else (self._by_user, (sub.tenant, sub.user_id))
+        subs = registry.get(key)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del registry[key]
+
+    def publish(self, event: ChangeEvent) -> None:
+        if self._loop is None or not (event.tenant in self._admins or (event.tenant, event.user_id) in self._by_user):
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._dispatch(event)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: ChangeEvent) -> None:
+        for sub in tuple(self._by_user.get((event.tenant, event.user_id), ())):
+            sub.push(event)
+        for sub in tuple(self._admins.get(event.tenant, ())):
+            sub.push(event)
+
+
+broker = Broker()
+
+
+class Relay:
+    """Shares change events between worker processes through change_event_log."""
+
+    def __init__(self, interval: float, retention: float):
+        self.interval = interval
+        self.retention = retention
+        self.origin: t.Optional[str] = None  # Set by open(): None means not relaying
+        self._last_id: t.Dict[str, int] = {}
+        self._last_prune = 0.0
+        self._task: t.Optional[asyncio.Task] = None
+
+    def open(self) -> None:
+        """Start relaying from now on: events already in the table are skipped."""
+        # Per process, and workers are forked: generated here, not at import.
+        self.origin = uuid.uuid4().hex
+        table = models.ChangeEventLog
+        for tenant in tenants.names:
+            with tenants.engine_for(tenant).connect() as conn:
+                self._last_id[tenant] = conn.execute(select(func.coalesce(func.max(table.id), 0))).scalar()
+
+    def write(self, event: ChangeEvent) -> None:
+        if self.origin is None:
+            return
+        try:
+            with tenants.engine_for(event.tenant).begin() as conn:
+                conn.execute(insert(models.ChangeEventLog).values(
+                    origin=self.origin, entity=event.entity, action=event.action, entity_id=event.id,
+                    user_id=event.user_id, status=event.status, created_at=datetime.utcnow(),
+                ))
+        except Exception:
+            # The change itself is committed; other workers only miss the event.
+            logger.exception("Could not relay %s %s %s", event.entity, event.action, event.id)
+
+    def poll(self) -> int:
+        """Deliver the events other processes wrote since the last poll; returns how many."""
+        table = models.ChangeEventLog
+        delivered = 0
+        for tenant in tenants.names:
+            with tenants.engine_for(tenant).connect() as conn:
+                rows = conn.execute(
+                    select(table).where(table.id > self._last_id.get(tenant, 0)).order_by(table.id)
+                ).all()
+            for row in rows:
+                self._last_id[tenant] = row.id
+                if row.origin != self.origin:
+                    _deliver_local(ChangeEvent(row.entity, row.action, row.entity_id, row.user_id, row.status, tenant))
+                    delivered += 1
+        if time.monotonic() - self._last_prune > self.retention:
+            self._last_prune = time.monotonic()
+            cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+            for tenant in tenants.names:
+                with tenants.engine_for(tenant).begin() as conn:
+                    conn.execute(delete(table).where(table.created_at < cutoff))
+        return delivered
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception:
+                logger.exception("Polling change events failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self.open()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.origin = None
+
+
+relay = Relay(config.EVENTS_RELAY_INTERVAL_SECONDS, config.EVENTS_RELAY_RETENTION_SECONDS)
+
+_listeners: t.List[t.Callable[[ChangeEvent], None]] = []
+
+
+def on_change(listener: t.Callable[[ChangeEvent], None]) -> t.Callable[[ChangeEvent], None]:
+    """Register an in-process listener called synchronously for every change."""
+    _listeners.append(listener)
+    return listener
+
+
+def publish(entity: str, action: str, row) -> ChangeEvent:
+    event = ChangeEvent.from_row(entity, action, row)
+    after_commit(lambda: _deliver(event))
+    return event
+
+
+def _deliver(event: ChangeEvent) -> None:
+    _deliver_local(event)
+    relay.write(event)
+
+
+def _deliver_local(event: ChangeEvent) -> None:
+    for listener in _listeners:
+        listener(event)
+    broker.publish(event)
@@ -0,0 +1,259 @@
+"""
+Idempotency-Key support for POST requests.
+
+A client that may retry a create sends a unique Idempotency-Key header. Before
+the first request with a key runs, the key is reserved with an INSERT into the
+idempotency_key table, whose unique (user_id, key) constraint lets exactly one
+request win across all workers. When it finishes, its 2xx response (status,
+headers, body) is stored in that row for IDEMPOTENCY_TTL_SECONDS and replayed
+to every retry with the same key, without reaching the endpoint. A retry that
+finds the key reserved but not finished gets 409, unless the first request runs
+in the same process: then it waits for it and gets the same response. Reusing a
+key for a different request (method, path, query or body) is rejected with 422.
+
+Keys are scoped to the authenticated user (the token's uid) in the tenant's own
+database, so one user's key never replays another's response; requests without
+a valid bearer token are passed through untouched. Non-2xx responses, and ones
+over IDEMPOTENCY_MAX_BODY_BYTES, release the key, so the request can be
+retried. A key left reserved by a worker that died is freed after
+IDEMPOTENCY_LOCK_SECONDS.
+"""
+import asyncio
+import hashlib
+import json
+import typing as t
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import jwt
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core import config, security
+from app.db import models, tenancy
+from app.db.session import tenants
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+Headers = t.List[t.Tuple[bytes, bytes]]
+
+
+@dataclass
+class Entry:
+    """A request running in this process, for duplicates that arrive meanwhile."""
+    fingerprint: str
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    status: t.Optional[int] = None
+    headers: Headers = field(default_factory=list)
+    body: bytes = b""
+
+
+@dataclass
+class Stored:
+    """The idempotency_key row of a key that was already reserved."""
+    fingerprint: str
+    status: t.Optional[int]  # None while the first request runs
+    headers: Headers
+    body: bytes
+
+
+def request_fingerprint(scope, body: bytes) -> str:
+    return hashlib.sha256(
+        b"\0".join((scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body))
+    ).hexdigest()
+
+
+def _engine():
+    return tenants.engine_for(tenancy.current_tenant.get())
+
+
+def reserve(user_id: int, key: str, fingerprint: str) -> t.Optional[Stored]:
+    """Claim the key for a request: None when claimed, else the row already holding it."""
+    table = models.IdempotencyKey
+    match = (table.user_id == user_id, table.key == key)
+    while True:
+        now = datetime.utcnow()
+        try:
+            with _engine().begin() as conn:
+                conn.execute(delete(table).where(*match, table.expires_at <= now))
+                conn.execute(insert(table).values(
+                    user_id=user_id, key=key, fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=config.IDEMPOTENCY_LOCK_SECONDS),
+                ))
+            return None
+        except IntegrityError:
+            pass
+        with _engine().connect() as conn:
+            row = conn.execute(
+                select(table.fingerprint, table.status, table.headers, table.body).where(*match)
+            ).first()
+        if row is not None:
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.headers or "[]")]
+            return Stored(row.fingerprint, row.status, headers, row.body or b"")
+        # Released in between: try to claim it again.
+
+
+def complete(user_id: int, key: str, status: int, headers: Headers, body: bytes) -> None:
+    table = models.IdempotencyKey
+    with _engine().begin() as conn:
+        conn.execute(
+            update(table)
+            .where(table.user_id == user_id, table.key == key)
+            .values(
+                status=status, body=body,
+                headers=json.dumps([(name.decode("latin-1"), value.decode("latin-1")) for name, value in headers]),
+                expires_at=datetime.utcnow() + timedelta(seconds=config.IDEMPOTENCY_TTL_SECONDS),
+            )
+        )
+
+
+def release(user_id: int, key: str) -> None:
+    table = models.IdempotencyKey
+    with _engine().begin() as conn:
+        conn.execute(delete(table).where(table.user_id == user_id, table.key == key, table.status.is_(None)))
+
+
+def purge_expired(now: t.Optional[datetime] = None) -> int:
+    """Delete the current tenant's expired keys."""
+    table = models.IdempotencyKey
+    with _engine().begin() as conn:
+        return conn.execute(delete(table).where(table.expires_at <= (now or datetime.utcnow()))).rowcount
+
+
+def _principal(headers: t.Dict[bytes, bytes]) -> t.Optional[int]:
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        claims = jwt.decode(authorization[7:].strip(), security.SECRET_KEY, algorithms=[security.ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    return claims.get("uid")
+
+
+async def _send_json(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, status: int, headers: Headers, body: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + [(b"idempotent-replayed", b"true")],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware; add it inside TenantMiddleware so the tenant is known."""
+
+    def __init__(self, app, max_body: int = config.IDEMPOTENCY_MAX_BODY_BYTES):
+        self.app = app
+        self.max_body = max_body
+        self._in_flight: t.Dict[tuple, Entry] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(HEADER)
+        user_id = _principal(headers) if key else None
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key is limited to {MAX_KEY_LENGTH} characters")
+            return
+
+        # The request body is part of the fingerprint, so read it up front
+        # and hand it to the app from memory.
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = request_fingerprint(scope, body)
+        key = key.decode("latin-1")
+        local_key = (tenancy.current_tenant.get(), user_id, key)
+
+        entry = self._in_flight.get(local_key)
+        if entry is not None:
+            # The first request runs in this process: wait for its response
+            # rather than answering 409.
+            if entry.fingerprint != fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+                return
+            await entry.done.wait()
+            if entry.status is None:
+                await _send_json(send, 409, "The original request with this Idempotency-Key failed; retry it")
+                return
+            await _replay(send, entry.status, entry.headers, entry.body)
+            return
+
+        entry = self._in_flight[local_key] = Entry(fingerprint)
+        try:
+            await self._run(scope, receive, send, entry, user_id, key, body)
+        finally:
+            del self._in_flight[local_key]
+            entry.done.set()
+
+    async def _run(self, scope, receive, send, entry: Entry, user_id: int, key: str, body: bytes) -> None:
+        stored = await asyncio.to_thread(reserve, user_id, key, entry.fingerprint)
+        if stored is not None:
+            if stored.fingerprint != entry.fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+            elif stored.status is None:
+                await _send_json(send, 409, "A request with this Idempotency-Key is still being processed")
+            else:
+                entry.status, entry.headers, entry.body = stored.status, stored.headers, stored.body
+                await _replay(send, stored.status, stored.headers, stored.body)
+            return
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = None
+        response_headers: Headers = []
+        response_body = []
+
+        async def capture(message):
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        kept = False
+        try:
+            await self.app(scope, replay_receive, capture)
+            content = b"".join(response_body)
+            if status is not None and 200 <= status < 300:
+                # Requests already waiting on this one get its response.
+                entry.status, entry.headers, entry.body = status, response_headers, content
+                if len(content) <= self.max_body:
+                    await asyncio.to_thread(complete, user_id, key, status, response_headers, content)
+                    kept = True
+        finally:
+            if not kept:
+                # Not kept: the key is freed and a retry runs again.
+                await asyncio.to_thread(release, user_id, key)
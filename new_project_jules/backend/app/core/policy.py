@@ -0,0 +1,198 @@
+"""
+Leave/WFH request policies.
+
+Policies are declared as JSON (LEAVE_POLICY_FILE; the defaults below when
+unset) and compiled once into a list of predicates:
+
+    {
+        "no_overlap": true,
+        "max_consecutive_days": {"annual": 15, "*": 30},
+        "notice_days": {"annual": 14, "wfh": 1},
+        "blackouts": [{"name": "Year-end close", "from": "2026-12-21", "to": "2026-12-31",
+                       "kinds": ["annual", "wfh"]}],
+        "require_balance": ["annual"]
+    }
+
+Keys under max_consecutive_days / notice_days and the blackout kinds are
+leave types or "wfh"; "*" is the fallback. Every request must also have
+from_date <= to_date and 1 <= num_days <= its length in days.
+
+Checking needs at most two lookups, which crud does only when a compiled
+rule asks for them: the user's pending/approved requests overlapping the
+range (one indexed query over leave and wfh), and the annual balance.
+Hard rules (dates, overlap) apply to admins too; the others only to
+requests users make for themselves.
+"""
+import bisect
+import json
+import typing as t
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from app.core import config
+
+DEFAULT_POLICY: dict = {
+    "no_overlap": True,
+    "max_consecutive_days": {},
+    "notice_days": {},
+    "blackouts": [],
+    "require_balance": [],
+}
+
+
+@dataclass(frozen=True)
+class Request:
+    kind: str  # "leave" or "wfh"
+    user_id: int
+    from_date: date
+    to_date: date
+    num_days: int
+    leave_type: t.Optional[str] = None  # LeaveType value for leave
+    request_id: t.Optional[int] = None  # Set when updating an existing request
+    previous_from_date: t.Optional[date] = None
+
+    @property
+    def category(self) -> str:
+        return self.leave_type if self.kind == "leave" else "wfh"
+
+    @property
+    def length(self) -> int:
+        return (self.to_date - self.from_date).days + 1
+
+
+@dataclass(frozen=True)
+class Violation:
+    rule: str
+    message: str
+
+
+@dataclass
+class Context:
+    today: date
+    overlaps: t.Sequence[t.Tuple[str, int, date, date]] = ()  # (kind, id, from_date, to_date)
+    available_balance: t.Optional[float] = None
+
+
+Check = t.Callable[[Request, Context], t.Optional[Violation]]
+
+
+def _per_category(values: t.Dict[str, t.Any]) -> t.Callable[[str], t.Any]:
+    fallback = values.get("*")
+    return lambda category: values.get(category, fallback)
+
+
+def _date_order(request: Request, context: Context) -> t.Optional[Violation]:
+    if request.from_date > request.to_date:
+        return Violation("date_order", "from_date must not be after to_date")
+    return None
+
+
+def _num_days(request: Request, context: Context) -> t.Optional[Violation]:
+    if request.from_date <= request.to_date and not 1 <= request.num_days <= request.length:
+        return Violation("num_days", f"num_days must be between 1 and {request.length} for this range")
+    return None
+
+
+def _no_overlap(request: Request, context: Context) -> t.Optional[Violation]:
+    if context.overlaps:
+        kind, other_id, start, end = context.overlaps[0]
+        return Violation("no_overlap", f"Overlaps {kind} request {other_id} ({start} to {end})")
+    return None
+
+
+def _max_consecutive_days(limits: t.Dict[str, int]) -> Check:
+    limit_for = _per_category(limits)
+
+    def check(request: Request, context: Context) -> t.Optional[Violation]:
+        limit = limit_for(request.category)
+        if limit is not None and request.length > limit:
+            return Violation("max_consecutive_days", f"At most {limit} consecutive days of {request.category}")
+        return None
+
+    return check
+
+
+def _notice_days(notice: t.Dict[str, int]) -> Check:
+    notice_for = _per_category(notice)
+
+    def check(request: Request, context: Context) -> t.Optional[Violation]:
+        days = notice_for(request.category)
+        if not days or request.from_date == request.previous_from_date:
+            return None
+        if request.from_date < context.today + timedelta(days=days):
+            return Violation("notice_days", f"{request.category} needs {days} days' notice")
+        return None
+
+    return check
+
+
+def _blackouts(periods: t.List[dict]) -> Check:
+    # Per category: periods sorted by end date, so one bisect finds the first
+    # period that could still overlap the request.
+    by_category: t.Dict[str, t.List[t.Tuple[date, date, str]]] = {}
+    for period in periods:
+        start, end = date.fromisoformat(period["from"]), date.fromisoformat(period["to"])
+        for kind in period.get("kinds") or ["*"]:
+            by_category.setdefault(kind, []).append((end, start, period.get("name") or "Blackout period"))
+    for entries in by_category.values():
+        entries.sort()
+    ends = {kind: [end for end, _, _ in entries] for kind, entries in by_category.items()}
+
+    def check(request: Request, context: Context) -> t.Optional[Violation]:
+        for kind in (request.category, "*"):
+            entries = by_category.get(kind)
+            if not entries:
+                continue
+            for end, start, name in entries[bisect.bisect_left(ends[kind], request.from_date):]:
+                if start <= request.to_date:
+                    return Violation("blackout", f"{name} ({start} to {end}) is closed to {request.category}")
+        return None
+
+    return check
+
+
+def _require_balance(request: Request, context: Context) -> t.Optional[Violation]:
+    if context.available_balance is not None and request.num_days > context.available_balance:
+        return Violation(
+            "require_balance", f"Requested {request.num_days} days, {context.available_balance:g} available"
+        )
+    return None
+
+
+class Policy:
+    def __init__(self, spec: dict):
+        spec = {**DEFAULT_POLICY, **spec}
+        self.spec = spec
+        self.hard: t.List[Check] = [_date_order, _num_days]
+        self.soft: t.List[Check] = []
+        self.checks_overlap = bool(spec["no_overlap"])
+        if self.checks_overlap:
+            self.hard.append(_no_overlap)
+        if spec["max_consecutive_days"]:
+            self.soft.append(_max_consecutive_days(spec["max_consecutive_days"]))
+        if spec["notice_days"]:
+            self.soft.append(_notice_days(spec["notice_days"]))
+        if spec["blackouts"]:
+            self.soft.append(_blackouts(spec["blackouts"]))
+        self.balance_categories = frozenset(spec["require_balance"])
+        if self.balance_categories:
+            self.soft.append(_require_balance)
+
+    def needs_balance(self, request: Request, admin: bool = False) -> bool:
+        return not admin and request.category in self.balance_categories
+
+    def check(self, request: Request, context: Context, admin: bool = False) -> t.List[Violation]:
+        """Every violated rule, in declaration order."""
+        checks = self.hard if admin else self.hard + self.soft
+        return [violation for violation in (check(request, context) for check in checks) if violation]
+
+
+def load(path: t.Optional[str] = None) -> Policy:
+    path = path or config.LEAVE_POLICY_FILE
+    if not path:
+        return Policy({})
+    with open(path) as f:
+        return Policy(json.load(f))
+
+
+policy = load()
@@ -0,0 +1,55 @@
+import time
+import typing as t
+
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db import models, tenancy
+
+# (tenant, user_id) -> (token_version, is_active, expires). Entries are filled
+# lazily on the first token check for a user and kept current by
+# crud.create_user/edit_user/delete_user, so authorizing a request normally
+# needs no database access at all. Writes made by other processes, or directly
+# in the database, are picked up when the entry expires after
+# REVOCATION_CACHE_TTL_SECONDS.
+_versions: t.Dict[t.Tuple[str, int], t.Tuple[int, bool, float]] = {}
+_clock = time.monotonic
+
+
+def set_version(user_id: int, version: int, is_active: bool = True) -> None:
+    expires = _clock() + config.REVOCATION_CACHE_TTL_SECONDS
+    _versions[(tenancy.current_tenant.get(), user_id)] = (version, bool(is_active), expires)
+
+
+def forget(user_id: int) -> None:
+    _versions.pop((tenancy.current_tenant.get(), user_id), None)
+
+
+def clear() -> None:
+    _versions.clear()
+
+
+def lookup(db: Session, user_id: int) -> t.Optional[t.Tuple[int, bool]]:
+    """
+    Return the current (token_version, is_active) for a user, or None if the
+    user no longer exists. Only unknown users and expired entries hit the
+    database.
+    """
+    entry = _versions.get((tenancy.current_tenant.get(), user_id))
+    if entry is not None and entry[2] > _clock():
+        return entry[:2]
+    row = (
+        db.query(models.User.token_version, models.User.is_active)
+        .filter(models.User.id == user_id)
+        .first()
+    )
+    if row is None:
+        forget(user_id)
+        return None
+    set_version(user_id, row.token_version or 0, row.is_active)
+    return row.token_version or 0, bool(row.is_active)
+
+
+def is_current(db: Session, user_id: int, version: int) -> bool:
+    entry = lookup(db, user_id)
+    return entry is not None and entry[0] == version
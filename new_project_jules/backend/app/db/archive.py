@@ -0,0 +1,209 @@
+"""
+Per-year archive tables for closed leave and WFH requests.
+
+Approved, rejected and cancelled requests that ended more than
+ARCHIVE_AFTER_DAYS ago are moved out of the leave and wfh tables into
+leave_archive_<year> / wfh_archive_<year> (by from_date year), so the hot
+tables and their indexes only grow with recent activity. Moves run a chunk of
+rows per transaction; archive_partition lists the tables that exist.
+
+Reads over a date range select from `source(db, model, start, end)` instead of
+the model's table. When the range starts inside the horizon that is the table
+itself, with no extra query; otherwise it is a UNION ALL of the table and the
+archive years the range overlaps.
+"""
+import threading
+import typing as t
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Index, MetaData, Table, delete, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app.core import config
+from . import models
+
+ENTITIES = {"leave": models.Leave, "wfh": models.WFH}
+
+# Archive tables aren't part of Base.metadata: they are created on demand.
+archive_metadata = MetaData()
+_tables_lock = threading.Lock()
+
+
+def _closed(model) -> list:
+    statuses = models.LeaveStatus if model is models.Leave else models.WFHStatus
+    return [statuses.APPROVED, statuses.REJECTED, statuses.CANCELLED]
+
+
+def _columns(model) -> t.List[str]:
+    return [column.name for column in model.__table__.columns]
+
+
+def archive_table(model, year: int) -> Table:
+    name = f"{model.__tablename__}_archive_{year}"
+    with _tables_lock:
+        table = archive_metadata.tables.get(name)
+        if table is None:
+            table = Table(
+                name,
+                archive_metadata,
+                # Same columns without the foreign key: archived rows are plain history.
+                *(
+                    Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                    for column in model.__table__.columns
+                ),
+                Column("archived_at", DateTime, nullable=False),
+                Index(f"ix_{name}_user_from_date", "user_id", "from_date"),
+            )
+        return table
+
+
+def horizon(today: t.Optional[date] = None) -> date:
+    """Closed requests ending before this date belong in the archive."""
+    return (today or date.today()) - timedelta(days=config.ARCHIVE_AFTER_DAYS)
+
+
+def partitions(db: Session, entity: str) -> t.List[int]:
+    partition = models.ArchivePartition
+    return db.scalars(select(partition.year).where(partition.entity == entity).order_by(partition.year)).all()
+
+
+def source(db: Session, model, start: t.Optional[date] = None, end: t.Optional[date] = None):
+    """
+    The model's table, plus the archive years that may hold requests
+    overlapping [start, end] when the range reaches back past the horizon.
+    Use `.c` for its columns.
+    """
+    if start is not None and start >= horizon():
+        return model.__table__
+    partition = models.ArchivePartition
+    query = select(partition.year).where(partition.entity == model.__tablename__)
+    if start is not None:
+        # A request from the previous year can run into this one.
+        query = query.where(partition.year >= start.year - 1)
+    if end is not None:
+        query = query.where(partition.year <= end.year)
+    years = db.scalars(query).all()
+    if not years:
+        return model.__table__
+    names = _columns(model)
+    branches = [select(model.__table__)] + [
+        select(*(archive_table(model, year).c[name] for name in names)) for year in years
+    ]
+    return union_all(*branches).subquery(f"{model.__tablename__}_all")
+
+
+def _ensure_partition(db: Session, entity: str, year: int) -> Table:
+    table = archive_table(ENTITIES[entity], year)
+    if db.get(models.ArchivePartition, (entity, year)) is None:
+        table.create(db.connection(), checkfirst=True)
+        db.add(models.ArchivePartition(entity=entity, year=year))
+        db.flush()
+    return table
+
+
+def archive_closed(
+    db: Session, cutoff: t.Optional[date] = None, chunk_size: int = config.ARCHIVE_CHUNK_SIZE
+) -> t.Dict[str, int]:
+    """
+    Move closed requests that ended before `cutoff` (default: the horizon) to
+    their archive year. Walks each table by id, one chunk per transaction, so
+    it can be interrupted and rerun. Returns the rows moved per entity.
+    """
+    cutoff = cutoff or horizon()
+    moved = {}
+    for entity, model in ENTITIES.items():
+        names = _columns(model)
+        moved[entity], last_id = 0, 0
+        while True:
+            rows = db.execute(
+                select(model.id, model.from_date)
+                .where(model.id > last_id, model.status.in_(_closed(model)), model.to_date < cutoff)
+                .order_by(model.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            by_year = defaultdict(list)
+            for row_id, from_date in rows:
+                by_year[from_date.year].append(row_id)
+            now = datetime.utcnow()
+            for year, ids in by_year.items():
+                table = _ensure_partition(db, entity, year)
+                db.execute(
+                    insert(table).from_select(
+                        names + ["archived_at"],
+                        select(*model.__table__.columns, literal(now)).where(model.id.in_(ids)),
+                    )
+                )
+            ids = [row_id for row_id, _ in rows]
+            db.execute(delete(model).where(model.id.in_(ids)))
+            db.commit()
+            moved[entity] += len(ids)
+            last_id = ids[-1]
+    return moved
+
+
+def restore(
+    db: Session,
+    entity: str,
+    year: int,
+    user_id: t.Optional[int] = None,
+    chunk_size: int = config.ARCHIVE_CHUNK_SIZE,
+) -> t.Tuple[int, int]:
+    """
+    Move a year of archived requests (optionally one user's) back into the
+    hot table. Rows whose id has been reused there since stay archived.
+    Returns (restored, skipped). An emptied archive year is dropped.
+
+    The next archive run moves restored rows out again unless the horizon was
+    raised first.
+    """
+    model = ENTITIES[entity]
+    if year not in partitions(db, entity):
+        return 0, 0
+    table, names = archive_table(model, year), _columns(model)
+    restored = skipped = last_id = 0
+    while True:
+        query = select(table.c.id).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+        if user_id is not None:
+            query = query.where(table.c.user_id == user_id)
+        ids = db.scalars(query).all()
+        if not ids:
+            break
+        taken = set(db.scalars(select(model.id).where(model.id.in_(ids))))
+        movable = [row_id for row_id in ids if row_id not in taken]
+        if movable:
+            db.execute(
+                insert(model.__table__).from_select(
+                    names, select(*(table.c[name] for name in names)).where(table.c.id.in_(movable))
+                )
+            )
+            db.execute(delete(table).where(table.c.id.in_(movable)))
+        db.commit()
+        restored += len(movable)
+        skipped += len(taken)
+        last_id = ids[-1]
+    if not db.scalar(select(func.count()).select_from(table)):
+        db.execute(
+            delete(models.ArchivePartition).where(
+                models.ArchivePartition.entity == entity, models.ArchivePartition.year == year
+            )
+        )
+        table.drop(db.connection())
+        db.commit()
+    return restored, skipped
+
+
+def delete_user_rows(db: Session, user_id: int) -> t.Dict[str, t.List[int]]:
+    """
+    Delete a user's archived requests (part of the caller's transaction) and
+    return their ids per entity, for the caller to drop their search documents.
+    """
+    deleted: t.Dict[str, t.List[int]] = {}
+    for entity, model in ENTITIES.items():
+        for year in partitions(db, entity):
+            table = archive_table(model, year)
+            ids = db.execute(delete(table).where(table.c.user_id == user_id).returning(table.c.id)).scalars().all()
+            deleted.setdefault(entity, []).extend(ids)
+    return deleted
@@ -1,9 +1,28 @@
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, delete, func, insert, literal, literal_column, null, or_, select, true, union, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased, load_only
+import time
 import typing as t
+from datetime import date, datetime, timedelta
 
-from . import models, schemas
+from . import archive, models, schemas, search
+from .session import after_commit, use_primary
 from app.core.security import get_password_hash
+from app.core import audit, availability, config, events, policy, revocation
+
+# Compared as a literal (not a bound parameter) so SQLite can match the
+# partial "pending" indexes on leave and wfh.
+PENDING_STATUS = literal_column("'PENDING'")
+
+# Changing any of these invalidates every token issued to the user.
+TOKEN_VERSION_FIELDS = {"hashed_password", "email", "is_active", "is_superuser"}
+
+# Changing any of these reindexes the user for search.
+SEARCH_FIELDS = {"first_name", "last_name", "email"}
+
+# Writes to these invalidate the cached attendance months they overlap.
+ATTENDANCE_SOURCES = (models.Leave, models.WFH)
 
 
 def get_user(db: Session, user_id: int):
@@ -17,10 +36,70 @@ def get_user_by_email(db: Session, email: str) -> schemas.UserBase:
     return db.query(models.User).filter(models.User.email == email).first()
 
 
+def _only(query, model, columns: t.Optional[t.Iterable[str]]):
+    # Sparse fieldsets: load just these columns (the primary key always comes along).
+    return query.options(load_only(*(getattr(model, column) for column in columns))) if columns else query
+
+
 def get_users(
-    db: Session, skip: int = 0, limit: int = 100
+    db: Session, skip: int = 0, limit: int = 100, columns: t.Optional[t.Iterable[str]] = None
 ) -> t.List[schemas.UserOut]:
-    return db.query(models.User).offset(skip).limit(limit).all()
+    query = _only(db.query(models.User), models.User, columns)
+    return query.order_by(models.User.id).offset(skip).limit(limit).all()
+
+
+# tenant -> (count, monotonic expiry). Dropped on user writes in this process;
+# the TTL bounds staleness from writes made by other processes.
+_user_counts: t.Dict[str, t.Tuple[int, float]] = {}
+
+
+def count_users(db: Session) -> int:
+    tenant = db.info["tenant"]
+    cached = _user_counts.get(tenant)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    count = db.query(func.count(models.User.id)).scalar()
+    _user_counts[tenant] = (count, time.monotonic() + config.USER_COUNT_CACHE_SECONDS)
+    return count
+
+
+def _prefix_range(column, prefix: str):
+    # lower(column) >= prefix AND lower(column) < prefix with its last
+    # character bumped: a range scan on the lower() expression index.
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    lowered = func.lower(column)
+    return and_(lowered >= prefix, lowered < upper)
+
+
+def lookup_users(
+    db: Session, prefix: str, limit: int = 10, include_inactive: bool = False
+) -> t.List[schemas.UserLookup]:
+    """
+    Users whose email, first name or last name starts with `prefix`
+    (case-insensitive), or whose first and last name start with the two
+    parts of "first last". Each branch reads at most `limit` index entries.
+    """
+    user = models.User
+    prefix = " ".join(prefix.lower().split())
+    if not prefix:
+        return []
+    first, _, last = prefix.partition(" ")
+    if last:
+        branches = [(user.first_name, first, _prefix_range(user.last_name, last))]
+    else:
+        branches = [(user.email, prefix, None), (user.first_name, prefix, None), (user.last_name, prefix, None)]
+    queries = []
+    for column, value, extra in branches:
+        query = select(user.id, user.email, user.first_name, user.last_name).where(_prefix_range(column, value))
+        if extra is not None:
+            query = query.where(extra)
+        if not include_inactive:
+            query = query.where(user.is_active.is_(True))
+        queries.append(query.order_by(func.lower(column)).limit(limit).subquery())
+    # UNION (not ALL) drops users matched by more than one branch.
+    merged = union(*(select(query) for query in queries)).subquery()
+    rows = db.execute(select(merged).order_by(func.lower(merged.c.email)).limit(limit)).mappings().all()
+    return [schemas.UserLookup(**row) for row in rows]
 
 
 def create_user(db: Session, user: schemas.UserCreate):
@@ -32,152 +111,366 @@ def create_user(db: Session, user: schemas.UserCreate):
         is_active=user.is_active,
         is_superuser=user.is_superuser,
         hashed_password=hashed_password,
+        manager_id=user.manager_id,
+        accrual_policy_id=user.accrual_policy_id,
     )
+    if user.manager_id is not None:
+        _check_manager_exists(db, user.manager_id)
     db.add(db_user)
+    db.flush()
+    _closure_add(db, db_user.id, user.manager_id)
+    search.index_user(db, db_user)
+    user_id, version, is_active, tenant = db_user.id, db_user.token_version, db_user.is_active, db.info["tenant"]
     db.commit()
+    after_commit(lambda: _user_counts.pop(tenant, None))
+    after_commit(lambda: revocation.set_version(user_id, version, is_active))
     db.refresh(db_user)
     return db_user
 
 # Leave CRUD functions
 def get_leave(db: Session, leave_id: int, user_id: int):
-    leave = db.query(models.Leave).filter(models.Leave.id == leave_id, models.Leave.user_id == user_id).first()
-    if not leave:
+    leave = db.get(models.Leave, leave_id)
+    if not leave or leave.user_id != user_id:
         raise HTTPException(status_code=404, detail="Leave request not found")
     return leave
 
-def get_user_leaves(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> t.List[schemas.Leave]:
-    return db.query(models.Leave).filter(models.Leave.user_id == user_id).offset(skip).limit(limit).all()
+def get_user_leaves(
+    db: Session, user_id: int, skip: int = 0, limit: int = 100, columns: t.Optional[t.Iterable[str]] = None
+) -> t.List[schemas.Leave]:
+    return _only(db.query(models.Leave), models.Leave, columns).filter(models.Leave.user_id == user_id).offset(skip).limit(limit).all()
+
+def get_by_ids(db: Session, model, ids: t.Sequence[int], columns: t.Optional[t.Iterable[str]] = None) -> list:
+    # One IN query for a get-many; rows come back in the order asked for and
+    # missing ids are left out.
+    rows = {row.id: row for row in _only(db.query(model), model, columns).filter(model.id.in_(ids))} if ids else {}
+    return [rows[row_id] for row_id in ids if row_id in rows]
 
 # Admin CRUD function to get any leave by ID without user_id check
 def get_leave_by_id_admin(db: Session, leave_id: int):
-    leave = db.query(models.Leave).filter(models.Leave.id == leave_id).first()
+    leave = db.get(models.Leave, leave_id)
     if not leave:
         raise HTTPException(status_code=404, detail="Leave request not found")
     return leave
 
-def create_user_leave(db: Session, leave: schemas.LeaveCreate, user_id: int):
+def create_user_leave(db: Session, leave: schemas.LeaveCreate, user_id: int, enforce: t.Optional[str] = None):
     # user_id parameter is authoritative.
     # For regular users, API layer sets this to current_user.id and validates leave.user_id against it.
     # For admin, API layer sets this to leave.user_id from payload.
     leave_data = leave.model_dump(exclude={'user_id'}) # Exclude user_id from model dump, as it's passed directly
+    if enforce:
+        _enforce_policy(db, _policy_request(models.Leave, {**leave_data, "user_id": user_id}), enforce)
     db_leave = models.Leave(**leave_data, user_id=user_id)
     db.add(db_leave)
+    db.flush()
+    search.index_request(db, "leave", db_leave)
+    _invalidate_attendance(db, user_id, db_leave.from_date, db_leave.to_date)
     db.commit()
     db.refresh(db_leave)
+    events.publish("leave", "created", db_leave)
     return db_leave
 
-def update_leave(db: Session, leave_id: int, leave_update: schemas.LeaveEdit, user_id: int):
-    db_leave = get_leave(db, leave_id, user_id) # Ensures user owns the leave
-    update_data = leave_update.model_dump(exclude_unset=True) # Use model_dump
+# Request policies (app/core/policy.py)
+POLICY_FIELDS = {"from_date", "to_date", "num_days", "leave_type"}
 
-    for key, value in update_data.items():
-        setattr(db_leave, key, value)
+def _policy_columns(model) -> t.List[str]:
+    columns = ["id", "user_id", "from_date", "to_date", "num_days"]
+    return columns + ["leave_type"] if model is models.Leave else columns
 
-    db.add(db_leave)
-    db.commit()
-    db.refresh(db_leave)
-    return db_leave
+def _policy_request(model, values: dict, previous: t.Optional[dict] = None) -> policy.Request:
+    leave_type = values.get("leave_type")
+    return policy.Request(
+        kind=model.__tablename__,
+        user_id=values["user_id"],
+        from_date=values["from_date"],
+        to_date=values["to_date"],
+        num_days=values["num_days"],
+        leave_type=getattr(leave_type, "value", leave_type),
+        request_id=values.get("id"),
+        previous_from_date=previous["from_date"] if previous else None,
+    )
 
-def update_leave_admin(db: Session, leave_id: int, leave_update: schemas.LeaveEdit):
-    db_leave = get_leave_by_id_admin(db, leave_id) # Use the admin getter, no user_id check
-    update_data = leave_update.model_dump(exclude_unset=True)
+def _overlapping_requests(db: Session, request: policy.Request, limit: int = 1):
+    # One query over both tables, each branch a range scan on (user_id, from_date).
+    branches = []
+    for kind, model, statuses in (
+        ("leave", models.Leave, models.LeaveStatus),
+        ("wfh", models.WFH, models.WFHStatus),
+    ):
+        query = select(literal(kind).label("kind"), model.id, model.from_date, model.to_date).where(
+            model.user_id == request.user_id,
+            model.from_date <= request.to_date,
+            model.to_date >= request.from_date,
+            model.status.in_([statuses.PENDING, statuses.APPROVED]),
+        )
+        if kind == request.kind and request.request_id is not None:
+            query = query.where(model.id != request.request_id)
+        branches.append(query)
+    return db.execute(union_all(*branches).limit(limit)).all()
 
-    for key, value in update_data.items():
-        setattr(db_leave, key, value)
+def _available_balance(db: Session, request: policy.Request) -> float:
+    # Approved annual leave is already in the balance; pending requests are
+    # held against it too.
+    pending = db.query(func.coalesce(func.sum(models.Leave.num_days), 0)).filter(
+        models.Leave.user_id == request.user_id,
+        models.Leave.status == PENDING_STATUS,
+        models.Leave.leave_type == models.LeaveType.ANNUAL,
+        models.Leave.id != (request.request_id or 0),
+    ).scalar()
+    return get_accrual_balance(db, request.user_id).balance - pending
 
-    db.add(db_leave)
+def check_request_policy(db: Session, request: policy.Request, admin: bool = False) -> t.List[policy.Violation]:
+    """Every policy the request violates. Admins are held to the hard rules only."""
+    rules = policy.policy
+    context = policy.Context(today=date.today())
+    if rules.checks_overlap and request.from_date <= request.to_date:
+        context.overlaps = _overlapping_requests(db, request)
+    if rules.needs_balance(request, admin):
+        context.available_balance = _available_balance(db, request)
+    return rules.check(request, context, admin=admin)
+
+def validate_request(db: Session, model, data: dict, user_id: int, admin: bool = False) -> schemas.PolicyReport:
+    """Dry run of a create: every violation, nothing written."""
+    violations = check_request_policy(db, _policy_request(model, {**data, "user_id": user_id}), admin=admin)
+    return schemas.PolicyReport(
+        ok=not violations,
+        violations=[schemas.PolicyViolation(rule=v.rule, message=v.message) for v in violations],
+    )
+
+def _enforce_policy(db: Session, request: policy.Request, enforce: str) -> None:
+    # enforce: "user" for requests users make for themselves, "admin" for admins'.
+    violations = check_request_policy(db, request, admin=enforce == "admin")
+    if violations:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[{"rule": violation.rule, "message": violation.message} for violation in violations],
+        )
+
+def _audit_snapshot(db: Session, model, filters, fields) -> t.Optional[dict]:
+    # The audit diff needs the old values of the changed columns: one primary
+    # key read in the same transaction as the write.
+    if not fields:
+        return None
+    row = db.execute(select(*(getattr(model, field) for field in fields)).where(*filters)).first()
+    return row._asdict() if row is not None else None
+
+def _row_values(row, fields=None) -> dict:
+    return {field: getattr(row, field) for field in fields or row.__table__.columns.keys()}
+
+def _unchanged(db: Session, model, filters, expected_version: t.Optional[int], label: str):
+    row = db.scalars(select(model).where(*filters)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    if expected_version is not None and row.version != expected_version:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"{label} was modified by someone else",
+        )
+    return row
+
+def _versioned_update(
+    db: Session, model, filters, update_data: dict, expected_version: t.Optional[int], label: str,
+    enforce: t.Optional[str] = None,
+):
+    # One conditional UPDATE: concurrent writers never block each other, and a
+    # stale expected_version simply matches no row.
+    checked = bool(enforce) and bool(update_data.keys() & POLICY_FIELDS)
+    fields = list(update_data)
+    if checked:
+        # Same read as the audit snapshot: the request as it will be after the update.
+        fields += [field for field in _policy_columns(model) if field not in update_data]
+    current = _audit_snapshot(db, model, filters, fields)
+    if not update_data or current is not None and all(current[key] == value for key, value in update_data.items()):
+        # Nothing changes: keep the version, so clients' ETags stay valid.
+        return _unchanged(db, model, filters, expected_version, label)
+    before = {field: current[field] for field in update_data} if current is not None else None
+    if checked and current is not None:
+        merged = {**current, **{key: value for key, value in update_data.items() if value is not None}}
+        _enforce_policy(db, _policy_request(model, merged, current), enforce)
+    stmt = update(model).where(*filters)
+    if expected_version is not None:
+        stmt = stmt.where(model.version == expected_version)
+    stmt = (
+        stmt.values(**update_data, version=model.version + 1)
+        .returning(model)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    row = db.scalars(stmt).first()
+    if row is None:
+        db.rollback()
+        if expected_version is not None and db.query(model.id).filter(*filters).first():
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail=f"{label} was modified by someone else",
+            )
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    if model in ATTENDANCE_SOURCES:
+        if "from_date" in update_data or "to_date" in update_data:
+            # The old range is gone with the update; drop all of the user's months.
+            _invalidate_attendance(db, row.user_id)
+        else:
+            _invalidate_attendance(db, row.user_id, row.from_date, row.to_date)
+        if "comments" in update_data:
+            search.index_request(db, model.__tablename__, row)
     db.commit()
-    db.refresh(db_leave)
+    audit.record(model.__tablename__, row.id, "updated", before, _row_values(row, update_data))
+    return row
+
+def _delete_returning(db: Session, model, filters, label: str):
+    # DELETE ... RETURNING: ownership and existence come from the affected row.
+    stmt = (
+        delete(model)
+        .where(*filters)
+        .returning(model)
+        .execution_options(populate_existing=True)
+    )
+    row = db.scalars(stmt).first()
+    if row is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    # Detach so the commit doesn't expire the returned values of a row that is gone.
+    db.expunge(row)
+    if model in ATTENDANCE_SOURCES:
+        _invalidate_attendance(db, row.user_id, row.from_date, row.to_date)
+    search.remove(db, model.__tablename__, row.id)
+    db.commit()
+    audit.record(model.__tablename__, row.id, "deleted", _row_values(row), None)
+    return row
+
+def update_leave(
+    db: Session, leave_id: int, leave_update: schemas.LeaveEdit, user_id: int, expected_version: t.Optional[int] = None,
+    enforce: t.Optional[str] = None,
+):
+    update_data = leave_update.model_dump(exclude_unset=True) # Use model_dump
+    db_leave = _versioned_update(
+        db, models.Leave, (models.Leave.id == leave_id, models.Leave.user_id == user_id), # Ensures user owns the leave
+        update_data, expected_version, "Leave request", enforce=enforce,
+    )
+    events.publish("leave", "updated", db_leave)
+    return db_leave
+
+def update_leave_admin(
+    db: Session, leave_id: int, leave_update: schemas.LeaveEdit, expected_version: t.Optional[int] = None,
+    enforce: t.Optional[str] = None,
+):
+    update_data = leave_update.model_dump(exclude_unset=True)
+    db_leave = _versioned_update(
+        db, models.Leave, (models.Leave.id == leave_id,), # No user_id check for admins
+        update_data, expected_version, "Leave request", enforce=enforce,
+    )
+    events.publish("leave", "updated", db_leave)
     return db_leave
 
 def delete_leave(db: Session, leave_id: int, user_id: int):
-    db_leave = get_leave(db, leave_id, user_id) # Ensures user owns the leave
-    db.delete(db_leave)
-    db.commit()
+    db_leave = _delete_returning(
+        db, models.Leave, (models.Leave.id == leave_id, models.Leave.user_id == user_id), # Ensures user owns the leave
+        "Leave request",
+    )
+    events.publish("leave", "deleted", db_leave)
     return db_leave
 
 def delete_leave_admin(db: Session, leave_id: int):
-    db_leave = get_leave_by_id_admin(db, leave_id) # Use the admin getter, no user_id check
-    db.delete(db_leave)
-    db.commit()
+    db_leave = _delete_returning(db, models.Leave, (models.Leave.id == leave_id,), "Leave request") # No user_id check
+    events.publish("leave", "deleted", db_leave)
     return db_leave
 
 # WFH CRUD functions
 def get_wfh(db: Session, wfh_id: int, user_id: int):
-    wfh = db.query(models.WFH).filter(models.WFH.id == wfh_id, models.WFH.user_id == user_id).first()
-    if not wfh:
+    wfh = db.get(models.WFH, wfh_id)
+    if not wfh or wfh.user_id != user_id:
         raise HTTPException(status_code=404, detail="WFH request not found")
     return wfh
 
-def get_user_wfhs(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> t.List[schemas.WFH]:
-    return db.query(models.WFH).filter(models.WFH.user_id == user_id).offset(skip).limit(limit).all()
+def get_user_wfhs(
+    db: Session, user_id: int, skip: int = 0, limit: int = 100, columns: t.Optional[t.Iterable[str]] = None
+) -> t.List[schemas.WFH]:
+    return _only(db.query(models.WFH), models.WFH, columns).filter(models.WFH.user_id == user_id).offset(skip).limit(limit).all()
 
-def create_user_wfh(db: Session, wfh: schemas.WFHCreate, user_id: int):
+def create_user_wfh(db: Session, wfh: schemas.WFHCreate, user_id: int, enforce: t.Optional[str] = None):
     # Prioritize user_id from parameter (authenticated user)
     wfh_data = wfh.model_dump(exclude_unset=True, exclude={'user_id'}) # Exclude user_id from the dump
+    if enforce:
+        _enforce_policy(db, _policy_request(models.WFH, {**wfh.model_dump(), "user_id": user_id}), enforce)
     db_wfh = models.WFH(**wfh_data, user_id=user_id) # Pass user_id explicitly
     db.add(db_wfh)
+    db.flush()
+    search.index_request(db, "wfh", db_wfh)
+    _invalidate_attendance(db, user_id, db_wfh.from_date, db_wfh.to_date)
     db.commit()
     db.refresh(db_wfh)
+    events.publish("wfh", "created", db_wfh)
     return db_wfh
 
-def update_wfh(db: Session, wfh_id: int, wfh_update: schemas.WFHEdit, user_id: int):
-    db_wfh = get_wfh(db, wfh_id, user_id) # Ensures user owns the wfh
+def update_wfh(
+    db: Session, wfh_id: int, wfh_update: schemas.WFHEdit, user_id: int, expected_version: t.Optional[int] = None,
+    enforce: t.Optional[str] = None,
+):
     update_data = wfh_update.model_dump(exclude_unset=True) # Use model_dump
-
-    for key, value in update_data.items():
-        setattr(db_wfh, key, value)
-
-    db.add(db_wfh)
-    db.commit()
-    db.refresh(db_wfh)
+    db_wfh = _versioned_update(
+        db, models.WFH, (models.WFH.id == wfh_id, models.WFH.user_id == user_id), # Ensures user owns the wfh
+        update_data, expected_version, "WFH request", enforce=enforce,
+    )
+    events.publish("wfh", "updated", db_wfh)
     return db_wfh
 
 def delete_wfh(db: Session, wfh_id: int, user_id: int):
-    db_wfh = get_wfh(db, wfh_id, user_id) # Ensures user owns the wfh
-    db.delete(db_wfh)
-    db.commit()
+    db_wfh = _delete_returning(
+        db, models.WFH, (models.WFH.id == wfh_id, models.WFH.user_id == user_id), # Ensures user owns the wfh
+        "WFH request",
+    )
+    events.publish("wfh", "deleted", db_wfh)
     return db_wfh
 
 # Admin WFH CRUD functions
 def get_wfh_by_id_admin(db: Session, wfh_id: int):
-    wfh = db.query(models.WFH).filter(models.WFH.id == wfh_id).first()
+    wfh = db.get(models.WFH, wfh_id)
     if not wfh:
         raise HTTPException(status_code=404, detail="WFH request not found")
     return wfh
 
-def update_wfh_admin(db: Session, wfh_id: int, wfh_update: schemas.WFHEdit):
-    db_wfh = get_wfh_by_id_admin(db, wfh_id) # Use admin getter
+def update_wfh_admin(
+    db: Session, wfh_id: int, wfh_update: schemas.WFHEdit, expected_version: t.Optional[int] = None,
+    enforce: t.Optional[str] = None,
+):
     update_data = wfh_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_wfh, key, value)
-    db.add(db_wfh)
-    db.commit()
-    db.refresh(db_wfh)
+    db_wfh = _versioned_update(
+        db, models.WFH, (models.WFH.id == wfh_id,), # No user_id check for admins
+        update_data, expected_version, "WFH request", enforce=enforce,
+    )
+    events.publish("wfh", "updated", db_wfh)
     return db_wfh
 
 def delete_wfh_admin(db: Session, wfh_id: int):
-    db_wfh = get_wfh_by_id_admin(db, wfh_id) # Use admin getter
-    db.delete(db_wfh)
-    db.commit()
+    db_wfh = _delete_returning(db, models.WFH, (models.WFH.id == wfh_id,), "WFH request") # No user_id check
+    events.publish("wfh", "deleted", db_wfh)
     return db_wfh
 
 
 def delete_user(db: Session, user_id: int):
-    user = get_user(db, user_id)
-    if not user:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
-    db.delete(user)
-    db.commit()
+    _closure_remove(db, user_id)
+    _invalidate_attendance(db, user_id)
+    db.execute(delete(models.AccrualLedger).where(models.AccrualLedger.user_id == user_id))
+    for kind, ids in archive.delete_user_rows(db, user_id).items():
+        search.remove_many(db, kind, ids)
+    # The user's live requests go in the same transaction, not left pointing at a missing user.
+    requests = {}
+    for kind, model in archive.ENTITIES.items():
+        requests[kind] = db.execute(
+            delete(model).where(model.user_id == user_id).returning(model.id, model.user_id, model.status)
+        ).all()
+        search.remove_many(db, kind, [row.id for row in requests[kind]])
+    user = _delete_returning(db, models.User, (models.User.id == user_id,), "User")
+    for kind, rows in requests.items():
+        for row in rows:
+            events.publish(kind, "deleted", row)
+    tenant = db.info["tenant"]
+    after_commit(lambda: _user_counts.pop(tenant, None))
+    after_commit(lambda: revocation.forget(user_id))
     return user
 
 
 def edit_user(
     db: Session, user_id: int, user: schemas.UserEdit
 ) -> schemas.User:
-    db_user = get_user(db, user_id)
-    if not db_user:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
     update_data = user.model_dump(exclude_unset=True) # Use model_dump for Pydantic v2
 
     if "password" in update_data and update_data["password"] is not None:
@@ -187,10 +480,727 @@ def edit_user(
         del update_data["password"]
 
 
-    for key, value in update_data.items():
-        setattr(db_user, key, value)
+    if "manager_id" in update_data:
+        _closure_move(db, user_id, update_data["manager_id"])
 
-    db.add(db_user)
+    # Bump token_version in the same statement when a security-relevant field
+    # actually changes, so no prior read of the row is needed.
+    changed = [
+        getattr(models.User, key).is_distinct_from(value)
+        for key, value in update_data.items()
+        if key in TOKEN_VERSION_FIELDS
+    ]
+    values = dict(update_data)
+    if changed:
+        values["token_version"] = models.User.token_version + case((or_(*changed), 1), else_=0)
+
+    before = _audit_snapshot(db, models.User, (models.User.id == user_id,), list(update_data))
+    stmt = (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(**values)
+        .returning(models.User)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    db_user = db.scalars(stmt).first() if values else db.get(models.User, user_id)
+    if db_user is None:
+        db.rollback()
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
+    if update_data.keys() & SEARCH_FIELDS:
+        search.index_user(db, db_user)
+    version, is_active = db_user.token_version, db_user.is_active
     db.commit()
-    db.refresh(db_user)
+    # Only once committed: a rolled-back batch must not leave the new version
+    # in the revocation map, where it would reject the still-valid tokens.
+    after_commit(lambda: revocation.set_version(user_id, version, is_active))
+    audit.record("user", db_user.id, "updated", before, _row_values(db_user, update_data))
     return db_user
+
+
+# Reporting lines (closure table maintenance). These run inside the caller's
+# transaction and touch only the rows of the moved subtree.
+def _check_manager_exists(db: Session, manager_id: int):
+    if db.query(models.User.id).filter(models.User.id == manager_id).first() is None:
+        raise HTTPException(status_code=400, detail=f"Manager with id {manager_id} not found.")
+
+def _closure_add(db: Session, user_id: int, manager_id: t.Optional[int]):
+    closure = models.UserClosure
+    # SQLite may reuse the id of a user removed without going through delete_user.
+    db.execute(
+        delete(closure)
+        .where(or_(closure.ancestor_id == user_id, closure.descendant_id == user_id))
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(insert(closure).values(ancestor_id=user_id, descendant_id=user_id, depth=0))
+    if manager_id is not None:
+        db.execute(insert(closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(closure.ancestor_id, literal(user_id), closure.depth + 1)
+            .where(closure.descendant_id == manager_id),
+        ))
+
+def _closure_move(db: Session, user_id: int, new_manager_id: t.Optional[int]):
+    closure = models.UserClosure
+    subtree = select(closure.descendant_id).where(closure.ancestor_id == user_id)
+    if new_manager_id is not None:
+        _check_manager_exists(db, new_manager_id)
+        if new_manager_id == user_id or db.execute(
+            select(closure.depth).where(closure.ancestor_id == user_id, closure.descendant_id == new_manager_id)
+        ).first():
+            raise HTTPException(status_code=400, detail="A user cannot report to someone in their own team.")
+    # Detach the subtree from its old ancestors, then hang it under the new manager.
+    db.execute(
+        delete(closure)
+        .where(closure.descendant_id.in_(subtree), closure.ancestor_id.not_in(subtree))
+        .execution_options(synchronize_session=False)
+    )
+    if new_manager_id is not None:
+        above, below = aliased(closure), aliased(closure)
+        db.execute(insert(closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+            .select_from(above)
+            .join(below, true()) # Every ancestor of the new manager x every member of the subtree
+            .where(above.descendant_id == new_manager_id, below.ancestor_id == user_id),
+        ))
+
+def _closure_remove(db: Session, user_id: int):
+    # Direct reports move up to the removed user's manager; paths through the
+    # removed user get one level shorter.
+    closure = models.UserClosure
+    below = select(closure.descendant_id).where(closure.ancestor_id == user_id, closure.depth > 0)
+    above = select(closure.ancestor_id).where(closure.descendant_id == user_id, closure.depth > 0)
+    db.execute(
+        update(closure)
+        .where(closure.descendant_id.in_(below), closure.ancestor_id.in_(above))
+        .values(depth=closure.depth - 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        delete(closure)
+        .where(or_(closure.ancestor_id == user_id, closure.descendant_id == user_id))
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(models.User)
+        .where(models.User.manager_id == user_id)
+        .values(manager_id=select(models.User.manager_id).where(models.User.id == user_id).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+
+def rebuild_user_closure(db: Session):
+    """Recompute the whole closure table from manager_id in one set-based pass."""
+    closure = models.UserClosure
+    tree = (
+        select(
+            models.User.id.label("ancestor_id"),
+            models.User.id.label("descendant_id"),
+            literal(0).label("depth"),
+        )
+        .cte("tree", recursive=True)
+    )
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, models.User.id, tree.c.depth + 1)
+        .where(models.User.manager_id == tree.c.descendant_id)
+    )
+    db.execute(delete(closure).execution_options(synchronize_session=False))
+    db.execute(insert(closure).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth),
+    ))
+    db.commit()
+
+def ensure_user_closure(db: Session):
+    # Backfill for databases that had users before reporting lines existed.
+    if db.query(models.UserClosure).first() is None and db.query(models.User.id).first() is not None:
+        rebuild_user_closure(db)
+
+def get_team_leaves(db: Session, manager_id: int, skip: int = 0, limit: int = 100) -> t.List[schemas.Leave]:
+    closure = models.UserClosure
+    return (
+        db.query(models.Leave)
+        .join(closure, closure.descendant_id == models.Leave.user_id)
+        .filter(closure.ancestor_id == manager_id, closure.depth > 0)
+        .order_by(models.Leave.from_date, models.Leave.id)
+        .offset(skip).limit(limit).all()
+    )
+
+def get_team_wfhs(db: Session, manager_id: int, skip: int = 0, limit: int = 100) -> t.List[schemas.WFH]:
+    closure = models.UserClosure
+    return (
+        db.query(models.WFH)
+        .join(closure, closure.descendant_id == models.WFH.user_id)
+        .filter(closure.ancestor_id == manager_id, closure.depth > 0)
+        .order_by(models.WFH.from_date, models.WFH.id)
+        .offset(skip).limit(limit).all()
+    )
+
+def get_team_availability(db: Session, manager_id: int, on: date) -> schemas.TeamAvailability:
+    closure = models.UserClosure
+    team_size = db.query(func.count()).select_from(closure).filter(
+        closure.ancestor_id == manager_id, closure.depth > 0
+    ).scalar()
+    away = {}
+    for kind, model, approved in (
+        ("leave", models.Leave, models.LeaveStatus.APPROVED),
+        ("wfh", models.WFH, models.WFHStatus.APPROVED),
+    ):
+        away[kind] = [
+            user_id for (user_id,) in db.query(model.user_id).distinct()
+            .join(closure, closure.descendant_id == model.user_id)
+            .filter(
+                closure.ancestor_id == manager_id, closure.depth > 0,
+                model.status == approved, model.from_date <= on, model.to_date >= on,
+            )
+            .order_by(model.user_id)
+        ]
+    return schemas.TeamAvailability(date=on, team_size=team_size, on_leave=away["leave"], wfh=away["wfh"])
+
+
+def get_group_member_ids(db: Session, manager_id: t.Optional[int] = None) -> t.List[int]:
+    # All active users, or a manager's reporting subtree.
+    if manager_id is None:
+        query = db.query(models.User.id).filter(models.User.is_active.is_(True))
+    else:
+        closure = models.UserClosure
+        query = db.query(closure.descendant_id).filter(closure.ancestor_id == manager_id, closure.depth > 0)
+    return [user_id for (user_id,) in query]
+
+def get_capacity(
+    db: Session,
+    start: date,
+    end: date,
+    manager_id: t.Optional[int] = None,
+    include_pending: bool = False,
+    min_available: t.Optional[int] = None,
+) -> schemas.CapacityHeatmap:
+    members = get_group_member_ids(db, manager_id)
+    categories = availability.CATEGORIES if include_pending else ("leave", "wfh")
+    counts = availability.index_for().counts(db, members, start, end, categories)
+    on_leave, wfh = counts["leave"], counts["wfh"]
+    if include_pending:
+        on_leave = [a + b for a, b in zip(on_leave, counts["leave_pending"])]
+        wfh = [a + b for a, b in zip(wfh, counts["wfh_pending"])]
+    available = [len(members) - n for n in on_leave]
+    shortfall = []
+    if min_available is not None:
+        shortfall = [day for day, n in zip(availability.days(start, end), available) if n < min_available]
+    return schemas.CapacityHeatmap(
+        start=start, end=end, group_size=len(members),
+        on_leave=on_leave, wfh=wfh, available=available, shortfall=shortfall,
+    )
+
+
+def _after_keyset(query, sort_col, id_col, kind: str, after):
+    # Restrict one UNION ALL branch (whose rows all share `kind`) to rows after
+    # the (sort value, kind, id) cursor. Comparing kind in Python keeps each
+    # branch a plain range scan on its (sort_col, id) index.
+    if after is None:
+        return query
+    after_value, after_kind, after_id = after
+    if kind > after_kind:
+        return query.where(sort_col >= after_value)
+    if kind == after_kind:
+        return query.where(or_(
+            sort_col > after_value,
+            and_(sort_col == after_value, id_col > after_id),
+        ))
+    return query.where(sort_col > after_value)
+
+
+# Admin approval queue
+def get_pending_queue(
+    db: Session,
+    after: t.Optional[t.Tuple[datetime, str, int]] = None,
+    limit: int = 50,
+):
+    """
+    Pending leave and WFH requests across all users, oldest first, with owner
+    details joined in. Keyset-paginated on (created_at, kind, id): each branch
+    reads at most `limit` rows from its partial pending index before merging.
+    """
+    branches = []
+    for kind, model, leave_type in (
+        ("leave", models.Leave, models.Leave.leave_type),
+        ("wfh", models.WFH, null()),
+    ):
+        query = select(
+            literal(kind).label("kind"),
+            model.id,
+            model.user_id,
+            model.from_date,
+            model.to_date,
+            leave_type.label("leave_type"),
+            model.num_days,
+            model.comments,
+            model.created_at,
+            model.version,
+        ).where(model.status == PENDING_STATUS)
+        query = _after_keyset(query, model.created_at, model.id, kind, after)
+        branches.append(query.order_by(model.created_at, model.id).limit(limit).subquery())
+
+    merged = union_all(*(select(branch) for branch in branches)).subquery()
+    stmt = (
+        select(merged, models.User.email, models.User.first_name, models.User.last_name)
+        .join(models.User, models.User.id == merged.c.user_id)
+        .order_by(merged.c.created_at, merged.c.kind, merged.c.id)
+        .limit(limit)
+    )
+    return db.execute(stmt).mappings().all()
+
+
+# Per-user timeline
+def get_user_timeline(
+    db: Session,
+    user_id: int,
+    window_start: t.Optional[date] = None,
+    window_end: t.Optional[date] = None,
+    after: t.Optional[t.Tuple[date, str, int]] = None,
+    limit: int = 100,
+):
+    """
+    A user's leave and WFH requests as one stream ordered by (from_date, kind, id),
+    limited to requests overlapping [window_start, window_end]. Each branch is a
+    range scan on its (user_id, from_date) index; archived years are included
+    when the window reaches back past the archive horizon.
+    """
+    branches = []
+    for kind, model in (("leave", models.Leave), ("wfh", models.WFH)):
+        rows = archive.source(db, model, window_start, window_end).c
+        query = select(
+            literal(kind).label("kind"),
+            rows.id,
+            rows.user_id,
+            rows.from_date,
+            rows.to_date,
+            rows.status,
+            (rows.leave_type if kind == "leave" else null()).label("leave_type"),
+            rows.num_days,
+            rows.comments,
+            rows.version,
+        ).where(rows.user_id == user_id)
+        if window_start is not None:
+            query = query.where(rows.to_date >= window_start)
+        if window_end is not None:
+            query = query.where(rows.from_date <= window_end)
+        query = _after_keyset(query, rows.from_date, rows.id, kind, after)
+        branches.append(query.order_by(rows.from_date, rows.id).limit(limit).subquery())
+
+    merged = union_all(*(select(branch) for branch in branches)).subquery()
+    stmt = select(merged).order_by(merged.c.from_date, merged.c.kind, merged.c.id).limit(limit)
+    return db.execute(stmt).mappings().all()
+
+
+# Attendance
+ATTENDANCE_CODES = {
+    "O": "office",
+    "W": "wfh",
+    "A": "annual leave",
+    "S": "sick leave",
+    "U": "unpaid leave",
+    "L": "other leave",
+    "H": "holiday",
+    "-": "weekend",
+}
+LEAVE_TYPE_CODES = {
+    models.LeaveType.ANNUAL: "A",
+    models.LeaveType.SICK: "S",
+    models.LeaveType.UNPAID: "U",
+    models.LeaveType.OTHER: "L",
+}
+
+def _month_bounds(month: date) -> t.Tuple[date, date]:
+    first = month.replace(day=1)
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return first, following - timedelta(days=1)
+
+def _invalidate_attendance(
+    db: Session, user_id: t.Optional[int], from_date: t.Optional[date] = None, to_date: t.Optional[date] = None
+):
+    # Runs inside the caller's transaction, so the cache can't outlive the write.
+    stmt = delete(models.AttendanceMonth)
+    if user_id is not None:
+        stmt = stmt.where(models.AttendanceMonth.user_id == user_id)
+    if from_date is not None:
+        stmt = stmt.where(
+            models.AttendanceMonth.month >= from_date.replace(day=1),
+            models.AttendanceMonth.month <= to_date.replace(day=1),
+        )
+    db.execute(stmt)
+
+def _compute_attendance(db: Session, user_ids: t.List[int], month: date) -> t.Dict[int, str]:
+    first, last = _month_bounds(month)
+    holidays = {
+        day for (day,) in db.query(models.Holiday.date).filter(models.Holiday.date.between(first, last))
+    }
+    template = [
+        "H" if day in holidays else "-" if day.weekday() >= 5 else "O"
+        for day in (first + timedelta(days=n) for n in range(last.day))
+    ]
+    days = {user_id: list(template) for user_id in user_ids}
+
+    def spans(model, approved, *columns):
+        rows = archive.source(db, model, first, last).c
+        return db.query(rows.user_id, rows.from_date, rows.to_date, *(rows[name] for name in columns)).filter(
+            rows.user_id.in_(user_ids),
+            rows.status == approved,
+            rows.from_date <= last,
+            rows.to_date >= first,
+        )
+
+    # WFH first so that leave wins when both cover a day.
+    marks = [(user_id, start, end, "W") for user_id, start, end in spans(models.WFH, models.WFHStatus.APPROVED)]
+    marks += [
+        (user_id, start, end, LEAVE_TYPE_CODES[leave_type])
+        for user_id, start, end, leave_type in spans(models.Leave, models.LeaveStatus.APPROVED, "leave_type")
+    ]
+    for user_id, start, end, code in marks:
+        row = days[user_id]
+        for n in range(max(start, first).day - 1, min(end, last).day):
+            if row[n] in ("O", "W"):
+                row[n] = code
+    return {user_id: "".join(row) for user_id, row in days.items()}
+
+def get_attendance(db: Session, user_ids: t.List[int], month: date) -> t.Dict[int, str]:
+    """
+    Attendance codes for each of user_ids in the given month. Cached months are
+    read back as-is; missing ones are computed in one batch and stored.
+    """
+    # Cache misses are written back, so read the sources from the primary
+    # rather than a possibly stale replica.
+    use_primary(db)
+    month = month.replace(day=1)
+    cached = dict(
+        db.query(models.AttendanceMonth.user_id, models.AttendanceMonth.codes).filter(
+            models.AttendanceMonth.month == month,
+            models.AttendanceMonth.user_id.in_(user_ids),
+        )
+    )
+    missing = [user_id for user_id in user_ids if user_id not in cached]
+    if missing:
+        computed = _compute_attendance(db, missing, month)
+        try:
+            db.execute(insert(models.AttendanceMonth), [
+                {"user_id": user_id, "month": month, "codes": codes, "computed_at": datetime.utcnow()}
+                for user_id, codes in computed.items()
+            ])
+            db.commit()
+        except IntegrityError:
+            # A concurrent request filled the same months first.
+            db.rollback()
+        cached.update(computed)
+    return {user_id: cached[user_id] for user_id in user_ids}
+
+def get_holidays(db: Session, year: int) -> t.List[schemas.Holiday]:
+    return db.query(models.Holiday).filter(
+        models.Holiday.date.between(date(year, 1, 1), date(year, 12, 31))
+    ).order_by(models.Holiday.date).all()
+
+def create_holiday(db: Session, holiday: schemas.HolidayCreate):
+    db_holiday = models.Holiday(**holiday.model_dump())
+    db.add(db_holiday)
+    _invalidate_attendance(db, None, holiday.date, holiday.date)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A holiday already exists on that date")
+    db.refresh(db_holiday)
+    return db_holiday
+
+def delete_holiday(db: Session, holiday_id: int):
+    stmt = (
+        delete(models.Holiday)
+        .where(models.Holiday.id == holiday_id)
+        .returning(models.Holiday.id, models.Holiday.date, models.Holiday.name)
+    )
+    holiday = db.execute(stmt).mappings().first()
+    if holiday is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Holiday not found")
+    _invalidate_attendance(db, None, holiday["date"], holiday["date"])
+    db.commit()
+    return schemas.Holiday(**holiday)
+
+
+# Accrual
+ACCRUAL_CHUNK_SIZE = 500
+
+def get_accrual_policies(db: Session) -> t.List[schemas.AccrualPolicy]:
+    return db.query(models.AccrualPolicy).order_by(models.AccrualPolicy.id).all()
+
+def create_accrual_policy(db: Session, policy: schemas.AccrualPolicyCreate):
+    if policy.is_default:
+        db.execute(update(models.AccrualPolicy).values(is_default=False))
+    db_policy = models.AccrualPolicy(**policy.model_dump())
+    db.add(db_policy)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="An accrual policy with that name already exists")
+    db.refresh(db_policy)
+    return db_policy
+
+def _ledger_missing(user_id_col, period: str, kind: str):
+    ledger = models.AccrualLedger
+    return ~select(ledger.id).where(
+        ledger.user_id == user_id_col, ledger.period == period, ledger.kind == kind
+    ).exists()
+
+def run_accrual(db: Session, period: date, chunk_size: int = ACCRUAL_CHUNK_SIZE) -> schemas.AccrualRun:
+    """
+    Credit every active user's monthly accrual for `period` and, in January,
+    forfeit balances above the policy's carry-over cap. Each chunk of user ids
+    is one INSERT ... SELECT in its own transaction; rows already in the ledger
+    are skipped, so rerunning a period (or resuming a failed run) is safe.
+    """
+    user, policy, ledger = models.User, models.AccrualPolicy, models.AccrualLedger
+    label = period.strftime("%Y-%m")
+    year_start = date(period.year, 1, 1)
+    default_policy = (
+        select(policy.id).where(policy.is_default.is_(True)).order_by(policy.id).limit(1).scalar_subquery()
+    )
+    earned = (
+        select(ledger.user_id, func.sum(ledger.days).label("days"))
+        .where(ledger.period < year_start.strftime("%Y-%m"))
+        .group_by(ledger.user_id)
+        .subquery()
+    )
+    leaves = archive.source(db, models.Leave).c
+    taken = (
+        select(leaves.user_id, func.sum(leaves.num_days).label("days"))
+        .where(
+            leaves.status == models.LeaveStatus.APPROVED,
+            leaves.leave_type == models.LeaveType.ANNUAL,
+            leaves.from_date < year_start,
+        )
+        .group_by(leaves.user_id)
+        .subquery()
+    )
+    excess = (
+        func.coalesce(earned.c.days, 0) + user.granted_additional_days
+        - func.coalesce(taken.c.days, 0) - policy.carry_over_cap
+    )
+    columns = [ledger.user_id, ledger.period, ledger.kind, ledger.days, ledger.policy_id, ledger.created_at]
+
+    lowest, highest = db.query(func.min(user.id), func.max(user.id)).one()
+    accrued = expired = 0
+    if lowest is None:
+        return schemas.AccrualRun(period=label, accrued=0, expired=0)
+    for chunk_start in range(lowest, highest + 1, chunk_size):
+        in_chunk = (
+            user.is_active.is_(True),
+            user.id >= chunk_start,
+            user.id < chunk_start + chunk_size,
+        )
+        joined = select(user).join(policy, policy.id == func.coalesce(user.accrual_policy_id, default_policy))
+        if period.month == 1:
+            expiry = (
+                joined.with_only_columns(
+                    user.id, literal(label), literal("expiry"), -excess, policy.id, literal(datetime.utcnow()),
+                )
+                .outerjoin(earned, earned.c.user_id == user.id)
+                .outerjoin(taken, taken.c.user_id == user.id)
+                .where(*in_chunk, policy.carry_over_cap.is_not(None), excess > 0, _ledger_missing(user.id, label, "expiry"))
+            )
+            expired += db.execute(insert(ledger).from_select(columns, expiry)).rowcount
+        credit = joined.with_only_columns(
+            user.id, literal(label), literal("accrual"), policy.days_per_month, policy.id, literal(datetime.utcnow()),
+        ).where(*in_chunk, _ledger_missing(user.id, label, "accrual"))
+        accrued += db.execute(insert(ledger).from_select(columns, credit)).rowcount
+        db.commit()
+    return schemas.AccrualRun(period=label, accrued=accrued, expired=expired)
+
+def get_accrual_balance(db: Session, user_id: int) -> schemas.AccrualBalance:
+    user = get_user(db, user_id)
+    accrued = db.query(func.coalesce(func.sum(models.AccrualLedger.days), 0.0)).filter(
+        models.AccrualLedger.user_id == user_id
+    ).scalar()
+    leaves = archive.source(db, models.Leave).c
+    taken = db.query(func.coalesce(func.sum(leaves.num_days), 0)).filter(
+        leaves.user_id == user_id,
+        leaves.status == models.LeaveStatus.APPROVED,
+        leaves.leave_type == models.LeaveType.ANNUAL,
+    ).scalar()
+    return schemas.AccrualBalance(
+        user_id=user_id,
+        accrued=accrued,
+        granted_additional_days=user.granted_additional_days,
+        taken=taken,
+        balance=accrued + user.granted_additional_days - taken,
+    )
+
+
+# Scheduled maintenance
+def claim_scheduler_slot(db: Session, name: str, slot: datetime, owner: str, lease_seconds: int) -> bool:
+    """
+    Claim the run of job `name` for `slot`. One conditional UPDATE decides the
+    winner among concurrent processes; it fails if the slot was already run or
+    a previous run still holds an unexpired lease.
+    """
+    lock = models.SchedulerLock
+    if db.get(lock, name) is None:
+        try:
+            db.execute(insert(lock).values(name=name))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(lock)
+        .where(
+            lock.name == name,
+            or_(lock.last_slot.is_(None), lock.last_slot < slot),
+            or_(lock.locked_until.is_(None), lock.locked_until < now),
+        )
+        .values(last_slot=slot, owner=owner, locked_until=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+def release_scheduler_lock(db: Session, name: str, owner: str):
+    lock = models.SchedulerLock
+    db.execute(
+        update(lock)
+        .where(lock.name == name, lock.owner == owner)
+        .values(locked_until=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+def expire_pending_requests(db: Session, today: date, chunk_size: int = 500) -> t.Dict[str, int]:
+    """
+    Cancel pending leave/WFH requests whose from_date has passed, chunk_size
+    rows per UPDATE and transaction. Attendance only shows approved requests,
+    so no cached months need invalidating. Each cancellation is audited with
+    the system as the actor.
+    """
+    with audit.acting_as(audit.SYSTEM):
+        return _expire_pending(db, today, chunk_size)
+
+def _expire_pending(db: Session, today: date, chunk_size: int) -> t.Dict[str, int]:
+    expired = {}
+    for kind, model, pending, cancelled in (
+        ("leave", models.Leave, models.LeaveStatus.PENDING, models.LeaveStatus.CANCELLED),
+        ("wfh", models.WFH, models.WFHStatus.PENDING, models.WFHStatus.CANCELLED),
+    ):
+        expired[kind] = 0
+        while True:
+            chunk = (
+                select(model.id)
+                .where(model.status == PENDING_STATUS, model.from_date < today)
+                .order_by(model.id)
+                .limit(chunk_size)
+                .scalar_subquery()
+            )
+            rows = db.execute(
+                update(model)
+                .where(model.id.in_(chunk))
+                .values(status=cancelled, version=model.version + 1)
+                .returning(model.id, model.user_id, model.status)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            for row in rows:
+                audit.record(kind, row.id, "updated", {"status": pending}, {"status": cancelled})
+                events.publish(kind, "updated", row)
+            expired[kind] += len(rows)
+            if len(rows) < chunk_size:
+                break
+    return expired
+
+def purge_attendance_cache(db: Session, older_than: datetime) -> int:
+    purged = db.execute(
+        delete(models.AttendanceMonth).where(models.AttendanceMonth.computed_at < older_than)
+    ).rowcount
+    db.commit()
+    return purged
+
+
+# Calendar feeds
+def get_calendar_rows(db: Session, owner_id: int, team: bool, since: date):
+    """
+    Approved leave and WFH for a user (or everyone reporting to them when
+    `team` is set) that ends on or after `since`.
+    """
+    closure = models.UserClosure
+    rows = []
+    for kind, model, approved in (
+        ("leave", models.Leave, models.LeaveStatus.APPROVED),
+        ("wfh", models.WFH, models.WFHStatus.APPROVED),
+    ):
+        source = archive.source(db, model, since).c
+        query = (
+            db.query(
+                literal(kind).label("kind"),
+                source.id,
+                source.user_id,
+                source.from_date,
+                source.to_date,
+                (source.leave_type if kind == "leave" else null()).label("leave_type"),
+                source.created_at,
+                models.User.first_name,
+                models.User.last_name,
+                models.User.email,
+            )
+            .join(models.User, models.User.id == source.user_id)
+            .filter(source.status == approved, source.to_date >= since)
+        )
+        if team:
+            query = query.join(closure, closure.descendant_id == source.user_id).filter(
+                closure.ancestor_id == owner_id, closure.depth > 0
+            )
+        else:
+            query = query.filter(source.user_id == owner_id)
+        rows.extend(query.order_by(source.from_date, source.id).all())
+    return rows
+
+
+# Audit log
+def get_audit_log(
+    db: Session,
+    entity: t.Optional[str] = None,
+    entity_id: t.Optional[int] = None,
+    actor_id: t.Optional[int] = None,
+    since: t.Optional[datetime] = None,
+    until: t.Optional[datetime] = None,
+    before: t.Optional[t.Tuple[datetime, int]] = None,
+    limit: int = 100,
+) -> t.List[models.AuditLog]:
+    """
+    Audit entries, newest first. `before` is the (occurred_at, id) keyset of the
+    last entry of the previous page.
+    """
+    log = models.AuditLog
+    query = db.query(log)
+    if entity is not None:
+        query = query.filter(log.entity == entity)
+        if entity_id is not None:
+            query = query.filter(log.entity_id == entity_id)
+    if actor_id is not None:
+        query = query.filter(log.actor_id == actor_id)
+    if since is not None:
+        query = query.filter(log.occurred_at >= since)
+    if until is not None:
+        query = query.filter(log.occurred_at < until)
+    if before is not None:
+        occurred_at, entry_id = before
+        query = query.filter(
+            or_(log.occurred_at < occurred_at, and_(log.occurred_at == occurred_at, log.id < entry_id))
+        )
+    return query.order_by(log.occurred_at.desc(), log.id.desc()).limit(limit).all()
+
+
+# Search
+def search_documents(
+    db: Session, query: str, kinds: t.Optional[t.List[str]] = None, limit: int = 20, offset: int = 0
+) -> schemas.SearchPage:
+    if not search.tokens(query):
+        raise HTTPException(status_code=400, detail="Search query has no words")
+    hits, more = search.search(db, query, kinds=kinds, limit=limit, offset=offset)
+    return schemas.SearchPage(
+        items=[schemas.SearchHit(**hit) for hit in hits],
+        next_offset=offset + limit if more else None,
+    )
@@ -1,8 +1,9 @@
-from sqlalchemy import Boolean, Column, Integer, String, Date, ForeignKey, Enum as SAEnum
+from sqlalchemy import Boolean, Column, Integer, String, Text, Date, DateTime, Float, ForeignKey, Index, LargeBinary, UniqueConstraint, Enum as SAEnum, func, text
 from sqlalchemy.orm import relationship
 
 from .session import Base
 import enum
+from datetime import datetime
 
 class LeaveStatus(enum.Enum):
     PENDING = "pending"
@@ -34,11 +35,34 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
     granted_additional_days = Column(Integer, default=0, nullable=False)
+    token_version = Column(Integer, default=0, nullable=False)
+    manager_id = Column(Integer, ForeignKey("user.id"), nullable=True, index=True)
+    # Falls back to the default accrual policy when unset.
+    accrual_policy_id = Column(Integer, ForeignKey("accrual_policy.id"), nullable=True)
 
     leaves = relationship("Leave", back_populates="owner")
     wfhs = relationship("WFH", back_populates="owner")
 
 
+# Case-insensitive prefix lookups (crud.lookup_users) are range scans on these.
+Index("ix_user_email_lower", func.lower(User.email))
+Index("ix_user_first_name_lower", func.lower(User.first_name))
+Index("ix_user_last_name_lower", func.lower(User.last_name))
+
+
+class UserClosure(Base):
+    """
+    Transitive closure of the reporting lines: one row per (manager, report)
+    pair at any distance, plus a depth-0 row per user. A manager's whole subtree
+    is then a single indexed lookup on ancestor_id.
+    """
+    __tablename__ = "user_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("user.id"), primary_key=True, index=True)
+    depth = Column(Integer, nullable=False)
+
+
 class Leave(Base):
     __tablename__ = "leave"
 
@@ -50,9 +74,23 @@ class Leave(Base):
     leave_type = Column(SAEnum(LeaveType), nullable=False)
     comments = Column(String, nullable=True)
     num_days = Column(Integer, nullable=False)
+    # Bumped on every update; exposed as the ETag for optimistic concurrency.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=text("CURRENT_TIMESTAMP"))
 
     owner = relationship("User", back_populates="leaves")
 
+    __table_args__ = (
+        # Partial index: only pending rows, so the approval queue stays small
+        # no matter how much decided history accumulates.
+        Index(
+            "ix_leave_pending_queue", "created_at", "id",
+            sqlite_where=text("status = 'PENDING'"),
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+        Index("ix_leave_user_from_date", "user_id", "from_date"),
+    )
+
 
 class WFH(Base):
     __tablename__ = "wfh"
@@ -64,5 +102,148 @@ class WFH(Base):
     status = Column(SAEnum(WFHStatus), default=WFHStatus.PENDING, nullable=False)
     comments = Column(String, nullable=True)
     num_days = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=text("CURRENT_TIMESTAMP"))
 
     owner = relationship("User", back_populates="wfhs")
+
+    __table_args__ = (
+        Index(
+            "ix_wfh_pending_queue", "created_at", "id",
+            sqlite_where=text("status = 'PENDING'"),
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+        Index("ix_wfh_user_from_date", "user_id", "from_date"),
+    )
+
+
+class Holiday(Base):
+    __tablename__ = "holiday"
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date, nullable=False, unique=True, index=True)
+    name = Column(String, nullable=False)
+
+
+class AttendanceMonth(Base):
+    """
+    Cached month of per-day attendance codes for one user, one character per
+    day (see crud.ATTENDANCE_CODES). Rows are deleted by any leave/WFH write or
+    holiday change touching the month and recomputed on the next read.
+    """
+    __tablename__ = "attendance_month"
+
+    user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    month = Column(Date, primary_key=True) # First day of the month
+    codes = Column(String, nullable=False)
+    computed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class AccrualPolicy(Base):
+    __tablename__ = "accrual_policy"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+    days_per_month = Column(Float, nullable=False)
+    # Balance above this is forfeited at the start of each year; NULL = no cap.
+    carry_over_cap = Column(Float, nullable=True)
+    # Applies to users without an explicit policy. At most one should be set.
+    is_default = Column(Boolean, nullable=False, default=False)
+
+
+class AccrualLedger(Base):
+    """
+    Leave entitlement credits and debits, one row per (user, period, kind).
+    The unique key makes a rerun of the same period a no-op.
+    """
+    __tablename__ = "accrual_ledger"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    period = Column(String, nullable=False) # YYYY-MM
+    kind = Column(String, nullable=False) # "accrual" or "expiry"
+    days = Column(Float, nullable=False)
+    policy_id = Column(Integer, ForeignKey("accrual_policy.id"), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("user_id", "period", "kind", name="uq_accrual_ledger_user_period_kind"),)
+
+
+class SchedulerLock(Base):
+    """
+    One row per scheduled job. A process runs a job only after claiming the
+    current slot here, so with several workers each run happens exactly once.
+    """
+    __tablename__ = "scheduler_lock"
+
+    name = Column(String, primary_key=True)
+    last_slot = Column(DateTime, nullable=True) # Start of the last claimed run
+    owner = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True) # Lease while the job runs
+
+
+class AuditLog(Base):
+    """Append-only record of changes; written in batches by app.core.audit."""
+    __tablename__ = "audit_log"
+
+    id = Column(Integer, primary_key=True)
+    occurred_at = Column(DateTime, nullable=False)
+    actor_id = Column(Integer, nullable=True) # No FK: entries outlive deleted users
+    entity = Column(String, nullable=False) # "leave", "wfh" or "user"
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False) # "updated" or "deleted"
+    changes = Column(Text, nullable=False) # JSON {field: [old, new]}
+
+    __table_args__ = (
+        Index("ix_audit_log_entity", "entity", "entity_id", "occurred_at"),
+        Index("ix_audit_log_occurred_at", "occurred_at"),
+    )
+
+
+class ChangeEventLog(Base):
+    """
+    Recent change events, polled by every worker process (see
+    app.core.events.Relay) so subscribers and caches hear about writes made
+    in other processes. Rows are deleted after a few minutes.
+    """
+    __tablename__ = "change_event_log"
+
+    id = Column(Integer, primary_key=True)
+    origin = Column(String, nullable=False) # The writing process, which already delivered it
+    entity = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    status = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class IdempotencyKey(Base):
+    """
+    A POST sent with an Idempotency-Key (see app.core.idempotency): reserved
+    before the request runs, then holding its response for retries.
+    """
+    __tablename__ = "idempotency_key"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False) # No FK, like audit_log
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False) # sha256 of method, path, query and body
+    status = Column(Integer, nullable=True) # None while the first request runs
+    headers = Column(Text, nullable=True) # JSON [[name, value], ...]
+    body = Column(LargeBinary, nullable=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_key_user_key"),
+        Index("ix_idempotency_key_expires_at", "expires_at"),
+    )
+
+
+class ArchivePartition(Base):
+    """One row per archive table (e.g. leave_archive_2023); see app.db.archive."""
+    __tablename__ = "archive_partition"
+
+    entity = Column(String, primary_key=True) # "leave" or "wfh"
+    year = Column(Integer, primary_key=True) # from_date year of the rows it holds
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,179 @@
+"""
+Read replica selection.
+
+GET requests are served from a replica when one is fresh enough; everything
+else, and any read by a user who wrote within the staleness window, goes to the
+primary so people always see their own changes. SQLite replicas are plain file
+copies of the primary refreshed by `sync_sqlite_replicas`, which makes the
+whole setup testable locally with two database files. Each copy is stamped,
+inside the replica, with the time it was taken, so every worker judges a
+replica's lag from the same shared state, whichever process wrote or synced.
+
+A user's last write is remembered in this process and, through
+ReadYourWritesMiddleware, in a short-lived cookie holding its (wall-clock)
+time, so the stickiness holds when the next request lands on another worker.
+"""
+import asyncio
+import itertools
+import math
+import sqlite3
+import time
+import typing as t
+from contextvars import ContextVar
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+# Set by the auth dependency so the session can apply read-your-writes stickiness.
+current_user_id: ContextVar[t.Optional[int]] = ContextVar("current_user_id", default=None)
+
+COOKIE = "last_write"
+# Per request, set by ReadYourWritesMiddleware: {"last_write": the cookie's
+# time or None, "wrote": when this request committed a write or None}. A dict,
+# so a write in the endpoint's worker thread is seen by the middleware.
+_request_writes: ContextVar[t.Optional[dict]] = ContextVar("request_writes", default=None)
+
+# Read-your-writes entries older than this many windows are pruned.
+_PRUNE_AFTER = 10_000
+
+# Table in each managed replica holding the (wall-clock) time its copy was taken.
+SYNC_TABLE = "replica_sync"
+# How long a replica's stamp is reused before it is read again.
+STAMP_CHECK_SECONDS = 1.0
+
+
+class Replica:
+    def __init__(self, engine: Engine, managed: bool = False):
+        self.engine = engine
+        # Managed replicas are copies made by sync_sqlite_replicas: their lag
+        # is at most the age of the copy's stamp.
+        self.managed = managed
+        self._synced_at: t.Optional[float] = None
+        self._checked_at = float("-inf")
+
+    def synced_at(self) -> t.Optional[float]:
+        """When the replica's data was copied from the primary, or None if never."""
+        now = time.monotonic()
+        if now - self._checked_at >= STAMP_CHECK_SECONDS:
+            try:
+                with self.engine.connect() as conn:
+                    self._synced_at = conn.exec_driver_sql(f"SELECT max(synced_at) FROM {SYNC_TABLE}").scalar()
+            except DBAPIError:
+                self._synced_at = None  # Not synced yet
+            self._checked_at = now
+        return self._synced_at
+
+    def _stamped(self, synced_at: float) -> None:
+        self._synced_at, self._checked_at = synced_at, time.monotonic()
+
+
+class ReplicaSet:
+    def __init__(self, replicas: t.Sequence[Replica] = (), max_staleness: float = 5.0):
+        self.replicas = list(replicas)
+        self.max_staleness = max_staleness
+        self._last_write: t.Dict[int, float] = {}
+        self._next = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def note_write(self, user_id: t.Optional[int]) -> None:
+        writes = _request_writes.get()
+        if writes is not None:
+            writes["wrote"] = time.time()
+        now = time.monotonic()
+        if user_id is not None:
+            self._last_write[user_id] = now
+            if len(self._last_write) > _PRUNE_AFTER:
+                cutoff = now - self.max_staleness
+                self._last_write = {
+                    uid: at for uid, at in self._last_write.items() if at >= cutoff
+                }
+
+    def choose(self, user_id: t.Optional[int] = None) -> t.Optional[Engine]:
+        """Return a replica engine for a read, or None to use the primary."""
+        now = time.monotonic()
+        if user_id is not None and now - self._last_write.get(user_id, float("-inf")) < self.max_staleness:
+            return None
+        writes = _request_writes.get()
+        if writes is not None and writes["last_write"] is not None and time.time() - writes["last_write"] < self.max_staleness:
+            return None  # The caller wrote recently, maybe through another worker
+        wall = time.time()
+        fresh = [
+            r for r in self.replicas
+            if not r.managed or (synced_at := r.synced_at()) is not None and wall - synced_at <= self.max_staleness
+        ]
+        if not fresh:
+            return None
+        return fresh[next(self._next) % len(fresh)].engine
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware carrying a client's last write time between requests
+    in a cookie that lasts for the staleness window.
+    """
+
+    def __init__(self, app, max_staleness: float):
+        self.app = app
+        self.max_age = max(1, math.ceil(max_staleness))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            last_write = float(HTTPConnection(scope).cookies.get(COOKIE, ""))
+        except ValueError:
+            last_write = None
+        writes = {"last_write": last_write, "wrote": None}
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and writes["wrote"] is not None:
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{COOKIE}={writes['wrote']:.3f}; Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        token = _request_writes.set(writes)
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request_writes.reset(token)
+
+
+def sync_sqlite_replicas(primary: Engine, replica_set: ReplicaSet) -> None:
+    """
+    Copy the primary SQLite database over every managed replica file and stamp
+    the copy. Run it in one process only (app.serve's master, or the app's
+    lifespan when it runs on its own).
+    """
+    for replica in replica_set.replicas:
+        if not replica.managed:
+            continue
+        # The copy has every commit made before it started.
+        started = time.time()
+        source = primary.raw_connection()
+        try:
+            target = sqlite3.connect(replica.engine.url.database)
+            try:
+                source.driver_connection.backup(target)
+                with target:
+                    target.execute(f"CREATE TABLE IF NOT EXISTS {SYNC_TABLE} (synced_at REAL NOT NULL)")
+                    target.execute(f"DELETE FROM {SYNC_TABLE}")
+                    target.execute(f"INSERT INTO {SYNC_TABLE} (synced_at) VALUES (?)", (started,))
+            finally:
+                target.close()
+        finally:
+            source.close()
+        replica._stamped(started)
+
+
+async def sync_loop(primary: Engine, replica_set: ReplicaSet, interval: float) -> None:
+    while True:
+        await asyncio.to_thread(sync_sqlite_replicas, primary, replica_set)
+        await asyncio.sleep(interval)
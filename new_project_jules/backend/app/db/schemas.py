@@ -9,6 +9,8 @@ class UserBase(BaseModel):
     first_name: t.Optional[str] = None
     last_name: t.Optional[str] = None
     granted_additional_days: int = 0
+    manager_id: t.Optional[int] = None
+    accrual_policy_id: t.Optional[int] = None # None: the default accrual policy
 
 
 class UserOut(UserBase):
@@ -32,6 +34,8 @@ class UserEdit(UserBase): # UserBase now includes granted_additional_days, but w
     first_name: t.Optional[str] = None
     last_name: t.Optional[str] = None
     granted_additional_days: t.Optional[int] = None # Explicitly make it optional for editing
+    manager_id: t.Optional[int] = None # Reassigns the user (and their reports) to a new manager
+    accrual_policy_id: t.Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -47,12 +51,14 @@ class Token(BaseModel):
 
 
 class TokenData(BaseModel):
+    id: t.Optional[int] = None
     email: str = None
     permissions: str = "user"
+    version: int = 0
 
 
 # Leave Schemas
-from datetime import date
+from datetime import date, datetime
 from .models import LeaveStatus, LeaveType, WFHStatus
 
 class LeaveBase(BaseModel):
@@ -77,6 +83,7 @@ class LeaveEdit(BaseModel):
 class Leave(LeaveBase):
     id: int
     status: LeaveStatus
+    version: int = 1
     model_config = ConfigDict(from_attributes=True)
 
 # WFH Schemas
@@ -101,4 +108,193 @@ class WFHEdit(BaseModel):
 class WFH(WFHBase):
     id: int
     status: WFHStatus
+    version: int = 1
     model_config = ConfigDict(from_attributes=True)
+
+
+# Admin approval queue
+class QueueOwner(BaseModel):
+    id: int
+    email: str
+    first_name: t.Optional[str] = None
+    last_name: t.Optional[str] = None
+
+class QueueItem(BaseModel):
+    kind: t.Literal["leave", "wfh"]
+    id: int
+    user_id: int
+    from_date: date
+    to_date: date
+    leave_type: t.Optional[LeaveType] = None # Only set for leave requests
+    num_days: int
+    comments: t.Optional[str] = None
+    created_at: datetime
+    version: int
+    owner: QueueOwner
+
+class QueuePage(BaseModel):
+    items: t.List[QueueItem]
+    next_cursor: t.Optional[str] = None # Pass back as ?cursor= to get the next page
+
+
+# Timeline
+class TimelineItem(BaseModel):
+    kind: t.Literal["leave", "wfh"]
+    id: int
+    user_id: int
+    from_date: date
+    to_date: date
+    status: str
+    leave_type: t.Optional[LeaveType] = None # Only set for leave requests
+    num_days: int
+    comments: t.Optional[str] = None
+    version: int
+
+class TimelinePage(BaseModel):
+    items: t.List[TimelineItem]
+    next_cursor: t.Optional[str] = None
+
+
+# Team views
+class TeamAvailability(BaseModel):
+    date: date
+    team_size: int
+    on_leave: t.List[int] # user ids with approved leave on that date
+    wfh: t.List[int] # user ids with approved WFH on that date
+
+class CapacityHeatmap(BaseModel):
+    start: date
+    end: date
+    group_size: int
+    # One entry per day from start to end.
+    on_leave: t.List[int]
+    wfh: t.List[int]
+    available: t.List[int] # group_size minus on_leave; WFH counts as available
+    shortfall: t.List[date] = [] # days where available < min_available
+
+
+# Attendance
+class HolidayCreate(BaseModel):
+    date: date
+    name: str
+
+class Holiday(HolidayCreate):
+    id: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AttendanceRow(BaseModel):
+    user_id: int
+    codes: str # One character per day of the month, see legend
+
+class AttendanceSheet(BaseModel):
+    month: str # YYYY-MM
+    legend: t.Dict[str, str]
+    rows: t.List[AttendanceRow]
+
+
+# Accrual
+class AccrualPolicyCreate(BaseModel):
+    name: str
+    days_per_month: float
+    carry_over_cap: t.Optional[float] = None
+    is_default: bool = False
+
+class AccrualPolicy(AccrualPolicyCreate):
+    id: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AccrualRun(BaseModel):
+    period: str # YYYY-MM
+    accrued: int # users credited
+    expired: int # users whose carry-over was capped
+
+class AccrualBalance(BaseModel):
+    user_id: int
+    accrued: float # sum of ledger credits and debits
+    granted_additional_days: int
+    taken: int # approved annual leave days
+    balance: float
+
+
+# Calendar feeds
+class CalendarLinks(BaseModel):
+    personal: str
+    team: str
+
+
+# Tenants
+class TenantMetrics(BaseModel):
+    tenant: str
+    requests: int
+    server_errors: int
+    request_seconds: float
+    queries: int
+    query_seconds: float
+    pool_checked_out: t.Optional[int] = None # Connections in use right now
+
+
+# Audit log
+class AuditEntry(BaseModel):
+    id: int
+    occurred_at: datetime
+    actor_id: t.Optional[int] = None
+    entity: str
+    entity_id: int
+    action: str
+    changes: t.Dict[str, t.List[t.Any]] # field -> [old, new]
+
+class AuditPage(BaseModel):
+    items: t.List[AuditEntry]
+    next_cursor: t.Optional[str] = None
+
+# Search
+class SearchHit(BaseModel):
+    kind: t.Literal["user", "leave", "wfh"]
+    id: int
+    user_id: int
+    title: str # The user's name for user hits
+    snippet: str # HTML-escaped, matches wrapped in <mark>
+    score: float # Higher is better
+
+class SearchPage(BaseModel):
+    items: t.List[SearchHit]
+    next_offset: t.Optional[int] = None
+
+# User lookup
+class UserLookup(BaseModel):
+    id: int
+    email: str
+    first_name: t.Optional[str] = None
+    last_name: t.Optional[str] = None
+
+# Request policies
+class PolicyViolation(BaseModel):
+    rule: str # e.g. "no_overlap", "notice_days", "blackout"
+    message: str
+
+class PolicyReport(BaseModel):
+    ok: bool
+    violations: t.List[PolicyViolation]
+
+# Batch API
+class BatchOperation(BaseModel):
+    id: t.Optional[str] = None # Echoed back in the result
+    method: t.Literal["GET", "POST", "PUT", "DELETE"]
+    path: str # e.g. "/admin/leaves/3" or "/admin/leaves?ids=1,2,3"; the /api/v1 prefix is optional
+    body: t.Optional[t.Dict[str, t.Any]] = None
+    if_match: t.Optional[str] = None # As the If-Match header of a PUT
+
+class BatchRequest(BaseModel):
+    operations: t.List[BatchOperation]
+    atomic: bool = False # One transaction: if any operation fails, none of the writes are kept
+
+class BatchResult(BaseModel):
+    id: t.Optional[str] = None
+    status: int
+    body: t.Any = None
+    headers: t.Dict[str, str] = {} # ETag, Location and Content-Range of the response, when set
+
+class BatchResponse(BaseModel):
+    results: t.List[BatchResult]
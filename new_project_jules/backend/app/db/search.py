@@ -0,0 +1,267 @@
+"""
+Full-text search over users and leave/WFH comments.
+
+Each searchable row has one document in the search index: a user's name
+(title) and email (body), or a request's comments (body). Documents are keyed
+by a single integer (the row id times 4 plus a per-kind code), so crud keeps
+them in sync with primary key deletes and inserts inside its own transaction.
+Archived requests keep their documents until their user is deleted.
+
+The index is an FTS5 table on SQLite: MATCH with bm25 ranking, names weighted
+above comments, and snippet() for highlights. Databases without FTS5 (or
+SEARCH_BACKEND=like) use a plain table with LIKE matching, which is only
+meant for small installations; a server database can add its own backend
+(e.g. PostgreSQL tsvector) by subclassing SearchBackend.
+"""
+import html
+import re
+import typing as t
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    bindparam,
+    case,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.orm import Session
+
+from app.core import config
+from . import archive, models
+
+KINDS = {"user": 1, "leave": 2, "wfh": 3}
+
+# snippet() and the LIKE backend mark matches with these; `_highlight` turns
+# them into <mark> after escaping the text.
+_OPEN, _CLOSE = "\x02", "\x03"
+SNIPPET_TOKENS = 12
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def doc_id(kind: str, ref_id: int) -> int:
+    return ref_id * 4 + KINDS[kind]
+
+
+def tokens(query: str) -> t.List[str]:
+    return _TOKEN.findall(query.lower())
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet or "").replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _user_title(first_name, last_name) -> str:
+    return " ".join(part for part in (first_name, last_name) if part)
+
+
+class SearchBackend:
+    name = ""
+    table = None  # Columns: rowid, title, body, kind, ref_id, user_id
+
+    def create(self, db: Session) -> None:
+        raise NotImplementedError
+
+    def search(self, db: Session, terms: t.List[str], kinds: t.Sequence[str], limit: int, offset: int) -> list:
+        """Rows of (kind, ref_id, user_id, title, snippet, score), best first."""
+        raise NotImplementedError
+
+    def is_empty(self, db: Session) -> bool:
+        return db.execute(select(literal(1)).select_from(self.table).limit(1)).first() is None
+
+    def put(self, db: Session, kind: str, ref_id: int, user_id: int, title: str, body: t.Optional[str]) -> None:
+        self.remove(db, kind, ref_id)
+        if title or body:
+            db.execute(insert(self.table).values(
+                rowid=doc_id(kind, ref_id), title=title, body=body or "", kind=kind, ref_id=ref_id, user_id=user_id,
+            ))
+
+    def remove(self, db: Session, kind: str, ref_id: int) -> None:
+        db.execute(delete(self.table).where(self.table.c.rowid == doc_id(kind, ref_id)))
+
+    def remove_many(self, db: Session, kind: str, ref_ids: t.Iterable[int]) -> None:
+        doc_ids = [doc_id(kind, ref_id) for ref_id in ref_ids]
+        if doc_ids:
+            db.execute(delete(self.table).where(self.table.c.rowid.in_(doc_ids)))
+
+    def backfill(self, db: Session) -> None:
+        names = ["rowid", "title", "body", "kind", "ref_id", "user_id"]
+        user = models.User
+        title = func.trim(func.coalesce(user.first_name, "") + " " + func.coalesce(user.last_name, ""))
+        db.execute(insert(self.table).from_select(
+            names,
+            select(user.id * 4 + KINDS["user"], title, user.email, literal("user"), user.id, user.id),
+        ))
+        for kind, model in archive.ENTITIES.items():
+            rows = archive.source(db, model).c
+            db.execute(insert(self.table).from_select(
+                names,
+                select(rows.id * 4 + KINDS[kind], literal(""), rows.comments, literal(kind), rows.id, rows.user_id)
+                .where(rows.comments.is_not(None), rows.comments != ""),
+            ))
+
+
+class Fts5Backend(SearchBackend):
+    name = "fts5"
+    table = table(
+        "search_index",
+        column("rowid"), column("title"), column("body"), column("kind"), column("ref_id"), column("user_id"),
+    )
+
+    def create(self, db: Session) -> None:
+        db.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "title, body, kind UNINDEXED, ref_id UNINDEXED, user_id UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+
+    def search(self, db: Session, terms, kinds, limit, offset):
+        # Every term must match, as a prefix so partial names work.
+        match = " ".join('"%s"*' % term for term in terms)
+        stmt = text(
+            "SELECT kind, ref_id, user_id, title, "
+            f"snippet(search_index, -1, :open, :close, '…', {SNIPPET_TOKENS}) AS snippet, "
+            "-bm25(search_index, 10.0, 1.0) AS score "
+            "FROM search_index WHERE search_index MATCH :match AND kind IN :kinds "
+            "ORDER BY score DESC, rowid LIMIT :limit OFFSET :offset"
+        ).bindparams(bindparam("kinds", expanding=True))
+        return db.execute(
+            stmt,
+            {"open": _OPEN, "close": _CLOSE, "match": match, "kinds": list(kinds), "limit": limit, "offset": offset},
+        ).all()
+
+
+class LikeBackend(SearchBackend):
+    name = "like"
+    table = Table(
+        "search_document",
+        MetaData(),
+        Column("rowid", Integer, primary_key=True, autoincrement=False),
+        Column("title", String, nullable=False),
+        Column("body", String, nullable=False),
+        Column("kind", String, nullable=False),
+        Column("ref_id", Integer, nullable=False),
+        Column("user_id", Integer, nullable=False),
+    )
+
+    def create(self, db: Session) -> None:
+        self.table.create(db.connection(), checkfirst=True)
+
+    def search(self, db: Session, terms, kinds, limit, offset):
+        title, body = self.table.c.title, self.table.c.body
+        score = sum(
+            case((title.icontains(term, autoescape=True), 10), else_=0)
+            + case((body.icontains(term, autoescape=True), 1), else_=0)
+            for term in terms
+        )
+        rows = db.execute(
+            select(self.table.c.kind, self.table.c.ref_id, self.table.c.user_id, title, body, score.label("score"))
+            .where(
+                self.table.c.kind.in_(list(kinds)),
+                *(or_(title.icontains(term, autoescape=True), body.icontains(term, autoescape=True)) for term in terms),
+            )
+            .order_by(score.desc(), self.table.c.rowid)
+            .limit(limit)
+            .offset(offset)
+        ).all()
+        return [
+            (kind, ref_id, user_id, doc_title, _like_snippet(doc_body or doc_title, terms), float(doc_score))
+            for kind, ref_id, user_id, doc_title, doc_body, doc_score in rows
+        ]
+
+
+def _like_snippet(textual: str, terms: t.List[str], width: int = 60) -> str:
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    first = pattern.search(textual)
+    start = max(0, first.start() - width // 2) if first else 0
+    window = textual[start:start + width]
+    marked = pattern.sub(lambda m: _OPEN + m.group(0) + _CLOSE, window)
+    return ("…" if start else "") + marked + ("…" if start + width < len(textual) else "")
+
+
+_backends: t.Dict[str, SearchBackend] = {}
+
+
+def backend_for(db: Session) -> SearchBackend:
+    """The backend for the session's database, chosen once per dialect."""
+    dialect = db.get_bind().dialect.name
+    backend = _backends.get(dialect)
+    if backend is None:
+        choice = config.SEARCH_BACKEND
+        if choice == "auto":
+            fts5 = dialect == "sqlite" and db.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar()
+            choice = "fts5" if fts5 else "like"
+        backend = _backends.setdefault(dialect, Fts5Backend() if choice == "fts5" else LikeBackend())
+    return backend
+
+
+def ensure_index(db: Session) -> None:
+    """Create the index if missing and fill it from existing rows when empty."""
+    backend = _writer(db)
+    if backend.is_empty(db):
+        backend.backfill(db)
+    db.commit()
+
+
+_created: t.Set[str] = set()
+
+
+def _writer(db: Session) -> SearchBackend:
+    # Writes may come before migrate() in scripts and tests: create the index
+    # (a no-op when it exists) once per database.
+    backend = backend_for(db)
+    url = str(db.get_bind().url)
+    if url not in _created:
+        backend.create(db)
+        _created.add(url)
+    return backend
+
+
+# Called by crud inside its transaction.
+def index_user(db: Session, user) -> None:
+    _writer(db).put(db, "user", user.id, user.id, _user_title(user.first_name, user.last_name), user.email)
+
+
+def index_request(db: Session, kind: str, row) -> None:
+    _writer(db).put(db, kind, row.id, row.user_id, "", row.comments)
+
+
+def remove(db: Session, kind: str, ref_id: int) -> None:
+    _writer(db).remove(db, kind, ref_id)
+
+
+def remove_many(db: Session, kind: str, ref_ids: t.Iterable[int]) -> None:
+    _writer(db).remove_many(db, kind, ref_ids)
+
+
+def search(
+    db: Session, query: str, kinds: t.Optional[t.Sequence[str]] = None, limit: int = 20, offset: int = 0
+) -> t.Tuple[list, bool]:
+    """Hits as dicts, best first, and whether more follow."""
+    terms = tokens(query)
+    if not terms:
+        return [], False
+    rows = backend_for(db).search(db, terms, kinds or list(KINDS), limit + 1, offset)
+    hits = [
+        {
+            "kind": kind,
+            "id": ref_id,
+            "user_id": user_id,
+            "title": title,
+            "snippet": _highlight(snippet),
+            "score": round(float(score), 6),
+        }
+        for kind, ref_id, user_id, title, snippet, score in rows[:limit]
+    ]
+    return hits, len(rows) > limit
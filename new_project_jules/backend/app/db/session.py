@@ -1,20 +1,138 @@
+import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import config
+from app.db import replication, tenancy
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+def _create_engine(url: str):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return create_engine(url, connect_args=connect_args)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+replicas = replication.ReplicaSet(
+    [
+        replication.Replica(_create_engine(url), managed=url.startswith("sqlite"))
+        for url in config.DATABASE_REPLICA_URLS
+    ],
+    max_staleness=config.REPLICA_MAX_STALENESS_SECONDS,
+)
+tenants = tenancy.TenantRegistry(engine, config.TENANT_DATABASE_URLS, factory=_create_engine)
+
+
+class RoutingSession(Session):
+    """
+    Session bound to the current tenant's database (info["tenant"], taken from
+    tenancy.current_tenant when the session is created). For the default
+    tenant, reads go to a replica when the session is marked read-only
+    (info["read_only"]) and everything else to the primary.
+    """
+
+    def __init__(self, *args, replicas: replication.ReplicaSet = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.info["tenant"] = tenancy.current_tenant.get()
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info["tenant"] != tenancy.DEFAULT_TENANT:
+            return tenants.engine_for(self.info["tenant"])
+        if (
+            self.replicas
+            and self.info.get("read_only")
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+        ):
+            # Pick once per session so a request sees a single consistent replica.
+            if "replica" not in self.info:
+                self.info["replica"] = self.replicas.choose(replication.current_user_id.get())
+            if self.info["replica"] is not None:
+                return self.info["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+    def commit(self):
+        if self.info.get("deferred_commit"):
+            # Inside deferred_commit(): the block commits once at the end.
+            self.flush()
+            return
+        super().commit()
+        if self.replicas and not self.info.get("read_only") and self.info["tenant"] == tenancy.DEFAULT_TENANT:
+            self.replicas.note_write(replication.current_user_id.get())
+
+
+def use_primary(db: Session) -> None:
+    """Send the rest of a read-only session's queries to the primary, e.g. before a read that writes back."""
+    db.info["read_only"] = False
+
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, replicas=replicas
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+# Callbacks waiting for the commit of the enclosing deferred_commit() block.
+_after_commit: ContextVar[t.Optional[list]] = ContextVar("after_commit", default=None)
+
+
+def after_commit(callback: t.Callable[[], None]) -> None:
+    """
+    Run a side effect of a committed write (an audit entry, a change event):
+    right away, or inside deferred_commit() once the whole block has committed.
+    """
+    pending = _after_commit.get()
+    if pending is None:
+        callback()
+    else:
+        pending.append(callback)
+
+
+@contextmanager
+def deferred_commit(db: Session):
+    """
+    Run several crud writes as one transaction. Their commits only flush; the
+    block commits once at the end, or rolls everything back if it raises.
+    """
+    pending: list = []
+    token = _after_commit.set(pending)
+    db.info["deferred_commit"] = True
+    try:
+        yield
+    except BaseException:
+        db.info.pop("deferred_commit")
+        db.rollback()
+        raise
+    else:
+        db.info.pop("deferred_commit")
+        db.commit()
+    finally:
+        _after_commit.reset(token)
+    for callback in pending:
+        callback()
+
+
+# Scope key of batch sub-requests (routers/batch.py), which all run on the
+# batch request's session.
+SHARED_SESSION = "app.shared_session"
+
+
 # Dependency
-def get_db():
+def get_db(request: Request):
+    shared = request.scope.get(SHARED_SESSION)
+    if shared is not None:
+        yield shared  # Closed by the batch request that owns it
+        return
     db = SessionLocal()
+    db.info["read_only"] = request.method in ("GET", "HEAD")
     try:
         yield db
     finally:
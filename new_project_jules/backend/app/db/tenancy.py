@@ -0,0 +1,172 @@
+"""
+Multi-tenant routing.
+
+Each tenant has its own database (a separate SQLite file locally, a separate
+database or schema in production) with its own engine and connection pool, so
+a heavy tenant only exhausts its own pool. Tenants are configured with
+TENANT_DATABASE_URLS; without it everything runs as the single DEFAULT_TENANT
+on the primary engine, exactly as before.
+
+The tenant of a request is resolved once by TenantMiddleware and kept in
+`current_tenant`. RoutingSession binds to that tenant's engine, and the
+in-process caches keyed by user id (token versions, change events, capacity
+bitsets, calendar feeds) are namespaced by it, since user ids repeat across
+tenant databases.
+"""
+import contextlib
+import time
+import typing as t
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import jwt
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import security
+
+DEFAULT_TENANT = "default"
+
+current_tenant: ContextVar[str] = ContextVar("current_tenant", default=DEFAULT_TENANT)
+
+
+@contextlib.contextmanager
+def use(tenant: str):
+    """Run a block (a job, a CLI command) as `tenant`."""
+    token = current_tenant.set(tenant)
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+@dataclass
+class TenantMetrics:
+    requests: int = 0
+    server_errors: int = 0
+    request_seconds: float = 0.0
+    queries: int = 0
+    query_seconds: float = 0.0
+
+
+class TenantRegistry:
+    def __init__(self, default_engine: Engine, urls: t.Dict[str, str], factory: t.Callable[[str], Engine]):
+        self._urls = dict(urls)
+        self._factory = factory
+        self._engines: t.Dict[str, Engine] = {DEFAULT_TENANT: default_engine}
+        self.metrics: t.Dict[str, TenantMetrics] = {}
+        self._instrument(DEFAULT_TENANT, default_engine)
+
+    @property
+    def names(self) -> t.List[str]:
+        return [DEFAULT_TENANT] + sorted(self._urls)
+
+    def __contains__(self, tenant: str) -> bool:
+        return tenant == DEFAULT_TENANT or tenant in self._urls
+
+    def engine_for(self, tenant: str) -> Engine:
+        """The tenant's engine, created (with its own pool) on first use."""
+        engine = self._engines.get(tenant)
+        if engine is None:
+            if tenant not in self._urls:
+                raise KeyError(f"Unknown tenant {tenant!r}")
+            engine = self._engines.setdefault(tenant, self._factory(self._urls[tenant]))
+            self._instrument(tenant, engine)
+        return engine
+
+    def dispose(self, close: bool = True) -> None:
+        for engine in self._engines.values():
+            engine.dispose(close=close)
+
+    def _instrument(self, tenant: str, engine: Engine) -> None:
+        metrics = self.metrics.setdefault(tenant, TenantMetrics())
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _start(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _end(conn, cursor, statement, parameters, context, executemany):
+            metrics.queries += 1
+            metrics.query_seconds += time.perf_counter() - conn.info["query_started"].pop()
+
+    def snapshot(self, tenant: str) -> dict:
+        metrics = self.metrics.setdefault(tenant, TenantMetrics())
+        engine = self._engines.get(tenant)
+        pool = engine.pool if engine is not None else None
+        return {
+            "tenant": tenant,
+            "requests": metrics.requests,
+            "server_errors": metrics.server_errors,
+            "request_seconds": round(metrics.request_seconds, 6),
+            "queries": metrics.queries,
+            "query_seconds": round(metrics.query_seconds, 6),
+            "pool_checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        }
+
+
+def resolve(registry: TenantRegistry, host: t.Optional[str], bearer: t.Optional[str]) -> str:
+    """
+    The tenant named by the Host header's first label, else the token's tid
+    claim, else the default. A token for another tenant is rejected later by
+    auth, which compares tid with the resolved tenant.
+    """
+    if host:
+        label = host.split(":", 1)[0].split(".", 1)[0].lower()
+        if label != DEFAULT_TENANT and label in registry:
+            return label
+    if bearer:
+        try:
+            claims = jwt.decode(bearer, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+        except jwt.PyJWTError:
+            return DEFAULT_TENANT
+        tenant = claims.get("tid")
+        if isinstance(tenant, str) and tenant in registry:
+            return tenant
+    return DEFAULT_TENANT
+
+
+class TenantMiddleware:
+    """Pure ASGI middleware that sets `current_tenant` and records per-tenant request metrics."""
+
+    def __init__(self, app, registry: TenantRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        bearer = None
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if authorization.lower().startswith("bearer "):
+            bearer = authorization[7:].strip()
+        else:
+            # SSE and WebSocket clients pass the token as ?access_token=
+            for pair in scope.get("query_string", b"").decode("latin-1").split("&"):
+                key, _, value = pair.partition("=")
+                if key == "access_token" and value:
+                    bearer = value
+        tenant = resolve(self.registry, headers.get(b"host", b"").decode("latin-1"), bearer)
+        metrics = self.registry.metrics.setdefault(tenant, TenantMetrics())
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_tenant.reset(token)
+            if scope["type"] == "http":
+                metrics.requests += 1
+                metrics.request_seconds += time.perf_counter() - started
+                if status_code >= 500:
+                    metrics.server_errors += 1
+
@@ -3,21 +3,56 @@ from starlette.requests import Request
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 
 from app.api.api_v1.routers.users import users_router
 from app.api.api_v1.routers.auth import auth_router
 from app.api.api_v1.routers.leaves import leaves_router
 from app.api.api_v1.routers.wfh import wfh_router
-from app.core import config
-from app.db.session import SessionLocal, engine, Base
-from app.core.auth import get_current_active_user
+from app.api.api_v1.routers.events import events_router
+from app.api.api_v1.routers.admin import admin_router
+from app.api.api_v1.routers.timeline import timeline_router
+from app.api.api_v1.routers.team import team_router
+from app.api.api_v1.routers.attendance import attendance_router
+from app.api.api_v1.routers.accrual import accrual_router
+from app.api.api_v1.routers.calendar import calendar_router
+from app.api.api_v1.routers.batch import batch_router
+from app.core import audit, config, events
+from app import tasks
+from app.scheduler import scheduler
+from app.migrate import migrate
+from app.db.session import SessionLocal, engine, replicas, tenants
+from app.db import replication
+from app.db.tenancy import TenantMiddleware
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.auth import get_current_active_claims
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
+    # Create or upgrade the tables of every tenant
+    if config.MIGRATE_ON_STARTUP:
+        migrate()
+    replica_sync = None
+    if replicas and config.REPLICA_SYNC_INTERVAL_SECONDS > 0 and config.REPLICA_SYNC_IN_APP:
+        replication.sync_sqlite_replicas(engine, replicas)
+        replica_sync = asyncio.create_task(
+            replication.sync_loop(engine, replicas, config.REPLICA_SYNC_INTERVAL_SECONDS)
+        )
+    await tasks.queue.start()
+    audit.buffer.start()
+    if config.EVENTS_RELAY_INTERVAL_SECONDS > 0:
+        events.relay.start()
+    if config.SCHEDULER_ENABLED:
+        scheduler.start()
     yield
+    await scheduler.stop()
+    await tasks.queue.stop(timeout=config.JOB_QUEUE_DRAIN_TIMEOUT)
+    await audit.buffer.stop()
+    await events.relay.stop()
+    if replica_sync is not None:
+        replica_sync.cancel()
 
 app = FastAPI(
     title=config.PROJECT_NAME, docs_url="/api/docs", openapi_url="/api", lifespan=lifespan
@@ -30,6 +65,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["Content-Range", "Idempotent-Replayed"],  # Paging totals, replayed retries
 )
 
 
@@ -41,6 +77,21 @@ async def db_session_middleware(request: Request, call_next):
     return response
 
 
+# Read-your-writes across workers: only matters with read replicas.
+if replicas:
+    app.add_middleware(replication.ReadYourWritesMiddleware, max_staleness=config.REPLICA_MAX_STALENESS_SECONDS)
+
+# Retried POSTs with an Idempotency-Key replay the first response; keyed
+# per tenant, so it sits inside TenantMiddleware.
+app.add_middleware(IdempotencyMiddleware)
+
+# Outside the idempotency store, so it keeps identity bodies for any client.
+app.add_middleware(CompressionMiddleware)
+
+# Added last so it is outermost: everything below runs as the request's tenant.
+app.add_middleware(TenantMiddleware, registry=tenants)
+
+
 @app.get("/api/v1")
 async def root():
     return {"message": "Hello World"}
@@ -51,21 +102,62 @@ app.include_router(
     users_router,
     prefix="/api/v1",
     tags=["users"],
-    dependencies=[Depends(get_current_active_user)],
+    dependencies=[Depends(get_current_active_claims)],
 )
 app.include_router(auth_router, prefix="/api", tags=["auth"])
 app.include_router(
     leaves_router,
     prefix="/api/v1",
     tags=["leaves"],
-    dependencies=[Depends(get_current_active_user)],
+    dependencies=[Depends(get_current_active_claims)],
 )
 app.include_router(
     wfh_router,
     prefix="/api/v1",
     tags=["wfh"],
-    dependencies=[Depends(get_current_active_user)],
+    dependencies=[Depends(get_current_active_claims)],
+)
+app.include_router(
+    admin_router,
+    prefix="/api/v1",
+    tags=["admin"],
+    dependencies=[Depends(get_current_active_claims)],
+)
+app.include_router(
+    timeline_router,
+    prefix="/api/v1",
+    tags=["timeline"],
+    dependencies=[Depends(get_current_active_claims)],
+)
+app.include_router(
+    team_router,
+    prefix="/api/v1",
+    tags=["team"],
+    dependencies=[Depends(get_current_active_claims)],
+)
+app.include_router(
+    attendance_router,
+    prefix="/api/v1",
+    tags=["attendance"],
+    dependencies=[Depends(get_current_active_claims)],
+)
+app.include_router(
+    accrual_router,
+    prefix="/api/v1",
+    tags=["accrual"],
+    dependencies=[Depends(get_current_active_claims)],
+)
+app.include_router(
+    batch_router,
+    prefix="/api/v1",
+    tags=["batch"],
+    dependencies=[Depends(get_current_active_claims)],
 )
+# Authenticated inside the router: streams also accept ?access_token=
+app.include_router(events_router, prefix="/api/v1", tags=["events"])
+# Feeds are authorized by the signed token in their URL.
+app.include_router(calendar_router, prefix="/api/v1", tags=["calendar"])
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", reload=True, port=8888)
+    # Development server with auto-reload; use `python -m app.serve` in production.
+    uvicorn.run("app.main:app", host="0.0.0.0", reload=True, port=8888)
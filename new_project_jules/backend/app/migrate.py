@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Bring every tenant database up to the current schema.
+
+    python -m app.migrate                 # all tenants
+    python -m app.migrate --tenant acme
+
+There are no versioned migrations in this project yet: each shard gets the
+missing tables from the models (create_all), the columns added to existing
+tables since they were created (ALTER TABLE ... ADD COLUMN), the missing
+indexes, plus the data backfills that go with them, and running it again is
+a no-op. The app runs it at startup (MIGRATE_ON_STARTUP); app.serve runs it
+once before forking workers, which then skip it.
+"""
+import argparse
+import logging
+import typing as t
+
+from sqlalchemy import inspect, literal, literal_column, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+from app.db import crud, search, tenancy
+from app.db.session import Base, SessionLocal, tenants
+
+logger = logging.getLogger(__name__)
+
+
+def _constant_default(column, dialect) -> t.Optional[str]:
+    # ADD COLUMN (on SQLite) only takes constant defaults: a scalar Python
+    # default or a plain server_default string.
+    if column.default is not None and column.default.is_scalar:
+        return str(literal(column.default.arg).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if column.server_default is not None and isinstance(column.server_default.arg, str):
+        return str(literal(column.server_default.arg).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    return None
+
+
+def _add_column(conn: Connection, table, column) -> None:
+    preparer = conn.dialect.identifier_preparer
+    ddl = f"{preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}"
+    default = _constant_default(column, conn.dialect)
+    if default is not None:
+        ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    for foreign_key in column.foreign_keys:
+        target = foreign_key.column
+        ddl += f" REFERENCES {preparer.format_table(target.table)} ({preparer.format_column(target)})"
+    conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+    if default is None and column.server_default is not None:
+        # Non-constant defaults (created_at's CURRENT_TIMESTAMP): the column
+        # is added nullable and existing rows are filled in here. The value is
+        # evaluated once and written back through the column's type, so it is
+        # stored the way the ORM writes and compares it (on SQLite,
+        # CURRENT_TIMESTAMP's text has no fractional seconds, and keyset
+        # cursors bound with them would never match it).
+        value = conn.execute(select(literal_column(column.server_default.arg.text, type_=column.type))).scalar()
+        conn.execute(table.update().values({column.name: value}))
+    logger.info("Added column %s.%s", table.name, column.name)
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """Create missing tables, add missing columns to existing ones, then create missing indexes."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present:
+                    _add_column(conn, table, column)
+        # create_all skips tables that exist; add indexes declared on them since.
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def migrate(names: t.Optional[t.Iterable[str]] = None) -> t.List[str]:
+    migrated = []
+    for tenant in names or tenants.names:
+        upgrade_schema(tenants.engine_for(tenant))
+        with tenancy.use(tenant), SessionLocal() as db:
+            crud.ensure_user_closure(db)
+            search.ensure_index(db)
+        logger.info("Migrated tenant %s", tenant)
+        migrated.append(tenant)
+    return migrated
+
+
+def parse_args(argv: t.Optional[t.List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Create or upgrade the schema of tenant databases.")
+    parser.add_argument("--tenant", action="append", choices=tenants.names, help="Only this tenant (repeatable).")
+    return parser.parse_args(argv)
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    args = parse_args(argv)
+    for tenant in migrate(args.tenant):
+        print(f"{tenant}: up to date")
+
+
+if __name__ == "__main__":
+    main()
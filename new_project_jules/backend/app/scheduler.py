@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Cron-like scheduler for maintenance jobs.
+
+Jobs are registered with a five-field cron expression (minute hour day month
+weekday, in UTC):
+
+    @scheduler.job("0 * * * *")
+    def expire_pending() -> dict: ...
+
+The scheduler runs inside the app lifespan when `config.SCHEDULER_ENABLED` is
+set, or standalone:
+
+    python -m app.scheduler                       # run the loop
+    python -m app.scheduler --run expire_pending  # run one job now
+    python -m app.scheduler --list
+
+Every process may run the loop. Before a job runs, its slot is claimed in the
+scheduler_lock table (in the default tenant's database), so only one process
+runs each scheduled occurrence. The jobs below then visit every tenant.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import typing as t
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from app.core import calendar, config, idempotency
+from sqlalchemy.orm import Session
+
+from app.db import archive, crud, tenancy
+from app.db.session import SessionLocal, tenants
+
+logger = logging.getLogger(__name__)
+
+_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(field: str, low: int, high: int) -> t.FrozenSet[int]:
+    values = set()
+    for part in field.split(","):
+        spec, _, step = part.partition("/")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (int(v) for v in spec.split("-", 1))
+        else:
+            start = end = int(spec)
+            if step:
+                end = high  # "5/15": every 15 starting at 5
+        values.update(range(start, end + 1, int(step or 1)))
+    if not values or min(values) < low or max(values) > high:
+        raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+    return frozenset(values)
+
+
+class Cron:
+    """A parsed five-field cron expression. Weekdays are 0-6 from Sunday (7 is also Sunday)."""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 cron fields, got {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, _FIELD_RANGES)
+        )
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def matches(self, moment: datetime) -> bool:
+        if moment.minute not in self.minutes or moment.hour not in self.hours or moment.month not in self.months:
+            return False
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        # Like cron: when both day fields are restricted, either may match.
+        if not self._any_day and not self._any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    cron: Cron
+    func: t.Callable[[], t.Any]
+
+
+class Scheduler:
+    def __init__(self, lease_seconds: int = 900):
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.jobs: t.Dict[str, ScheduledJob] = {}
+        self._loop_task: t.Optional[asyncio.Task] = None
+
+    def job(self, cron: str, name: t.Optional[str] = None):
+        """Register a sync callable to run on a cron schedule."""
+
+        def decorator(fn):
+            self.jobs[name or fn.__name__] = ScheduledJob(name or fn.__name__, Cron(cron), fn)
+            return fn
+
+        return decorator
+
+    def due(self, moment: datetime) -> t.List[ScheduledJob]:
+        return [job for job in self.jobs.values() if job.cron.matches(moment)]
+
+    def run_job(self, name: str, slot: t.Optional[datetime] = None) -> t.Optional[t.Any]:
+        """
+        Run a job if this process wins its slot (default: the current minute).
+        Returns None without running when another process has it.
+        """
+        job = self.jobs[name]
+        slot = slot or datetime.utcnow().replace(second=0, microsecond=0)
+        with SessionLocal() as db:
+            if not crud.claim_scheduler_slot(db, name, slot, self.owner, self.lease_seconds):
+                return None
+        try:
+            result = job.func()
+            logger.info("Scheduled job %s finished: %s", name, result)
+            return result
+        finally:
+            with SessionLocal() as db:
+                crud.release_scheduler_lock(db, name, self.owner)
+
+    async def run_forever(self) -> None:
+        while True:
+            now = datetime.utcnow()
+            slot = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            await asyncio.sleep((slot - now).total_seconds())
+            for job in self.due(slot):
+                try:
+                    await asyncio.to_thread(self.run_job, job.name, slot)
+                except Exception:
+                    logger.exception("Scheduled job %s failed", job.name)
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+
+scheduler = Scheduler(lease_seconds=config.SCHEDULER_LEASE_SECONDS)
+
+
+def _per_tenant(fn: t.Callable[[Session], t.Any]) -> dict:
+    results = {}
+    for tenant in tenants.names:
+        with tenancy.use(tenant), SessionLocal() as db:
+            results[tenant] = fn(db)
+    return results
+
+
+@scheduler.job("5 * * * *")
+def expire_pending() -> dict:
+    """Cancel pending requests whose start date has passed."""
+    return _per_tenant(
+        lambda db: crud.expire_pending_requests(db, date.today(), chunk_size=config.EXPIRE_PENDING_CHUNK_SIZE)
+    )
+
+
+@scheduler.job("30 3 * * *")
+def purge_caches() -> dict:
+    """
+    Drop cached attendance months older than ATTENDANCE_CACHE_TTL_DAYS, expired
+    feeds and expired idempotency keys.
+    """
+    older_than = datetime.utcnow() - timedelta(days=config.ATTENDANCE_CACHE_TTL_DAYS)
+    return {
+        "attendance_months": _per_tenant(lambda db: crud.purge_attendance_cache(db, older_than)),
+        "calendar_feeds": calendar.cache.purge_expired(),
+        "idempotency_keys": _per_tenant(lambda db: idempotency.purge_expired()),
+    }
+
+
+@scheduler.job("0 2 1 * *")
+def monthly_accrual() -> dict:
+    """Credit this month's leave accrual (see app/accrual.py)."""
+    period = date.today()
+    return _per_tenant(lambda db: crud.run_accrual(db, period).model_dump())
+
+
+@scheduler.job("0 4 * * *")
+def archive_closed() -> dict:
+    """Move closed requests past ARCHIVE_AFTER_DAYS to the archive tables (see app/archive.py)."""
+    return _per_tenant(lambda db: archive.archive_closed(db, chunk_size=config.ARCHIVE_CHUNK_SIZE))
+
+
+def parse_args(argv: t.Optional[t.List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run scheduled maintenance jobs.")
+    parser.add_argument("--run", metavar="JOB", choices=sorted(scheduler.jobs), help="Run one job now and exit.")
+    parser.add_argument("--list", action="store_true", help="List jobs and their schedules.")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+    if args.list:
+        for job in scheduler.jobs.values():
+            print(f"{job.cron.expression:<15} {job.name}")
+        return
+    if args.run:
+        result = scheduler.run_job(args.run)
+        print(result if result is not None else f"{args.run} is already running or ran this minute")
+        return
+    asyncio.run(scheduler.run_forever())
+
+
+if __name__ == "__main__":
+    main()
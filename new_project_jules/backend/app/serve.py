@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Production server.
+
+    python -m app.serve --workers 4 --port 8888
+
+The application is imported once in the master process and the workers are
+forked from it, so they share the preloaded code pages. Workers use uvloop and
+httptools when they are installed, are recycled after --max-requests requests,
+and are replaced one at a time on SIGHUP. SIGTERM/SIGINT shut everything down
+gracefully. The master also migrates the databases before forking and keeps
+managed SQLite replicas in sync, so the workers don't each do it.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import typing as t
+
+import uvicorn
+
+from app.core import config
+from app.main import app
+from app.db import replication
+from app.db.session import engine, replicas, tenants
+from app.migrate import migrate
+
+logger = logging.getLogger("app.serve")
+
+
+def _loop_impl() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def _http_impl() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def _reset_pools_after_fork() -> None:
+    # Connections inherited from the master must not be reused by the child;
+    # close=False leaves them for the parent and gives the child fresh pools.
+    tenants.dispose(close=False)
+    for replica in replicas.replicas:
+        replica.engine.dispose(close=False)
+
+
+def worker_max_requests(max_requests: int, jitter: int) -> t.Optional[int]:
+    """A worker's --max-requests plus up to --max-requests-jitter, or None to never recycle it."""
+    if not max_requests:
+        return None
+    if jitter:
+        # Spread recycling so workers don't all restart together.
+        max_requests += random.randint(0, jitter)
+    return max_requests
+
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Arbiter:
+    def __init__(self, sock: socket.socket, args: argparse.Namespace, app=app):
+        self.sock = sock
+        self.app = app
+        self.args = args
+        self.workers: t.Set[int] = set()
+        self.stopping = False
+        self.reload_requested = False
+        self._next_sync = float("-inf")
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            return pid
+        # Child
+        try:
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            _reset_pools_after_fork()
+            server_config = uvicorn.Config(
+                self.app,
+                loop=_loop_impl(),
+                http=_http_impl(),
+                limit_max_requests=worker_max_requests(self.args.max_requests, self.args.max_requests_jitter),
+                timeout_graceful_shutdown=self.args.graceful_timeout,
+                timeout_keep_alive=self.args.keep_alive,
+                proxy_headers=True,
+                access_log=self.args.access_log,
+                log_level=self.args.log_level,
+            )
+            uvicorn.Server(server_config).run(sockets=[self.sock])
+        finally:
+            os._exit(0)
+
+    def _sync_replicas(self) -> None:
+        # Replica files are copied here, once for all workers, instead of by
+        # each worker over the same files.
+        if not replicas or config.REPLICA_SYNC_INTERVAL_SECONDS <= 0 or time.monotonic() < self._next_sync:
+            return
+        try:
+            replication.sync_sqlite_replicas(engine, replicas)
+        except Exception:
+            logger.exception("Replica sync failed")
+        self._next_sync = time.monotonic() + config.REPLICA_SYNC_INTERVAL_SECONDS
+
+    def _handle_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _handle_reload(self, signum, frame) -> None:
+        self.reload_requested = True
+
+    def _reap(self) -> t.List[int]:
+        exited = []
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self.workers.discard(pid)
+            exited.append(pid)
+        return exited
+
+    def _rolling_restart(self) -> None:
+        """Replace every worker one at a time so capacity never drops to zero."""
+        for old in list(self.workers):
+            if self.stopping:
+                return
+            self.spawn()
+            os.kill(old, signal.SIGTERM)
+            deadline = time.monotonic() + self.args.graceful_timeout + 5
+            while old in self.workers and time.monotonic() < deadline:
+                self._reap()
+                time.sleep(0.1)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        logger.info(
+            "Starting %d workers on %s:%d (loop=%s, http=%s)",
+            self.args.workers, self.args.host, self.args.port, _loop_impl(), _http_impl(),
+        )
+        self._sync_replicas()
+        for _ in range(self.args.workers):
+            self.spawn()
+        while not self.stopping:
+            self._sync_replicas()
+            if self.reload_requested:
+                self.reload_requested = False
+                self._rolling_restart()
+            self._reap()
+            # Recycled or crashed workers are replaced.
+            while not self.stopping and len(self.workers) < self.args.workers:
+                self.spawn()
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.workers.discard(pid)
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+        self._reap()
+        self.sock.close()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked workers.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8888")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--max-requests", type=int, default=0, help="Recycle a worker after this many requests (0 = never).")
+    parser.add_argument("--max-requests-jitter", type=int, default=0)
+    parser.add_argument("--graceful-timeout", type=int, default=30)
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=False)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+    # Migrate once here; workers racing to do it in their lifespans on a fresh
+    # database would collide, so the forked workers skip it.
+    migrate()
+    config.MIGRATE_ON_STARTUP = False
+    config.REPLICA_SYNC_IN_APP = False  # The master syncs replicas (Arbiter._sync_replicas)
+    tenants.dispose()
+    Arbiter(_bind(args.host, args.port, args.backlog), args).run()
+
+
+if __name__ == "__main__":
+    main()
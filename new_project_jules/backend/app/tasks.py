@@ -0,0 +1,311 @@
+"""
+In-process background job queue.
+
+Handlers are registered by name with `@queue.task()`. `enqueue` checks the
+arguments against the handler signature up front, so a malformed job fails at
+the call site instead of inside a worker. Jobs run on a fixed number of asyncio
+workers, are retried with exponential backoff, and are drained on shutdown.
+When `config.JOB_QUEUE_DB` is set, queued jobs are also written to a local
+SQLite table and picked up again on the next start. Several processes (the
+app.serve workers) can share that table: each job is claimed by one of them
+with a lease the claiming process keeps renewing, and only unclaimed jobs, or
+ones whose lease lapsed because their process died, are taken over on start.
+"""
+import asyncio
+import inspect
+import json
+import logging
+import sqlite3
+import threading
+import time
+import typing as t
+import uuid
+from dataclasses import dataclass, field
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    name: str
+    kwargs: t.Dict[str, t.Any] = field(default_factory=dict)
+    attempts: int = 0
+    id: t.Optional[int] = None  # Row id when the job is persisted
+
+
+class _JobStore:
+    """Minimal SQLite persistence for queued jobs."""
+
+    def __init__(self, path: str, lease: float = config.JOB_QUEUE_LEASE_SECONDS):
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_queue ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "name TEXT NOT NULL, "
+            "kwargs TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "status TEXT NOT NULL DEFAULT 'queued', "
+            "owner TEXT, "
+            "lease_until REAL)"
+        )
+        # Tables created before jobs were claimed.
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(job_queue)")}
+        for name, ddl in (("owner", "owner TEXT"), ("lease_until", "lease_until REAL")):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE job_queue ADD COLUMN {ddl}")
+        self._conn.commit()
+
+    def add(self, job: Job, owner: t.Optional[str] = None) -> int:
+        """Persist a job, already claimed by owner when given."""
+        lease_until = time.time() + self.lease if owner else None
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO job_queue (name, kwargs, attempts, status, owner, lease_until) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    job.name, json.dumps(job.kwargs, default=str), job.attempts,
+                    "running" if owner else "queued", owner, lease_until,
+                ),
+            )
+            return cur.lastrowid
+
+    def set_attempts(self, job: Job) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_queue SET attempts = ? WHERE id = ?", (job.attempts, job.id)
+            )
+
+    def done(self, job: Job) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM job_queue WHERE id = ?", (job.id,))
+
+    def failed(self, job: Job) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_queue SET status = 'failed', attempts = ?, owner = NULL, lease_until = NULL WHERE id = ?",
+                (job.attempts, job.id),
+            )
+
+    def claim(self, owner: str) -> t.List[Job]:
+        """
+        Take the queued jobs, and the claimed ones whose lease lapsed, for owner.
+        One UPDATE ... RETURNING, so two processes never claim the same job.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "UPDATE job_queue SET status = 'running', owner = ?, lease_until = ? "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "RETURNING id, name, kwargs, attempts",
+                (owner, now + self.lease, now),
+            ).fetchall()
+        return [Job(name=r[1], kwargs=json.loads(r[2]), attempts=r[3], id=r[0]) for r in sorted(rows)]
+
+    def renew(self, owner: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_queue SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                (time.time() + self.lease, owner),
+            )
+
+    def release(self, owner: str) -> None:
+        """Hand owner's unfinished jobs back, for the next process to claim."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_queue SET status = 'queued', owner = NULL, lease_until = NULL "
+                "WHERE owner = ? AND status = 'running'",
+                (owner,),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class JobQueue:
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        persist_path: str = "",
+    ):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.persist_path = persist_path
+        self._handlers: t.Dict[str, t.Callable[..., t.Any]] = {}
+        self._queue: t.Optional[asyncio.Queue] = None
+        self._loop: t.Optional[asyncio.AbstractEventLoop] = None
+        self._workers: t.List[asyncio.Task] = []
+        self._store: t.Optional[_JobStore] = None
+        self._owner = uuid.uuid4().hex  # This queue's claim on persisted jobs
+        self._heartbeat: t.Optional[asyncio.Task] = None
+        self._backlog: t.List[Job] = []  # Jobs enqueued before start()
+        self._outstanding = 0
+        self._idle: t.Optional[asyncio.Event] = None
+        self._accepting = True
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def task(self, name: t.Optional[str] = None):
+        """Register a sync or async callable as a job handler."""
+
+        def decorator(fn):
+            self._handlers[name or fn.__name__] = fn
+            return fn
+
+        return decorator
+
+    def enqueue(self, name: str, **kwargs) -> Job:
+        handler = self._handlers.get(name)
+        if handler is None:
+            raise KeyError(f"Unknown job {name!r}")
+        inspect.signature(handler).bind(**kwargs)  # Raises TypeError on bad arguments
+        if not self._accepting:
+            raise RuntimeError("Job queue is shutting down")
+        job = Job(name=name, kwargs=kwargs)
+        if self._store is not None:
+            job.id = self._store.add(job, owner=self._owner)
+        self._submit(job)
+        return job
+
+    def _submit(self, job: Job) -> None:
+        if self._loop is None:
+            self._backlog.append(job)
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._put(job)
+        else:
+            self._loop.call_soon_threadsafe(self._put, job)
+
+    def _put(self, job: Job) -> None:
+        self._outstanding += 1
+        self._idle.clear()
+        self._queue.put_nowait(job)
+
+    def _finish(self) -> None:
+        self._outstanding -= 1
+        if self._outstanding == 0:
+            self._idle.set()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._accepting = True
+        if self.persist_path:
+            self._store = _JobStore(self.persist_path)
+            for job in self._store.claim(self._owner):
+                self._put(job)
+            self._heartbeat = asyncio.create_task(self._renew_leases())
+        backlog, self._backlog = self._backlog, []
+        for job in backlog:
+            if self._store is not None and job.id is None:
+                job.id = self._store.add(job, owner=self._owner)
+            self._put(job)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop accepting jobs, wait for queued work to finish, then stop workers."""
+        if not self.running:
+            return
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Job queue drain timed out with %d job(s) outstanding", self._outstanding
+            )
+        running = self._workers + ([self._heartbeat] if self._heartbeat is not None else [])
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        self._workers, self._heartbeat = [], None
+        if self._store is not None:
+            # Jobs the drain didn't finish are handed back rather than left
+            # claimed until the lease lapses.
+            self._store.release(self._owner)
+            self._store.close()
+            self._store = None
+        self._loop = None
+        self._accepting = True  # Anything enqueued from now on waits for the next start()
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self._store.lease / 3)
+            self._store.renew(self._owner)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        handler = self._handlers[job.name]
+        try:
+            if inspect.iscoroutinefunction(handler):
+                await handler(**job.kwargs)
+            else:
+                await asyncio.to_thread(handler, **job.kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            job.attempts += 1
+            if job.attempts > self.max_retries:
+                logger.exception("Job %s failed after %d attempts", job.name, job.attempts)
+                if self._store is not None:
+                    self._store.failed(job)
+                self._finish()
+                return
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            logger.warning("Job %s failed, retrying in %.2fs", job.name, delay)
+            if self._store is not None:
+                self._store.set_attempts(job)
+            # The job stays outstanding while it waits, so a drain covers it.
+            self._loop.call_later(delay, self._queue.put_nowait, job)
+            return
+        if self._store is not None:
+            self._store.done(job)
+        self._finish()
+
+
+queue = JobQueue(
+    concurrency=config.JOB_QUEUE_CONCURRENCY,
+    max_retries=config.JOB_QUEUE_MAX_RETRIES,
+    retry_backoff=config.JOB_QUEUE_RETRY_BACKOFF,
+    persist_path=config.JOB_QUEUE_DB,
+)
+
+
+def enqueue(name: str, **kwargs) -> Job:
+    return queue.enqueue(name, **kwargs)
+
+
+@queue.task()
+def example_task(word: str) -> str:
+    return f"test task returns {word}"
+
+
+@queue.task()
+def accrual_task(period: str, tenant: t.Optional[str] = None) -> dict:
+    """Run the leave accrual engine for a YYYY-MM period (see app/accrual.py)."""
+    from app.accrual import run_period
+
+    return run_period(period, tenant=tenant).model_dump()
@@ -0,0 +1,98 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app import accrual
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "accrualuser@example.com"
+PASSWORD = "accrualpassword"
+POLICY_NAME = "test-accrual-policy"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        user = crud.get_user_by_email(db_session, TEST_USER_EMAIL)
+        if user:
+            db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+            crud.delete_user(db_session, user.id)
+        db_session.query(models.AccrualPolicy).filter(models.AccrualPolicy.name == POLICY_NAME).delete()
+        db_session.commit()
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    policy = crud.create_accrual_policy(
+        db, schemas.AccrualPolicyCreate(name=POLICY_NAME, days_per_month=2, carry_over_cap=2)
+    )
+    return crud.create_user(
+        db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD, accrual_policy_id=policy.id)
+    )
+
+
+def _ledger(db: Session, user_id: int):
+    rows = db.query(models.AccrualLedger).filter(models.AccrualLedger.user_id == user_id)
+    return sorted((row.period, row.kind, row.days) for row in rows)
+
+
+def test_accrual_is_idempotent_and_caps_carry_over(db: Session, test_user: models.User):
+    assert accrual.run_period("2040-11").accrued == 1
+    assert crud.run_accrual(db, date(2040, 12, 1), chunk_size=1).accrued == 1
+    # Rerunning a period credits nobody twice.
+    assert accrual.run_period("2040-12").accrued == 0
+
+    leave = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=date(2040, 12, 24), to_date=date(2040, 12, 24), leave_type=models.LeaveType.ANNUAL,
+        num_days=1, user_id=test_user.id,
+    ), user_id=test_user.id)
+    crud.update_leave_admin(db, leave.id, schemas.LeaveEdit(status=models.LeaveStatus.APPROVED))
+
+    # 4 accrued - 1 taken = 3 carried over, capped at 2.
+    result = accrual.run_period("2041-01")
+    assert (result.accrued, result.expired) == (1, 1)
+    assert accrual.run_period("2041-01").expired == 0
+    assert _ledger(db, test_user.id) == [
+        ("2040-11", "accrual", 2.0),
+        ("2040-12", "accrual", 2.0),
+        ("2041-01", "accrual", 2.0),
+        ("2041-01", "expiry", -1.0),
+    ]
+
+
+def test_accrual_balance_and_run_endpoints(client: TestClient, test_user: models.User):
+    r = client.post("/api/token", data={"username": TEST_USER_EMAIL, "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    response = client.get(f"{API_V1_STR}/accrual/balance", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["balance"] == 4.0
+
+    assert client.post(f"{API_V1_STR}/admin/accrual/runs", headers=headers).status_code == 403
+
+
+def test_accrual_cli_rejects_bad_period():
+    with pytest.raises(SystemExit):
+        accrual.parse_args(["--period", "October"])
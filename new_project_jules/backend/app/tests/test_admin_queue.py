@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "queueadmin@example.com"
+USER_EMAIL = "queueuser@example.com"
+PASSWORD = "queuepassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in (ADMIN_EMAIL, USER_EMAIL):
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                db_session.query(models.WFH).filter(models.WFH.user_id == user.id).delete(synchronize_session=False)
+                db_session.delete(user)
+        db_session.commit()
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient, db: Session) -> dict:
+    if not crud.get_user_by_email(db, ADMIN_EMAIL):
+        crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    r = client.post("/api/token", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture(scope="module")
+def employee(db: Session) -> models.User:
+    user = crud.get_user_by_email(db, USER_EMAIL)
+    if not user:
+        user = crud.create_user(
+            db, schemas.UserCreate(email=USER_EMAIL, password=PASSWORD, first_name="Queue", last_name="User")
+        )
+    return user
+
+
+def test_queue_lists_pending_across_kinds(client: TestClient, db: Session, admin_headers: dict, employee: models.User):
+    start = date.today() + timedelta(days=90)
+    leave = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=start, to_date=start, leave_type=models.LeaveType.SICK, num_days=1, user_id=employee.id,
+    ), user_id=employee.id)
+    wfh = crud.create_user_wfh(db, schemas.WFHCreate(
+        from_date=start, to_date=start, num_days=1, user_id=employee.id,
+    ), user_id=employee.id)
+    approved = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=start, to_date=start, leave_type=models.LeaveType.ANNUAL, num_days=1, user_id=employee.id,
+    ), user_id=employee.id)
+    crud.update_leave_admin(db, approved.id, schemas.LeaveEdit(status=models.LeaveStatus.APPROVED))
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"{API_V1_STR}/admin/queue", headers=admin_headers, params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        seen.extend((item["kind"], item["id"]) for item in page["items"] if item["user_id"] == employee.id)
+        for item in page["items"]:
+            if item["user_id"] == employee.id:
+                assert item["owner"]["first_name"] == "Queue"
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [("leave", leave.id), ("wfh", wfh.id)]
+
+
+def test_queue_requires_admin(client: TestClient, employee: models.User):
+    r = client.post("/api/token", data={"username": USER_EMAIL, "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    assert client.get(f"{API_V1_STR}/admin/queue", headers=headers).status_code == 403
+
+
+def test_queue_rejects_bad_cursor(client: TestClient, admin_headers: dict):
+    response = client.get(f"{API_V1_STR}/admin/queue", headers=admin_headers, params={"cursor": "garbage"})
+    assert response.status_code == 400
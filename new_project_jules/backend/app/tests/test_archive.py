@@ -0,0 +1,125 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.core import events
+from app.db import archive, crud, schemas, models, search
+from app.db.session import SessionLocal, Base, engine
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "archiveuser@example.com"
+PASSWORD = "archivepassword"
+CUTOFF = date(2010, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        user = crud.get_user_by_email(db_session, TEST_USER_EMAIL)
+        if user:
+            db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+            crud.delete_user(db_session, user.id)
+        db_session.commit()
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    user = crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD))
+    for from_date, to_date, status in (
+        (date(2001, 3, 5), date(2001, 3, 6), models.LeaveStatus.APPROVED),
+        (date(2001, 12, 31), date(2002, 1, 2), models.LeaveStatus.REJECTED),
+        (date(2001, 6, 1), date(2001, 6, 1), models.LeaveStatus.PENDING),  # Not closed: stays
+        (date(2030, 6, 3), date(2030, 6, 4), models.LeaveStatus.APPROVED),  # Recent: stays
+    ):
+        db.add(models.Leave(
+            user_id=user.id, from_date=from_date, to_date=to_date, status=status,
+            leave_type=models.LeaveType.ANNUAL, num_days=(to_date - from_date).days + 1,
+        ))
+    db.commit()
+    return user
+
+
+def _hot_dates(db: Session, user_id: int):
+    return sorted(row.from_date for row in db.query(models.Leave).filter(models.Leave.user_id == user_id))
+
+
+def _timeline_dates(db: Session, user_id: int, window_start=None):
+    return [row["from_date"] for row in crud.get_user_timeline(db, user_id, window_start=window_start)]
+
+
+def test_archive_moves_old_closed_requests(db: Session, test_user: models.User):
+    moved = archive.archive_closed(db, cutoff=CUTOFF, chunk_size=1)
+    assert moved["leave"] >= 2
+    assert _hot_dates(db, test_user.id) == [date(2001, 6, 1), date(2030, 6, 3)]
+    assert 2001 in archive.partitions(db, "leave")
+    assert inspect(db.connection()).has_table("leave_archive_2001")
+
+
+def test_ranges_reaching_back_include_archived_rows(db: Session, test_user: models.User):
+    everything = [date(2001, 3, 5), date(2001, 6, 1), date(2001, 12, 31), date(2030, 6, 3)]
+    assert _timeline_dates(db, test_user.id) == everything
+    assert _timeline_dates(db, test_user.id, window_start=date(2002, 1, 1)) == [date(2001, 12, 31), date(2030, 6, 3)]
+    # Inside the horizon the archive isn't consulted at all.
+    assert _timeline_dates(db, test_user.id, window_start=date.today()) == [date(2030, 6, 3)]
+
+    attendance = crud.get_attendance(db, [test_user.id], date(2001, 3, 1))
+    assert attendance[test_user.id][4:6] == "AA"
+    assert crud.get_accrual_balance(db, test_user.id).taken == 4
+
+
+def test_restore_moves_rows_back(db: Session, test_user: models.User):
+    restored, skipped = archive.restore(db, "leave", 2001, user_id=test_user.id)
+    assert (restored, skipped) == (2, 0)
+    assert _hot_dates(db, test_user.id) == [date(2001, 3, 5), date(2001, 6, 1), date(2001, 12, 31), date(2030, 6, 3)]
+    assert archive.restore(db, "leave", 2001, user_id=test_user.id) == (0, 0)
+
+
+def test_delete_user_removes_archived_rows(db: Session):
+    user = crud.create_user(db, schemas.UserCreate(email="archive-delete@example.com", password=PASSWORD))
+    leave = models.Leave(
+        user_id=user.id, from_date=date(2003, 1, 6), to_date=date(2003, 1, 6),
+        status=models.LeaveStatus.CANCELLED, leave_type=models.LeaveType.SICK, num_days=1,
+        comments="Quarantined with zygomycosis",
+    )
+    db.add(leave)
+    db.flush()
+    search.index_request(db, "leave", leave)
+    db.commit()
+    archive.archive_closed(db, cutoff=CUTOFF)
+    assert search.search(db, "zygomycosis")[0]
+    crud.delete_user(db, user.id)
+    table = archive.archive_table(models.Leave, 2003)
+    assert db.query(table).filter(table.c.user_id == user.id).count() == 0
+    assert search.search(db, "zygomycosis") == ([], False)
+    archive.restore(db, "leave", 2003)
+
+
+def test_delete_user_removes_live_requests(db: Session, monkeypatch):
+    user = crud.create_user(db, schemas.UserCreate(email="archive-live@example.com", password=PASSWORD))
+    start = date(2031, 3, 3)
+    leave = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=start, to_date=start, leave_type=models.LeaveType.SICK, num_days=1, user_id=user.id,
+        comments="Knee surgery",
+    ), user_id=user.id)
+    wfh = crud.create_user_wfh(db, schemas.WFHCreate(
+        from_date=start, to_date=start, num_days=1, user_id=user.id,
+    ), user_id=user.id)
+    assert search.search(db, "surgery")[0]
+    requested = {("leave", leave.id), ("wfh", wfh.id)}
+    published = []
+    monkeypatch.setattr(events, "_listeners", events._listeners + [published.append])
+
+    crud.delete_user(db, user.id)
+    assert db.query(models.Leave).filter(models.Leave.user_id == user.id).count() == 0
+    assert db.query(models.WFH).filter(models.WFH.user_id == user.id).count() == 0
+    assert search.search(db, "surgery") == ([], False)
+    deleted = {(event.entity, event.id) for event in published if event.action == "deleted"}
+    assert requested <= deleted
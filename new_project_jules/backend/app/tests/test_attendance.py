@@ -0,0 +1,108 @@
+from datetime import date
+import typing as t
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "attendanceuser@example.com"
+ADMIN_EMAIL = "attendanceadmin@example.com"
+PASSWORD = "attendancepassword"
+HOLIDAY = date(2033, 3, 7)
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        db_session.query(models.Holiday).filter(models.Holiday.date == HOLIDAY).delete(synchronize_session=False)
+        for email in (TEST_USER_EMAIL, ADMIN_EMAIL):
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                db_session.query(models.WFH).filter(models.WFH.user_id == user.id).delete(synchronize_session=False)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    return crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD))
+
+
+def _headers(client: TestClient, email: str) -> dict:
+    r = client.post("/api/token", data={"username": email, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _cached(db: Session, user_id: int) -> t.Optional[str]:
+    row = db.get(models.AttendanceMonth, (user_id, date(2033, 3, 1)))
+    return row and row.codes
+
+
+def test_attendance_month(client: TestClient, db: Session, test_user: models.User):
+    headers = _headers(client, TEST_USER_EMAIL)
+    # March 2033 starts on a Tuesday.
+    crud.create_user_wfh(db, schemas.WFHCreate(
+        from_date=date(2033, 3, 1), to_date=date(2033, 3, 2), num_days=2, user_id=test_user.id,
+    ), user_id=test_user.id)
+    leave = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=date(2033, 2, 27), to_date=date(2033, 3, 1), leave_type=models.LeaveType.SICK,
+        num_days=2, user_id=test_user.id,
+    ), user_id=test_user.id)
+    crud.update_leave_admin(db, leave.id, schemas.LeaveEdit(status=models.LeaveStatus.APPROVED))
+    crud.update_wfh_admin(db, db.query(models.WFH.id).filter(models.WFH.user_id == test_user.id).scalar(),
+                          schemas.WFHEdit(status=models.WFHStatus.APPROVED))
+
+    response = client.get(f"{API_V1_STR}/attendance", headers=headers, params={"month": "2033-03"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["month"] == "2033-03"
+    codes = body["rows"][0]["codes"]
+    assert len(codes) == 31
+    assert codes[:7] == "SWOO--O"
+    assert _cached(db, test_user.id) == codes
+
+    # A holiday and a cancelled leave both drop the cached month.
+    crud.create_holiday(db, schemas.HolidayCreate(date=HOLIDAY, name="Test day"))
+    assert _cached(db, test_user.id) is None
+    response = client.get(f"{API_V1_STR}/attendance", headers=headers, params={"month": "2033-03"})
+    assert response.json()["rows"][0]["codes"][:7] == "SWOO--H"
+
+    crud.update_leave_admin(db, leave.id, schemas.LeaveEdit(status=models.LeaveStatus.CANCELLED))
+    assert _cached(db, test_user.id) is None
+    response = client.get(f"{API_V1_STR}/attendance", headers=headers, params={"month": "2033-03"})
+    assert response.json()["rows"][0]["codes"][:7] == "WWOO--H"
+
+
+def test_admin_attendance(client: TestClient, db: Session, test_user: models.User):
+    crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    headers = _headers(client, ADMIN_EMAIL)
+    response = client.get(f"{API_V1_STR}/admin/attendance", headers=headers, params={"month": "2033-03"})
+    assert response.status_code == 200, response.text
+    assert test_user.id in [row["user_id"] for row in response.json()["rows"]]
+
+    user_headers = _headers(client, TEST_USER_EMAIL)
+    assert client.get(f"{API_V1_STR}/admin/attendance", headers=user_headers).status_code == 403
+    assert client.get(f"{API_V1_STR}/attendance", headers=user_headers, params={"month": "March"}).status_code == 400
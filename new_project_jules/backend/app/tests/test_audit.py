@@ -0,0 +1,98 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.core import audit
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "auditadmin@example.com"
+TEST_USER_EMAIL = "audituser@example.com"
+PASSWORD = "auditpassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in (TEST_USER_EMAIL, ADMIN_EMAIL):
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient, db: Session) -> dict:
+    crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    r = client.post("/api/token", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_diff_redacts_and_skips_unchanged():
+    assert audit.diff(
+        {"status": models.LeaveStatus.PENDING, "num_days": 1, "hashed_password": "a"},
+        {"status": models.LeaveStatus.APPROVED, "num_days": 1, "hashed_password": "b"},
+    ) == {"hashed_password": ["***", "***"], "status": ["pending", "approved"]}
+
+
+def test_admin_changes_are_audited(client: TestClient, db: Session, admin_headers: dict):
+    # Ids get reused once rows are deleted, so only look at entries from this test.
+    since = datetime.utcnow().isoformat()
+    user = crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD))
+    start = date.today() + timedelta(days=30)
+    leave = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=start, to_date=start, leave_type=models.LeaveType.ANNUAL, num_days=1, user_id=user.id,
+    ), user_id=user.id)
+
+    response = client.put(
+        f"{API_V1_STR}/admin/leaves/{leave.id}", headers=admin_headers, json={"status": "approved"},
+    )
+    assert response.status_code == 200, response.text
+    response = client.put(
+        f"{API_V1_STR}/admin/users/{user.id}/adjust_leave_days", headers=admin_headers,
+        json={"granted_additional_days": 3},
+    )
+    assert response.status_code == 200, response.text
+    # Buffered, not yet written.
+    assert len(audit.buffer) >= 2
+
+    response = client.get(
+        f"{API_V1_STR}/admin/audit", headers=admin_headers, params={"entity": "leave", "entity_id": leave.id, "since": since},
+    )
+    assert response.status_code == 200, response.text
+    [entry] = response.json()["items"]
+    admin = crud.get_user_by_email(db, ADMIN_EMAIL)
+    assert entry["action"] == "updated"
+    assert entry["actor_id"] == admin.id
+    assert entry["changes"] == {"status": ["pending", "approved"]}
+
+    response = client.get(f"{API_V1_STR}/admin/audit", headers=admin_headers, params={"actor_id": admin.id, "since": since, "limit": 1})
+    page = response.json()
+    assert page["items"][0]["changes"] == {"granted_additional_days": [0, 3]}
+    response = client.get(
+        f"{API_V1_STR}/admin/audit", headers=admin_headers,
+        params={"actor_id": admin.id, "since": since, "limit": 1, "cursor": page["next_cursor"]},
+    )
+    assert response.json()["items"][0]["entity_id"] == leave.id
@@ -0,0 +1,187 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.core import auth, events, revocation
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "batchadmin@example.com"
+TEST_USER_EMAIL = "batchuser@example.com"
+PASSWORD = "batchpassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in (TEST_USER_EMAIL, ADMIN_EMAIL):
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+def _headers(client: TestClient, email: str) -> dict:
+    r = client.post("/api/token", data={"username": email, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    return crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD))
+
+
+@pytest.fixture(scope="module")
+def leaves(db: Session, test_user: models.User) -> list:
+    start = date.today() + timedelta(days=120)
+    return [
+        crud.create_user_leave(db, schemas.LeaveCreate(
+            from_date=start + timedelta(days=2 * n), to_date=start + timedelta(days=2 * n),
+            leave_type=models.LeaveType.ANNUAL, num_days=1, user_id=test_user.id,
+        ), user_id=test_user.id).id
+        for n in range(3)
+    ]
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient, db: Session) -> dict:
+    crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    return _headers(client, ADMIN_EMAIL)
+
+
+def _batch(client: TestClient, headers: dict, operations: list, atomic: bool = False) -> list:
+    response = client.post(f"{API_V1_STR}/batch", headers=headers, json={"operations": operations, "atomic": atomic})
+    assert response.status_code == 200, response.text
+    return response.json()["results"]
+
+
+def test_batch_runs_operations_in_order_with_per_item_status(
+    client: TestClient, db: Session, admin_headers: dict, test_user: models.User, leaves: list
+):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM "leave"' in statement or "FROM leave" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        results = _batch(client, admin_headers, [
+            {"id": "a", "method": "GET", "path": f"/admin/leaves/{leaves[0]}"},
+            {"id": "b", "method": "GET", "path": f"{API_V1_STR}/admin/leaves/{leaves[1]}"},
+            {"id": "c", "method": "GET", "path": "/admin/leaves/999999"},
+        ])
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert [(result["id"], result["status"]) for result in results] == [("a", 200), ("b", 200), ("c", 404)]
+    assert results[1]["body"]["id"] == leaves[1]
+    assert results[1]["headers"] == {"etag": '"1"'}
+    assert results[2]["body"] == {"detail": "Leave request not found"}
+    assert len(statements) == 2  # One IN query for the three reads, then the miss
+
+    results = _batch(client, admin_headers, [
+        {"method": "PUT", "path": f"/admin/leaves/{leaves[0]}", "body": {"status": "approved"}},
+        {"method": "GET", "path": f"/admin/leaves?ids={leaves[1]},{leaves[0]}"},
+        {"method": "GET", "path": f"/users/{test_user.id}"},
+        {"method": "POST", "path": "/users/1"},
+        {"method": "GET", "path": "/admin/leaves/not-a-number"},
+        {"method": "PUT", "path": f"/admin/leaves/{leaves[1]}", "body": {"num_days": "many"}},
+        {"method": "GET", "path": "/no/such/route"},
+        {"method": "POST", "path": "/batch", "body": {"operations": []}},
+    ])
+    assert [result["status"] for result in results] == [200, 200, 200, 405, 422, 422, 404, 400]
+    assert results[0]["headers"]["etag"] == '"2"'
+    assert [(leave["id"], leave["status"]) for leave in results[1]["body"]] == [
+        (leaves[1], "pending"), (leaves[0], "approved"),
+    ]
+    assert results[2]["body"]["email"] == TEST_USER_EMAIL
+
+
+def test_atomic_batch_rolls_back_every_write(
+    client: TestClient, db: Session, admin_headers: dict, leaves: list
+):
+    published = []
+    listener = events.on_change(published.append)
+    try:
+        results = _batch(client, admin_headers, [
+            {"method": "PUT", "path": f"/admin/leaves/{leaves[2]}", "body": {"comments": "Batch change"}},
+            {"method": "DELETE", "path": "/admin/leaves/999999"},
+        ], atomic=True)
+    finally:
+        events._listeners.remove(listener)
+    assert [result["status"] for result in results] == [424, 404]
+    db.expire_all()
+    assert crud.get_leave_by_id_admin(db, leaves[2]).comments is None
+    assert published == []
+
+
+def test_atomic_batch_rollback_keeps_tokens_valid(
+    client: TestClient, db: Session, admin_headers: dict, test_user: models.User
+):
+    headers = _headers(client, TEST_USER_EMAIL)
+    results = _batch(client, admin_headers, [
+        {"method": "PUT", "path": f"/users/{test_user.id}", "body": {"is_superuser": True}},
+        {"method": "DELETE", "path": "/admin/leaves/999999"},
+    ], atomic=True)
+    assert [result["status"] for result in results] == [424, 404]
+    # The token_version bump was rolled back, and so must be its cache update.
+    assert client.get(f"{API_V1_STR}/users/me", headers=headers).status_code == 200
+    db.expire_all()
+    user = crud.get_user(db, test_user.id)
+    assert revocation.lookup(db, test_user.id) == (user.token_version, True)
+    assert not user.is_superuser
+
+
+def test_batch_applies_user_permissions(client: TestClient, test_user: models.User, leaves: list, admin_headers: dict):
+    headers = _headers(client, TEST_USER_EMAIL)
+    admin = crud.get_user_by_email(SessionLocal(), ADMIN_EMAIL)
+    results = _batch(client, headers, [
+        {"method": "GET", "path": f"/leaves/{leaves[0]}"},
+        {"method": "GET", "path": f"/admin/leaves/{leaves[0]}"},
+        {"method": "GET", "path": f"/users/{admin.id}"},
+    ])
+    assert [result["status"] for result in results] == [200, 403, 403]
+
+    response = client.get(f"{API_V1_STR}/admin/leaves", headers=admin_headers, params={"ids": f"{leaves[2]},x"})
+    assert response.status_code == 400
+    response = client.get(f"{API_V1_STR}/admin/leaves", headers=admin_headers, params={"ids": f"{leaves[2]}"})
+    assert [leave["id"] for leave in response.json()] == [leaves[2]]
+
+
+def test_batch_authorizes_once(client: TestClient, admin_headers: dict, leaves: list, monkeypatch):
+    calls = []
+    decode, lookup = auth.jwt.decode, revocation.lookup
+    monkeypatch.setattr(auth.jwt, "decode", lambda *args, **kwargs: calls.append("decode") or decode(*args, **kwargs))
+    monkeypatch.setattr(revocation, "lookup", lambda *args: calls.append("lookup") or lookup(*args))
+
+    assert client.get(f"{API_V1_STR}/users/me", headers=admin_headers).status_code == 200
+    single, calls[:] = list(calls), []
+    results = _batch(client, admin_headers, [
+        {"method": "GET", "path": f"/admin/leaves/{leave_id}"} for leave_id in leaves
+    ] + [{"method": "GET", "path": "/users/me"}])
+    assert [result["status"] for result in results] == [200] * 4
+    # Four operations, and no more token decoding or revocation checks than one request.
+    assert calls == single
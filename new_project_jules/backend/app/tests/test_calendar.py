@@ -0,0 +1,116 @@
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.core import calendar
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+
+
+Base.metadata.create_all(bind=engine)
+
+MANAGER_EMAIL = "calendarmanager@example.com"
+TEST_USER_EMAIL = "calendaruser@example.com"
+PASSWORD = "calendarpassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in (TEST_USER_EMAIL, MANAGER_EMAIL):
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                db_session.query(models.WFH).filter(models.WFH.user_id == user.id).delete(synchronize_session=False)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def users(db: Session) -> dict:
+    manager = crud.create_user(db, schemas.UserCreate(email=MANAGER_EMAIL, password=PASSWORD))
+    member = crud.create_user(db, schemas.UserCreate(
+        email=TEST_USER_EMAIL, password=PASSWORD, first_name="Cal", last_name="Endar", manager_id=manager.id,
+    ))
+    return {"manager": manager, "member": member}
+
+
+def _links(client: TestClient, email: str) -> dict:
+    r = client.post("/api/token", data={"username": email, "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    response = client.get("/api/v1/calendar/links", headers=headers)
+    assert response.status_code == 200, response.text
+    return {name: urlparse(url).path for name, url in response.json().items()}
+
+
+def test_feeds_and_conditional_requests(client: TestClient, db: Session, users: dict):
+    member = users["member"]
+    start = date.today() + timedelta(days=10)
+    leave = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=start, to_date=start + timedelta(days=1), leave_type=models.LeaveType.ANNUAL,
+        num_days=2, user_id=member.id,
+    ), user_id=member.id)
+    crud.update_leave_admin(db, leave.id, schemas.LeaveEdit(status=models.LeaveStatus.APPROVED))
+
+    personal = _links(client, TEST_USER_EMAIL)["personal"]
+    response = client.get(personal)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/calendar")
+    body = response.text
+    assert f"UID:leave-{leave.id}@leave-calendar" in body
+    assert f"DTEND;VALUE=DATE:{(start + timedelta(days=2)).strftime('%Y%m%d')}" in body
+
+    etag = response.headers["etag"]
+    assert client.get(personal, headers={"If-None-Match": etag}).status_code == 304
+    last_modified = response.headers["last-modified"]
+    assert client.get(personal, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # The manager's team feed names the member.
+    team = _links(client, MANAGER_EMAIL)["team"]
+    assert "SUMMARY:Cal Endar: Annual leave" in client.get(team).text
+
+    # A write drops both cached feeds.
+    wfh = crud.create_user_wfh(db, schemas.WFHCreate(
+        from_date=start, to_date=start, num_days=1, user_id=member.id,
+    ), user_id=member.id)
+    crud.update_wfh_admin(db, wfh.id, schemas.WFHEdit(status=models.WFHStatus.APPROVED))
+    assert calendar.cache.get(("default", "user", member.id)) is None
+    assert calendar.cache.get(("default", "team", users["manager"].id)) is None
+    response = client.get(personal, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert f"UID:wfh-{wfh.id}@leave-calendar" in response.text
+
+
+def test_feed_tokens_are_checked(client: TestClient, db: Session, users: dict):
+    personal = _links(client, TEST_USER_EMAIL)["personal"]
+    assert client.get(personal[:-8] + "x.ics").status_code == 404
+
+    # Changing the password revokes links handed out before.
+    crud.edit_user(db, users["member"].id, schemas.UserEdit(password="newcalendarpassword"))
+    assert client.get(personal).status_code == 404
+    crud.edit_user(db, users["member"].id, schemas.UserEdit(password=PASSWORD))
+
+
+def test_long_lines_are_folded():
+    line = "SUMMARY:" + "é" * 60
+    folded = calendar._fold(line)
+    assert all(len(part.encode()) <= 75 for part in folded.split("\r\n"))
+    assert folded.replace("\r\n ", "") == line
@@ -0,0 +1,117 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.core import availability
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+PASSWORD = "capacitypassword"
+ADMIN_EMAIL = "capacityadmin@example.com"
+EMAILS = [f"capacity{i}@example.com" for i in range(3)]
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in EMAILS + [ADMIN_EMAIL]:
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                db_session.query(models.WFH).filter(models.WFH.user_id == user.id).delete(synchronize_session=False)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient, db: Session) -> dict:
+    crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    r = client.post("/api/token", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_column_counts():
+    assert availability.column_counts([0b0110, 0b0011, 0b0111], 4) == [2, 3, 2, 0]
+    assert availability.column_counts([1] * 9, 2) == [9, 0]
+    assert availability.column_counts([], 3) == [0, 0, 0]
+
+
+def test_capacity_heatmap(client: TestClient, db: Session, admin_headers: dict):
+    manager = crud.create_user(db, schemas.UserCreate(email=EMAILS[0], password=PASSWORD))
+    alice = crud.create_user(db, schemas.UserCreate(email=EMAILS[1], password=PASSWORD, manager_id=manager.id))
+    bob = crud.create_user(db, schemas.UserCreate(email=EMAILS[2], password=PASSWORD, manager_id=manager.id))
+
+    def leave(user, start, end, status=models.LeaveStatus.APPROVED):
+        row = crud.create_user_leave(db, schemas.LeaveCreate(
+            from_date=start, to_date=end, leave_type=models.LeaveType.ANNUAL,
+            num_days=(end - start).days + 1, user_id=user.id,
+        ), user_id=user.id)
+        if status != models.LeaveStatus.PENDING:
+            crud.update_leave_admin(db, row.id, schemas.LeaveEdit(status=status))
+        return row
+
+    # Spans the new year, so two yearly bitsets are involved.
+    leave(alice, date(2031, 12, 30), date(2032, 1, 2))
+    leave(bob, date(2032, 1, 1), date(2032, 1, 1))
+    pending = leave(bob, date(2032, 1, 3), date(2032, 1, 3), status=models.LeaveStatus.PENDING)
+    crud.create_user_wfh(db, schemas.WFHCreate(
+        from_date=date(2031, 12, 31), to_date=date(2031, 12, 31), num_days=1, user_id=bob.id,
+    ), user_id=bob.id)
+
+    params = {"from": "2031-12-30", "to": "2032-01-03", "group": f"team:{manager.id}", "min_available": 1}
+    response = client.get(f"{API_V1_STR}/admin/capacity", headers=admin_headers, params=params)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["group_size"] == 2
+    assert body["on_leave"] == [1, 1, 2, 1, 0]
+    assert body["wfh"] == [0, 0, 0, 0, 0]
+    assert body["available"] == [1, 1, 0, 1, 2]
+    assert body["shortfall"] == ["2032-01-01"]
+
+    response = client.get(
+        f"{API_V1_STR}/admin/capacity", headers=admin_headers, params={**params, "include_pending": True}
+    )
+    assert response.json()["on_leave"] == [1, 1, 2, 1, 1]
+    assert response.json()["wfh"] == [0, 1, 0, 0, 0]
+
+    # Writes invalidate the owner's bitsets.
+    crud.update_leave_admin(db, pending.id, schemas.LeaveEdit(status=models.LeaveStatus.APPROVED))
+    response = client.get(f"{API_V1_STR}/admin/capacity", headers=admin_headers, params=params)
+    assert response.json()["on_leave"] == [1, 1, 2, 1, 1]
+
+    # Changes that publish no event show up once the index expires.
+    db.query(models.Leave).filter(models.Leave.id == pending.id).update(
+        {models.Leave.status: models.LeaveStatus.REJECTED}, synchronize_session=False
+    )
+    db.commit()
+    day = date(2032, 1, 3)
+    assert availability.index_for().counts(db, [alice.id, bob.id], day, day, ("leave",)) == {"leave": [1]}
+    expired = availability.AvailabilityIndex(ttl=0)
+    assert expired.counts(db, [alice.id, bob.id], day, day, ("leave",)) == {"leave": [0]}
+
+
+def test_capacity_rejects_bad_group(client: TestClient, admin_headers: dict):
+    params = {"from": "2032-01-01", "to": "2032-01-31", "group": "everyone"}
+    response = client.get(f"{API_V1_STR}/admin/capacity", headers=admin_headers, params=params)
+    assert response.status_code == 400
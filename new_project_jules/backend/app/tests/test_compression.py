@@ -0,0 +1,108 @@
+import gzip
+import json
+import zlib
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core import calendar, compression
+
+BIG = {"items": [{"id": n, "comments": "Out of office"} for n in range(200)]}
+
+demo = FastAPI()
+demo.add_middleware(compression.CompressionMiddleware, minimum_size=500)
+
+
+@demo.get("/big")
+async def big():
+    return BIG
+
+
+@demo.get("/small")
+async def small():
+    return {"ok": True}
+
+
+@demo.get("/export")
+async def export():
+    async def rows():
+        for n in range(50):
+            yield f"{n},Out of office\n"
+
+    return StreamingResponse(rows(), media_type="text/csv")
+
+
+@demo.get("/events")
+async def events():
+    return StreamingResponse(iter(["data: {}\n\n"] * 100), media_type="text/event-stream")
+
+
+@demo.get("/encoded")
+async def encoded():
+    return Response(gzip.compress(b"x" * 1000), media_type="text/plain", headers={"Content-Encoding": "gzip"})
+
+
+@demo.get("/tagged")
+async def tagged():
+    return PlainTextResponse("y" * 1000, headers={"ETag": '"v1"'})
+
+
+def test_negotiation():
+    first = compression.ENCODINGS[0]
+    assert compression.negotiate(None) is None
+    assert compression.negotiate("identity") is None
+    assert compression.negotiate("gzip;q=0.5, identity") == "gzip"
+    assert compression.negotiate("gzip;q=0") is None
+    assert compression.negotiate("*") == first
+    assert compression.negotiate("gzip;q=0.2, *;q=0.8") == first
+
+
+def test_middleware_compresses_large_and_streamed_responses():
+    client = TestClient(demo)
+    gz = {"Accept-Encoding": "gzip"}
+
+    response = client.get("/big", headers=gz)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(json.dumps(BIG))
+    assert response.json() == BIG
+
+    assert "content-encoding" not in client.get("/small", headers=gz).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+    response = client.get("/export", headers=gz)
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.splitlines()[-1] == "49,Out of office"
+
+    assert "content-encoding" not in client.get("/events", headers=gz).headers
+    response = client.get("/encoded", headers=gz)
+    assert response.text == "x" * 1000
+    assert client.get("/tagged", headers=gz).headers["etag"] == 'W/"v1"'
+
+
+def test_stream_compressor_flushes_every_chunk():
+    stream = compression.StreamCompressor("gzip")
+    decoder = zlib.decompressobj(31)
+    assert decoder.decompress(stream.compress(b"first chunk")) == b"first chunk"
+    assert decoder.decompress(stream.compress(b", second") + stream.finish()) == b", second"
+
+
+def test_feed_variants_are_compressed_once(monkeypatch):
+    calls = []
+    real = compression.compress
+    monkeypatch.setattr(compression, "compress", lambda body, encoding: calls.append(encoding) or real(body, encoding))
+    feed = calendar.FeedCache(10, 60).put(("default", "user", 1), b"BEGIN:VCALENDAR\r\n" * 100, [1])
+    assert gzip.decompress(feed.encoded("gzip")) == feed.body
+    assert feed.encoded("gzip") is feed.encoded("gzip")
+    assert calls == ["gzip"]
+
+
+def test_app_responses_keep_their_length():
+    client = TestClient(app)
+    response = client.get("/api", headers={"Accept-Encoding": "gzip"})  # The OpenAPI document
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) == response.num_bytes_downloaded
+    assert response.json()["info"]["title"]
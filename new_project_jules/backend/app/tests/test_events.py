@@ -0,0 +1,136 @@
+import asyncio
+import json
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core import events
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "eventsuser@example.com"
+TEST_USER_PASSWORD = "eventspassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        user = crud.get_user_by_email(db_session, TEST_USER_EMAIL)
+        if user:
+            db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+            db_session.delete(user)
+            db_session.commit()
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    user = crud.get_user_by_email(db, TEST_USER_EMAIL)
+    if not user:
+        user = crud.create_user(
+            db,
+            schemas.UserCreate(email=TEST_USER_EMAIL, password=TEST_USER_PASSWORD),
+        )
+    return user
+
+
+@pytest.fixture(scope="module")
+def access_token(client: TestClient, test_user: models.User) -> str:
+    r = client.post("/api/token", data={"username": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD})
+    assert r.status_code == 200, r.text
+    return r.json()["access_token"]
+
+
+def test_broker_routes_by_user_and_admin():
+    class Row:
+        id = 1
+        user_id = 7
+        status = models.LeaveStatus.PENDING
+
+    async def run():
+        own = events.broker.subscribe(user_id=7)
+        other = events.broker.subscribe(user_id=8)
+        admin = events.broker.subscribe(admin=True)
+        try:
+            events.publish("leave", "created", Row())
+            assert (await own.get(timeout=1)).status == "pending"
+            assert (await admin.get(timeout=1)).user_id == 7
+            assert await other.get(timeout=0.01) is None
+        finally:
+            for sub in (own, other, admin):
+                sub.close()
+
+    asyncio.run(run())
+    assert events.broker.subscriber_count == 0
+
+
+def test_websocket_receives_own_changes(client: TestClient, db: Session, test_user: models.User, access_token: str):
+    with client.websocket_connect(f"/api/v1/events/ws?access_token={access_token}") as ws:
+        leave = crud.create_user_leave(
+            db,
+            schemas.LeaveCreate(
+                from_date=date.today() + timedelta(days=5),
+                to_date=date.today() + timedelta(days=6),
+                leave_type=models.LeaveType.ANNUAL,
+                num_days=2,
+                user_id=test_user.id,
+            ),
+            user_id=test_user.id,
+        )
+        message = json.loads(ws.receive_text())
+        assert message == {
+            "entity": "leave",
+            "action": "created",
+            "id": leave.id,
+            "user_id": test_user.id,
+            "status": "pending",
+        }
+
+
+def test_admin_scope_requires_superuser(client: TestClient, access_token: str):
+    response = client.get(f"/api/v1/events?scope=admin&access_token={access_token}")
+    assert response.status_code == 403
+
+
+def test_events_require_token(client: TestClient):
+    assert client.get("/api/v1/events").status_code == 401
+
+
+def test_relay_delivers_events_from_other_workers(db: Session):
+    # Two relays stand for two worker processes sharing the database.
+    mine = events.Relay(interval=60, retention=300)
+    theirs = events.Relay(interval=60, retention=300)
+    mine.open()
+    theirs.open()
+    received = []
+    listener = events.on_change(received.append)
+    try:
+        theirs.write(events.ChangeEvent("wfh", "updated", 41, 7, "approved"))
+        assert theirs.poll() == 0  # Already delivered where it happened
+        assert mine.poll() == 1
+        assert mine.poll() == 0
+    finally:
+        events._listeners.remove(listener)
+    assert events.ChangeEvent("wfh", "updated", 41, 7, "approved") in received
+    db.query(models.ChangeEventLog).filter(models.ChangeEventLog.entity_id == 41).delete(synchronize_session=False)
+    db.commit()
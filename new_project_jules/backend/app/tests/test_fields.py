@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.api.dependencies.fields import sparse_adapter
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "fieldsadmin@example.com"
+TEST_USER_EMAIL = "fieldsuser@example.com"
+PASSWORD = "fieldspassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in (TEST_USER_EMAIL, ADMIN_EMAIL):
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def user_headers(client: TestClient, db: Session) -> dict:
+    user = crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD))
+    start = date.today() + timedelta(days=150)
+    crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=start, to_date=start, leave_type=models.LeaveType.ANNUAL, num_days=1, user_id=user.id,
+        comments="A long comment that list views never show",
+    ), user_id=user.id)
+    db.expunge_all()
+    r = client.post("/api/token", data={"username": TEST_USER_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient, db: Session) -> dict:
+    crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    r = client.post("/api/token", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_fields_narrow_query_and_payload(client: TestClient, user_headers: dict):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM leave" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(f"{API_V1_STR}/leaves", headers=user_headers, params={"fields": "from_date, status"})
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert response.status_code == 200, response.text
+    assert [set(leave) for leave in response.json()] == [{"id", "from_date", "status"}]
+    assert len(statements) == 1 and "comments" not in statements[0]
+
+    full = client.get(f"{API_V1_STR}/leaves", headers=user_headers).json()
+    assert full[0]["comments"] == "A long comment that list views never show"
+
+    response = client.get(f"{API_V1_STR}/leaves", headers=user_headers, params={"fields": "from_date,owner"})
+    assert response.status_code == 400
+
+
+def test_user_listing_keeps_range_header(client: TestClient, admin_headers: dict):
+    response = client.get(f"{API_V1_STR}/users", headers=admin_headers, params={"fields": "email", "limit": 2})
+    assert response.status_code == 200
+    assert all(set(user) == {"id", "email"} for user in response.json())
+    assert response.headers["Content-Range"].startswith("0-1/")
+
+
+def test_projected_models_are_cached():
+    adapter = sparse_adapter(schemas.WFH, frozenset({"id", "status"}))
+    assert sparse_adapter(schemas.WFH, frozenset({"status", "id"})) is adapter
+    assert sparse_adapter(schemas.WFH, frozenset({"id"})) is not adapter
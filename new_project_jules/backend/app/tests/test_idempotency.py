@@ -0,0 +1,160 @@
+import asyncio
+import json
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.core import idempotency
+from app.core.security import create_access_token
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "idempotentuser@example.com"
+PASSWORD = "idempotencypassword"
+STUB_USER_ID = 987654  # The uid of the tokens sent to the stub endpoint
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        user = crud.get_user_by_email(db_session, TEST_USER_EMAIL)
+        if user:
+            db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+            crud.delete_user(db_session, user.id)
+        db_session.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.user_id.in_([user.id if user else None, STUB_USER_ID])
+        ).delete(synchronize_session=False)
+        db_session.commit()
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    return crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD))
+
+
+@pytest.fixture(scope="module")
+def user_headers(client: TestClient, test_user: models.User) -> dict:
+    r = client.post("/api/token", data={"username": TEST_USER_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_retry_replays_the_first_response(client: TestClient, db: Session, test_user: models.User, user_headers: dict):
+    start = date.today() + timedelta(days=90)
+    payload = {
+        "from_date": str(start), "to_date": str(start), "leave_type": "annual", "num_days": 1, "user_id": test_user.id,
+    }
+    headers = {**user_headers, "Idempotency-Key": "leave-create-1"}
+
+    first = client.post(f"{API_V1_STR}/leaves", headers=headers, json=payload)
+    assert first.status_code == 201, first.text
+    retry = client.post(f"{API_V1_STR}/leaves", headers=headers, json=payload)
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(crud.get_user_leaves(db, test_user.id)) == 1
+
+    response = client.post(f"{API_V1_STR}/leaves", headers=headers, json={**payload, "num_days": 2})
+    assert response.status_code == 422
+    response = client.post(f"{API_V1_STR}/leaves", headers={**user_headers, "Idempotency-Key": "x" * 256}, json=payload)
+    assert response.status_code == 400
+
+
+def test_failed_attempts_are_not_kept(client: TestClient, test_user: models.User, user_headers: dict):
+    headers = {**user_headers, "Idempotency-Key": "leave-create-bad"}
+    payload = {"from_date": "2031-05-02", "to_date": "2031-05-01", "leave_type": "annual", "num_days": 1,
+               "user_id": test_user.id}
+    assert client.post(f"{API_V1_STR}/leaves", headers=headers, json=payload).status_code == 422
+    response = client.post(f"{API_V1_STR}/leaves", headers=headers, json=payload)
+    assert response.status_code == 422
+    assert "idempotent-replayed" not in response.headers
+
+
+def _stub_endpoint(calls: list):
+    async def endpoint(scope, receive, send):
+        calls.append((await receive())["body"])
+        await asyncio.sleep(0.01)
+        await send({"type": "http.response.start", "status": 201, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps({"n": len(calls)}).encode()})
+
+    return endpoint
+
+
+def _post(middleware, key: bytes, body: bytes = b"{}"):
+    token = create_access_token(data={"sub": "someone@example.com", "uid": STUB_USER_ID})
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/v1/leaves", "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode()), (b"idempotency-key", key)],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def call():
+        await middleware(scope, receive, send)
+        return sent
+
+    return call()
+
+
+def test_concurrent_duplicates_are_coalesced(db: Session):
+    calls = []
+    middleware = idempotency.IdempotencyMiddleware(_stub_endpoint(calls))
+
+    async def run():
+        return await asyncio.gather(*(_post(middleware, b"same") for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert calls == [b"{}"]
+    assert {result[1]["body"] for result in results} == {b'{"n": 1}'}
+    assert sum((b"idempotent-replayed", b"true") in result[0]["headers"] for result in results) == 2
+    assert middleware._in_flight == {}
+
+
+def test_keys_are_shared_between_workers(db: Session):
+    calls = []
+    # Two middleware instances stand for two worker processes.
+    first = idempotency.IdempotencyMiddleware(_stub_endpoint(calls))
+    second = idempotency.IdempotencyMiddleware(_stub_endpoint(calls))
+
+    sent = asyncio.run(_post(first, b"shared"))
+    assert sent[0]["status"] == 201
+    replayed = asyncio.run(_post(second, b"shared"))
+    assert calls == [b"{}"]
+    assert replayed[0]["status"] == 201 and replayed[1]["body"] == b'{"n": 1}'
+    assert (b"idempotent-replayed", b"true") in replayed[0]["headers"]
+    assert asyncio.run(_post(second, b"shared", body=b'{"other": 1}'))[0]["status"] == 422
+
+    # Reserved by a request still running elsewhere.
+    scope = {"method": "POST", "path": "/api/v1/leaves", "query_string": b""}
+    assert idempotency.reserve(STUB_USER_ID, "running", idempotency.request_fingerprint(scope, b"{}")) is None
+    assert asyncio.run(_post(second, b"running"))[0]["status"] == 409
+    idempotency.release(STUB_USER_ID, "running")
+    assert asyncio.run(_post(second, b"running"))[0]["status"] == 201
+    assert len(calls) == 2
@@ -243,3 +243,53 @@ def test_get_all_my_leaves(client: TestClient, auth_token_headers: dict[str, str
     db.delete(l1)
     db.delete(l2)
     db.commit()
+
+def test_update_leave_with_if_match(client: TestClient, auth_token_headers: dict[str, str], test_user: models.User, db: Session):
+    leave_create_schema = schemas.LeaveCreate(
+        from_date=date.today() + timedelta(days=60), to_date=date.today() + timedelta(days=61),
+        leave_type=models.LeaveType.ANNUAL, comments="Versioned", num_days=2, user_id=test_user.id)
+    created_leave = crud.create_user_leave(db, leave=leave_create_schema, user_id=test_user.id)
+
+    response = client.get(f"{API_V1_STR}/leaves/{created_leave.id}", headers=auth_token_headers)
+    etag = response.headers["ETag"]
+    assert etag == '"1"'
+
+    response = client.put(f"{API_V1_STR}/leaves/{created_leave.id}",
+                          headers={**auth_token_headers, "If-Match": etag}, json={"comments": "First writer"})
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] == '"2"'
+
+    # A second writer still holding the old ETag loses instead of overwriting.
+    response = client.put(f"{API_V1_STR}/leaves/{created_leave.id}",
+                          headers={**auth_token_headers, "If-Match": etag}, json={"comments": "Second writer"})
+    assert response.status_code == 412, response.text
+
+    db.refresh(created_leave)
+    assert created_leave.comments == "First writer"
+    db.delete(created_leave) # Cleanup
+    db.commit()
+
+def test_noop_update_keeps_version(client: TestClient, auth_token_headers: dict[str, str], test_user: models.User, db: Session):
+    start = date.today() + timedelta(days=70)
+    created_leave = crud.create_user_leave(db, leave=schemas.LeaveCreate(
+        from_date=start, to_date=start, leave_type=models.LeaveType.ANNUAL, comments="Unchanged", num_days=1,
+        user_id=test_user.id), user_id=test_user.id)
+    same = {"comments": "Unchanged", "from_date": start.isoformat(), "leave_type": models.LeaveType.ANNUAL.value}
+
+    response = client.put(f"{API_V1_STR}/leaves/{created_leave.id}",
+                          headers={**auth_token_headers, "If-Match": '"1"'}, json=same)
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == '"1"'
+    # Still a precondition: a stale ETag fails even when nothing would change.
+    response = client.put(f"{API_V1_STR}/leaves/{created_leave.id}",
+                          headers={**auth_token_headers, "If-Match": '"0"'}, json=same)
+    assert response.status_code == 412, response.text
+
+    response = client.put(f"{API_V1_STR}/leaves/{created_leave.id}", headers=auth_token_headers, json={"num_days": 1})
+    assert response.json()["version"] == 1
+    response = client.put(f"{API_V1_STR}/leaves/{created_leave.id}", headers=auth_token_headers, json={"comments": "Changed"})
+    assert response.json()["version"] == 2
+
+    db.delete(db.get(models.Leave, created_leave.id)) # Cleanup
+    db.commit()
@@ -0,0 +1,66 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app.db import crud
+from app.migrate import upgrade_schema
+
+# The user, leave and wfh tables as the first release created them.
+BASELINE = (
+    """CREATE TABLE user (
+        id INTEGER PRIMARY KEY, email VARCHAR NOT NULL UNIQUE, first_name VARCHAR, last_name VARCHAR,
+        hashed_password VARCHAR NOT NULL, is_active BOOLEAN, is_superuser BOOLEAN,
+        granted_additional_days INTEGER NOT NULL)""",
+    """CREATE TABLE leave (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), from_date DATE NOT NULL,
+        to_date DATE NOT NULL, status VARCHAR(9) NOT NULL, leave_type VARCHAR(6) NOT NULL, comments VARCHAR,
+        num_days INTEGER NOT NULL)""",
+    """CREATE TABLE wfh (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), from_date DATE NOT NULL,
+        to_date DATE NOT NULL, status VARCHAR(9) NOT NULL, comments VARCHAR, num_days INTEGER NOT NULL)""",
+    "INSERT INTO user VALUES (1, 'old@example.com', NULL, NULL, 'x', 1, 0, 0)",
+    "INSERT INTO leave VALUES (1, 1, '2024-01-01', '2024-01-02', 'PENDING', 'ANNUAL', NULL, 2)",
+    "INSERT INTO wfh VALUES (1, 1, '2024-01-01', '2024-01-01', 'APPROVED', NULL, 1)",
+)
+
+
+def test_upgrade_baseline_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE:
+            conn.execute(text(statement))
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)  # Idempotent
+
+    inspector = inspect(engine)
+    user_columns = {column["name"] for column in inspector.get_columns("user")}
+    assert {"token_version", "manager_id", "accrual_policy_id"} <= user_columns
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'ix_user_manager_id'")).scalar()
+        assert conn.execute(text("SELECT token_version, manager_id FROM user")).one() == (0, None)
+        for table in ("leave", "wfh"):
+            version, created_at = conn.execute(text(f"SELECT version, created_at FROM {table}")).one()
+            assert version == 1 and created_at is not None
+    engine.dispose()
+
+
+def test_queue_pages_through_migrated_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE:
+            conn.execute(text(statement))
+        for leave_id in (2, 3, 4):
+            conn.execute(text(
+                f"INSERT INTO leave VALUES ({leave_id}, 1, '2024-02-01', '2024-02-02', 'PENDING', 'ANNUAL', NULL, 2)"
+            ))
+    upgrade_schema(engine)
+
+    # Every backfilled row has the same created_at: pages continue on the id.
+    seen, after = [], None
+    with Session(engine) as db:
+        while page := crud.get_pending_queue(db, after=after, limit=1):
+            row = page[-1]
+            seen.append(row["id"])
+            after = (row["created_at"], row["kind"], row["id"])
+    assert seen == [1, 2, 3, 4]
+    engine.dispose()
@@ -0,0 +1,129 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.core import policy
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "policyuser@example.com"
+PASSWORD = "policypassword"
+TODAY = date(2031, 3, 3)
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        user = crud.get_user_by_email(db_session, TEST_USER_EMAIL)
+        if user:
+            db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+            db_session.query(models.WFH).filter(models.WFH.user_id == user.id).delete(synchronize_session=False)
+            crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def user_headers(client: TestClient, db: Session) -> dict:
+    crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=PASSWORD))
+    r = client.post("/api/token", data={"username": TEST_USER_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def strict_policy():
+    original = policy.policy
+    policy.policy = policy.Policy({
+        "max_consecutive_days": {"annual": 5},
+        "notice_days": {"*": 7},
+        "blackouts": [{"name": "Freeze", "from": "2031-12-20", "to": "2031-12-31", "kinds": ["annual", "wfh"]}],
+    })
+    yield policy.policy
+    policy.policy = original
+
+
+def _request(start: date, end: date, **overrides) -> policy.Request:
+    values = dict(kind="leave", user_id=1, from_date=start, to_date=end, num_days=(end - start).days + 1,
+                  leave_type="annual")
+    return policy.Request(**{**values, **overrides})
+
+
+def test_compiled_rules(strict_policy: policy.Policy):
+    context = policy.Context(today=TODAY)
+
+    def rules(request, admin=False):
+        return [violation.rule for violation in strict_policy.check(request, context, admin=admin)]
+
+    assert rules(_request(date(2031, 4, 1), date(2031, 4, 3))) == []
+    assert rules(_request(date(2031, 3, 5), date(2031, 3, 12))) == ["max_consecutive_days", "notice_days"]
+    assert rules(_request(date(2031, 12, 30), date(2032, 1, 2))) == ["blackout"]
+    assert rules(_request(date(2031, 12, 30), date(2032, 1, 2), leave_type="sick")) == []
+    # Admins only answer to the hard rules.
+    assert rules(_request(date(2031, 3, 5), date(2031, 3, 12)), admin=True) == []
+    assert rules(_request(date(2031, 4, 3), date(2031, 4, 1), num_days=1), admin=True) == ["date_order"]
+    assert rules(_request(date(2031, 4, 1), date(2031, 4, 2), num_days=3)) == ["num_days"]
+    # Moving only the end of a started request doesn't need fresh notice.
+    assert rules(_request(date(2031, 3, 1), date(2031, 3, 4), previous_from_date=date(2031, 3, 1))) == []
+
+    balance = policy.Policy({"require_balance": ["annual"]})
+    assert balance.needs_balance(_request(date(2031, 4, 1), date(2031, 4, 3)))
+    short = policy.Context(today=TODAY, available_balance=2)
+    assert [v.rule for v in balance.check(_request(date(2031, 4, 1), date(2031, 4, 3)), short)] == ["require_balance"]
+
+
+def test_overlaps_are_rejected_and_validate_reports_everything(
+    client: TestClient, db: Session, user_headers: dict, strict_policy: policy.Policy
+):
+    user = crud.get_user_by_email(db, TEST_USER_EMAIL)
+    start = date.today() + timedelta(days=60)
+    payload = {
+        "from_date": str(start), "to_date": str(start + timedelta(days=1)),
+        "leave_type": "annual", "num_days": 2, "user_id": user.id,
+    }
+    response = client.post(f"{API_V1_STR}/leaves", headers=user_headers, json=payload)
+    assert response.status_code == 201, response.text
+    leave_id = response.json()["id"]
+
+    response = client.post(f"{API_V1_STR}/wfh", headers=user_headers, json={
+        "from_date": str(start + timedelta(days=1)), "to_date": str(start + timedelta(days=1)),
+        "num_days": 1, "user_id": user.id,
+    })
+    assert response.status_code == 422
+    assert [v["rule"] for v in response.json()["detail"]] == ["no_overlap"]
+
+    response = client.post(f"{API_V1_STR}/leaves/validate", headers=user_headers, json={
+        **payload, "to_date": str(start + timedelta(days=9)), "num_days": 30,
+    })
+    assert response.status_code == 200
+    report = response.json()
+    assert not report["ok"]
+    assert [v["rule"] for v in report["violations"]] == ["num_days", "no_overlap", "max_consecutive_days"]
+
+    # Updating a request doesn't overlap with itself; reversed dates are rejected.
+    response = client.put(f"{API_V1_STR}/leaves/{leave_id}", headers=user_headers, json={"num_days": 1})
+    assert response.status_code == 200, response.text
+    response = client.put(
+        f"{API_V1_STR}/leaves/{leave_id}", headers=user_headers, json={"to_date": str(start - timedelta(days=1))}
+    )
+    assert response.status_code == 422
+    assert [v["rule"] for v in response.json()["detail"]] == ["date_order"]
@@ -0,0 +1,135 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.db import models, replication
+from app.db.session import Base, RoutingSession, _create_engine, use_primary
+
+
+@pytest.fixture
+def routed(tmp_path):
+    primary = _create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = replication.Replica(_create_engine(f"sqlite:///{tmp_path / 'replica.db'}"), managed=True)
+    replicas = replication.ReplicaSet([replica], max_staleness=60)
+    Base.metadata.create_all(bind=primary)
+    replication.sync_sqlite_replicas(primary, replicas)
+    factory = sessionmaker(class_=RoutingSession, bind=primary, replicas=replicas)
+    yield primary, replicas, factory
+    primary.dispose()
+    replica.engine.dispose()
+
+
+def _session(factory, read_only: bool):
+    db = factory()
+    db.info["read_only"] = read_only
+    return db
+
+
+def _add_user(factory, email: str, user_id=None):
+    token = replication.current_user_id.set(user_id)
+    try:
+        db = _session(factory, read_only=False)
+        db.add(models.User(email=email, hashed_password="x"))
+        db.commit()
+        db.close()
+    finally:
+        replication.current_user_id.reset(token)
+
+
+def _count_users(factory, user_id=None) -> int:
+    token = replication.current_user_id.set(user_id)
+    try:
+        db = _session(factory, read_only=True)
+        try:
+            return db.query(models.User).count()
+        finally:
+            db.close()
+    finally:
+        replication.current_user_id.reset(token)
+
+
+def test_reads_go_to_replica_until_synced(routed):
+    primary, replicas, factory = routed
+    _add_user(factory, "replica-a@example.com")
+    # The replica has not been refreshed yet but is still within tolerance.
+    assert _count_users(factory) == 0
+    replication.sync_sqlite_replicas(primary, replicas)
+    assert _count_users(factory) == 1
+
+
+def test_writer_reads_own_writes(routed):
+    _, _, factory = routed
+    _add_user(factory, "replica-b@example.com", user_id=42)
+    assert _count_users(factory, user_id=42) == 1
+    assert _count_users(factory, user_id=7) == 0
+
+
+def test_stale_replica_falls_back_to_primary(routed):
+    _, replicas, factory = routed
+    replicas.max_staleness = 0
+    _add_user(factory, "replica-c@example.com")
+    assert replicas.choose() is None
+    assert _count_users(factory) == 1
+
+
+def test_use_primary_reroutes_a_read_only_session(routed):
+    _, _, factory = routed
+    _add_user(factory, "replica-d@example.com")
+    db = _session(factory, read_only=True)
+    try:
+        assert db.query(models.User).count() == 0
+        use_primary(db)
+        assert db.query(models.User).count() == 1
+    finally:
+        db.close()
+
+
+def test_replica_freshness_is_shared_between_workers(routed, monkeypatch):
+    _, replicas, _ = routed
+    monkeypatch.setattr(replication, "STAMP_CHECK_SECONDS", 0)
+    # Another worker: it neither synced the replica nor saw any write.
+    other = replication.ReplicaSet(
+        [replication.Replica(replicas.replicas[0].engine, managed=True)], max_staleness=60
+    )
+    assert other.choose() is not None
+
+    # The copy is older than the window (sync stopped): every worker sees it as stale.
+    target = sqlite3.connect(replicas.replicas[0].engine.url.database)
+    with target:
+        target.execute(f"UPDATE {replication.SYNC_TABLE} SET synced_at = synced_at - 120")
+    target.close()
+    assert other.choose() is None
+    assert replicas.choose() is None
+
+
+def _worker(primary, replica) -> TestClient:
+    # A worker process: its own ReplicaSet (and so its own write times) over the shared databases.
+    factory = sessionmaker(
+        class_=RoutingSession, bind=primary, replicas=replication.ReplicaSet([replica], max_staleness=60)
+    )
+
+    async def users(request):
+        if request.method == "POST":
+            _add_user(factory, "replica-d@example.com")
+            return PlainTextResponse("created")
+        return PlainTextResponse(str(_count_users(factory)))
+
+    app = Starlette(routes=[Route("/users", users, methods=["GET", "POST"])])
+    return TestClient(replication.ReadYourWritesMiddleware(app, max_staleness=60))
+
+
+def test_cookie_carries_writes_to_other_workers(routed):
+    primary, replicas, _ = routed
+    first, second = (_worker(primary, replicas.replicas[0]) for _ in range(2))
+    response = first.post("/users")
+    assert "Max-Age=60" in response.headers["set-cookie"]
+    assert second.get("/users").text == "0"  # Another client: the replica is fine
+
+    second.cookies.set(replication.COOKIE, first.cookies[replication.COOKIE])
+    assert second.get("/users").text == "1"
+    assert "set-cookie" not in second.get("/users").headers
@@ -0,0 +1,100 @@
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.core import audit
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, Base, engine
+from app.scheduler import Cron, Scheduler
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "scheduleruser@example.com"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        user = crud.get_user_by_email(db_session, TEST_USER_EMAIL)
+        if user:
+            db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+            db_session.query(models.WFH).filter(models.WFH.user_id == user.id).delete(synchronize_session=False)
+            crud.delete_user(db_session, user.id)
+        db_session.query(models.SchedulerLock).filter(models.SchedulerLock.name.like("test_%")).delete(
+            synchronize_session=False
+        )
+        db_session.commit()
+        db_session.close()
+
+
+def test_cron_matching():
+    every_quarter = Cron("*/15 9-17 * * 1-5")
+    assert every_quarter.matches(datetime(2026, 10, 19, 9, 45))  # Monday
+    assert not every_quarter.matches(datetime(2026, 10, 19, 9, 50))
+    assert not every_quarter.matches(datetime(2026, 10, 18, 9, 45))  # Sunday
+
+    sundays = Cron("0 0 * * 7")
+    assert sundays.matches(datetime(2026, 10, 18))
+    # With both day fields restricted, either one matching is enough.
+    assert Cron("0 0 1 * 1").matches(datetime(2026, 10, 19))
+
+    with pytest.raises(ValueError):
+        Cron("61 * * * *")
+    with pytest.raises(ValueError):
+        Cron("* * *")
+
+
+def test_only_one_process_runs_a_slot(db: Session):
+    runs = []
+    first, second = Scheduler(), Scheduler()
+    second.owner = "other-process"
+    for scheduler in (first, second):
+        scheduler.job("* * * * *", name="test_job")(lambda: runs.append(1) or len(runs))
+
+    slot = datetime(2030, 1, 1, 12, 0)
+    assert first.run_job("test_job", slot) == 1
+    assert second.run_job("test_job", slot) is None
+    assert second.run_job("test_job", slot + timedelta(minutes=1)) == 2
+
+    # An unexpired lease keeps a still-running job from starting twice.
+    assert crud.claim_scheduler_slot(db, "test_lease", slot, "a", lease_seconds=60)
+    assert not crud.claim_scheduler_slot(db, "test_lease", slot + timedelta(minutes=1), "b", lease_seconds=60)
+    crud.release_scheduler_lock(db, "test_lease", "a")
+    assert crud.claim_scheduler_slot(db, "test_lease", slot + timedelta(minutes=1), "b", lease_seconds=60)
+
+
+def test_expire_pending_requests(db: Session):
+    user = crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password="schedulerpassword"))
+    today = date.today()
+
+    def leave(offset: int):
+        return crud.create_user_leave(db, schemas.LeaveCreate(
+            from_date=today + timedelta(days=offset), to_date=today + timedelta(days=offset),
+            leave_type=models.LeaveType.ANNUAL, num_days=1, user_id=user.id,
+        ), user_id=user.id)
+
+    stale = [leave(-3), leave(-2), leave(-1)]
+    upcoming = leave(0)
+    crud.create_user_wfh(db, schemas.WFHCreate(
+        from_date=today - timedelta(days=1), to_date=today, num_days=2, user_id=user.id,
+    ), user_id=user.id)
+
+    with audit.acting_as(user.id):  # Whoever triggered the job, the system is the actor
+        expired = crud.expire_pending_requests(db, today, chunk_size=2)
+    assert expired["leave"] >= 3 and expired["wfh"] >= 1
+    audit.buffer.flush()
+    entry = db.query(models.AuditLog).filter(
+        models.AuditLog.entity == "leave", models.AuditLog.entity_id == stale[0].id
+    ).order_by(models.AuditLog.id.desc()).first()
+    assert entry.action == "updated" and entry.actor_id is None
+    assert json.loads(entry.changes) == {"status": ["pending", "cancelled"]}
+    db.expire_all()
+    assert {db.get(models.Leave, row.id).status for row in stale} == {models.LeaveStatus.CANCELLED}
+    assert db.get(models.Leave, stale[0].id).version == 2
+    assert db.get(models.Leave, upcoming.id).status == models.LeaveStatus.PENDING
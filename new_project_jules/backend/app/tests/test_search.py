@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas, search, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "searchadmin@example.com"
+TEST_USER_EMAIL = "searchuser@example.com"
+PASSWORD = "searchpassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in (TEST_USER_EMAIL, ADMIN_EMAIL):
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                for leave in crud.get_user_leaves(db_session, user.id):
+                    crud.delete_leave_admin(db_session, leave.id)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient, db: Session) -> dict:
+    crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    r = client.post("/api/token", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    return crud.create_user(db, schemas.UserCreate(
+        email=TEST_USER_EMAIL, password=PASSWORD, first_name="Zebediah", last_name="Quorn",
+    ))
+
+
+def _search(client: TestClient, headers: dict, **params):
+    response = client.get(f"{API_V1_STR}/admin/search", headers=headers, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_finds_users_by_partial_name(client: TestClient, admin_headers: dict, test_user: models.User):
+    page = _search(client, admin_headers, q="zebed quo")
+    assert [(hit["kind"], hit["id"]) for hit in page["items"]] == [("user", test_user.id)]
+    assert page["items"][0]["title"] == "Zebediah Quorn"
+
+    crud.edit_user(SessionLocal(), test_user.id, schemas.UserEdit(last_name="Quoxley"))
+    assert _search(client, admin_headers, q="quorn")["items"] == []
+    assert _search(client, admin_headers, q="quoxley", kind="user")["items"][0]["id"] == test_user.id
+
+
+def test_search_comments_with_snippets_and_paging(
+    client: TestClient, db: Session, admin_headers: dict, test_user: models.User
+):
+    start = date.today() + timedelta(days=40)
+    leaves = [
+        crud.create_user_leave(db, schemas.LeaveCreate(
+            from_date=start + timedelta(days=n), to_date=start + timedelta(days=n),
+            leave_type=models.LeaveType.SICK, num_days=1, user_id=test_user.id, comments=comment,
+        ), user_id=test_user.id)
+        for n, comment in enumerate(["Knee surgeryxq <follow-up>", "Recovery after surgeryxq", "Dentist"])
+    ]
+
+    page = _search(client, admin_headers, q="surgeryxq", kind="leave", limit=1)
+    assert len(page["items"]) == 1 and page["next_offset"] == 1
+    hit = page["items"][0]
+    assert hit["user_id"] == test_user.id
+    assert "<mark>" in hit["snippet"] and "&lt;follow-up&gt;" in _search(
+        client, admin_headers, q="knee surgeryxq"
+    )["items"][0]["snippet"]
+    second = _search(client, admin_headers, q="surgeryxq", kind="leave", limit=1, offset=1)
+    assert second["next_offset"] is None
+    assert {hit["id"], second["items"][0]["id"]} == {leaves[0].id, leaves[1].id}
+
+    crud.update_leave_admin(db, leaves[1].id, schemas.LeaveEdit(comments="Recovery"))
+    crud.delete_leave_admin(db, leaves[0].id)
+    assert _search(client, admin_headers, q="surgeryxq")["items"] == []
+
+
+def test_search_rejects_queries_without_words(client: TestClient, admin_headers: dict):
+    response = client.get(f"{API_V1_STR}/admin/search", headers=admin_headers, params={"q": "***"})
+    assert response.status_code == 400
+
+
+def test_like_backend_matches_and_highlights(db: Session):
+    backend = search.LikeBackend()
+    backend.create(db)
+    try:
+        backend.put(db, "leave", 1, 7, "", "Flu & fever, back Monday")
+        backend.put(db, "user", 7, 7, "Fevered Person", "fp@example.com")
+        rows = backend.search(db, ["fever"], list(search.KINDS), 10, 0)
+        assert [(kind, ref_id) for kind, ref_id, *_ in rows] == [("user", 7), ("leave", 1)]
+        assert search._highlight(rows[1][4]) == "Flu &amp; <mark>fever</mark>, back Monday"
+    finally:
+        backend.table.drop(db.connection())
+        db.commit()
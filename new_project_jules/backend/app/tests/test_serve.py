@@ -0,0 +1,145 @@
+import argparse
+import os
+import signal
+import time
+import typing as t
+import urllib.request
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, serve
+from app.core import config
+from app.db.session import Base, engine
+
+
+Base.metadata.create_all(bind=engine)
+
+
+async def whoami(scope, receive, send):
+    """Stub app: answers every request with the worker's pid."""
+    if scope["type"] != "http":
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+
+
+def _args(**overrides) -> argparse.Namespace:
+    args = serve.parse_args(["--host", "127.0.0.1", "--workers", "1", "--graceful-timeout", "1", "--log-level", "warning"])
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    return args
+
+
+def _worker_pid(port: int) -> int:
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2) as response:
+                return int(response.read())
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def _wait_for_other_worker(port: int, old: int) -> int:
+    deadline = time.monotonic() + 10
+    while (pid := _worker_pid(port)) == old:
+        assert time.monotonic() < deadline, "worker was not replaced"
+        time.sleep(0.05)
+    return pid
+
+
+def _gone(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    return False
+
+
+@pytest.fixture
+def arbiter():
+    """Starts an Arbiter for the stub app in a forked master process: (master pid, port)."""
+    masters = []
+
+    def start(**overrides) -> t.Tuple[int, int]:
+        sock = serve._bind("127.0.0.1", 0, 16)
+        port = sock.getsockname()[1]
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve.Arbiter(sock, _args(**overrides), app=whoami).run()
+            finally:
+                os._exit(0)
+        sock.close()
+        masters.append(pid)
+        return pid, port
+
+    yield start
+    for pid in masters:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def test_worker_max_requests(monkeypatch):
+    assert serve.worker_max_requests(0, 50) is None
+    assert serve.worker_max_requests(1000, 0) == 1000
+    monkeypatch.setattr(serve.random, "randint", lambda low, high: high)
+    assert serve.worker_max_requests(1000, 50) == 1050
+    monkeypatch.setattr(serve.random, "randint", lambda low, high: low)
+    assert serve.worker_max_requests(1000, 50) == 1000
+
+
+def test_exited_worker_is_replaced(arbiter):
+    _, port = arbiter()
+    first = _worker_pid(port)
+    os.kill(first, signal.SIGKILL)
+    _wait_for_other_worker(port, first)
+
+
+def test_worker_is_recycled_after_max_requests(arbiter):
+    _, port = arbiter(max_requests=2)
+    first = _worker_pid(port)
+    assert _worker_pid(port) == first
+    _wait_for_other_worker(port, first)
+
+
+def test_hup_restarts_workers(arbiter):
+    master, port = arbiter()
+    first = _worker_pid(port)
+    os.kill(master, signal.SIGHUP)
+    _wait_for_other_worker(port, first)
+    deadline = time.monotonic() + 10
+    while not _gone(first):
+        assert time.monotonic() < deadline, "old worker was not stopped"
+        time.sleep(0.05)
+
+
+def test_workers_leave_migration_and_replica_sync_to_the_master(monkeypatch):
+    migrations = []
+    monkeypatch.setattr(config, "MIGRATE_ON_STARTUP", True)
+    monkeypatch.setattr(config, "REPLICA_SYNC_IN_APP", True)
+    monkeypatch.setattr(serve, "migrate", lambda: migrations.append("master"))
+    monkeypatch.setattr(serve, "_bind", lambda *args: None)
+    monkeypatch.setattr(serve.Arbiter, "run", lambda self: None)
+    serve.main(["--workers", "1"])
+    assert migrations == ["master"] and not config.MIGRATE_ON_STARTUP and not config.REPLICA_SYNC_IN_APP
+
+    # What a forked worker then runs on startup.
+    monkeypatch.setattr(main, "migrate", lambda: migrations.append("worker"))
+    with TestClient(main.app):
+        pass
+    assert migrations == ["master"]
+
+
+def test_master_syncs_replicas(monkeypatch):
+    synced = []
+    monkeypatch.setattr(serve, "replicas", [object()])
+    monkeypatch.setattr(config, "REPLICA_SYNC_INTERVAL_SECONDS", 60)
+    monkeypatch.setattr(serve.replication, "sync_sqlite_replicas", lambda primary, replica_set: synced.append(primary))
+    arbiter = serve.Arbiter(None, _args(), app=whoami)
+    arbiter._sync_replicas()
+    arbiter._sync_replicas()  # Not due again for another interval
+    assert synced == [serve.engine]
@@ -1,6 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
 from app import tasks
 
 
 def test_example_task():
     task_output = tasks.example_task("Hello World")
     assert task_output == "test task returns Hello World"
+
+
+def test_queue_retries_then_succeeds():
+    queue = tasks.JobQueue(concurrency=2, max_retries=3, retry_backoff=0.01)
+    calls = []
+
+    @queue.task()
+    async def flaky(n: int):
+        calls.append(n)
+        if len(calls) < 3:
+            raise RuntimeError("boom")
+
+    async def run():
+        await queue.start()
+        queue.enqueue("flaky", n=1)
+        await queue.stop(timeout=5)
+
+    asyncio.run(run())
+    assert calls == [1, 1, 1]
+
+
+def test_queue_rejects_bad_arguments():
+    with pytest.raises(TypeError):
+        tasks.enqueue("example_task", nope="x")
+    with pytest.raises(KeyError):
+        tasks.enqueue("missing_task")
+
+
+def test_queue_persists_unfinished_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    done = []
+
+    first = tasks.JobQueue(persist_path=path)
+
+    @first.task()
+    def record(value: str):
+        done.append(value)
+
+    # Never started: the job is written to the store on start and drained on stop.
+    async def run(queue):
+        await queue.start()
+        await queue.stop(timeout=5)
+
+    first.enqueue("record", value="a")
+    asyncio.run(run(first))
+    assert done == ["a"]
+
+    # A job left in the table by a previous process is picked up on start.
+    store = tasks._JobStore(path)
+    store.add(tasks.Job(name="record", kwargs={"value": "b"}))
+    store.close()
+    second = tasks.JobQueue(persist_path=path)
+    second.task()(record)
+    asyncio.run(run(second))
+    assert done == ["a", "b"]
+
+
+def test_queues_sharing_a_store_run_each_job_once(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = tasks._JobStore(path)
+    for n in range(10):
+        store.add(tasks.Job(name="record", kwargs={"value": n}))
+    # Claimed by a worker that is still alive: left alone.
+    store.add(tasks.Job(name="record", kwargs={"value": "alive"}), owner="alive")
+    # Claimed by a worker that died: its lease lapses and the job is taken over.
+    dead = store.add(tasks.Job(name="record", kwargs={"value": "dead"}), owner="dead")
+    store._conn.execute("UPDATE job_queue SET lease_until = ? WHERE id = ?", (time.time() - 1, dead))
+    store._conn.commit()
+
+    done = []
+
+    def record(value):
+        done.append(value)
+
+    queues = [tasks.JobQueue(persist_path=path) for _ in range(2)]
+    for queue in queues:
+        queue.task()(record)
+
+    async def run():
+        await asyncio.gather(*(queue.start() for queue in queues))
+        await asyncio.gather(*(queue.stop(timeout=5) for queue in queues))
+
+    asyncio.run(run())
+    assert sorted(done, key=str) == sorted([*range(10), "dead"], key=str)
+    assert store._conn.execute("SELECT owner FROM job_queue").fetchall() == [("alive",)]
+    store.close()
@@ -0,0 +1,108 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+PASSWORD = "teampassword"
+EMAILS = [f"team{i}@example.com" for i in range(5)]
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in EMAILS:
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def org(db: Session) -> dict:
+    # director -> manager -> (alice, bob); carol reports to the director.
+    director = crud.create_user(db, schemas.UserCreate(email=EMAILS[0], password=PASSWORD))
+    manager = crud.create_user(db, schemas.UserCreate(email=EMAILS[1], password=PASSWORD, manager_id=director.id))
+    alice = crud.create_user(db, schemas.UserCreate(email=EMAILS[2], password=PASSWORD, manager_id=manager.id))
+    bob = crud.create_user(db, schemas.UserCreate(email=EMAILS[3], password=PASSWORD, manager_id=manager.id))
+    carol = crud.create_user(db, schemas.UserCreate(email=EMAILS[4], password=PASSWORD, manager_id=director.id))
+    return {"director": director, "manager": manager, "alice": alice, "bob": bob, "carol": carol}
+
+
+def _subtree(db: Session, user_id: int) -> dict:
+    rows = db.query(models.UserClosure).filter(
+        models.UserClosure.ancestor_id == user_id, models.UserClosure.depth > 0
+    )
+    return {row.descendant_id: row.depth for row in rows}
+
+
+def test_closure_tracks_reassignment(db: Session, org: dict):
+    d, m, a, b, c = (org[k].id for k in ("director", "manager", "alice", "bob", "carol"))
+    assert _subtree(db, d) == {m: 1, a: 2, b: 2, c: 1}
+
+    # Move the manager's whole team under carol.
+    crud.edit_user(db, m, schemas.UserEdit(manager_id=c))
+    assert _subtree(db, c) == {m: 1, a: 2, b: 2}
+    assert _subtree(db, d) == {c: 1, m: 2, a: 3, b: 3}
+
+    with pytest.raises(HTTPException) as exc:
+        crud.edit_user(db, c, schemas.UserEdit(manager_id=a))
+    assert exc.value.status_code == 400
+
+    crud.edit_user(db, m, schemas.UserEdit(manager_id=d))
+    assert _subtree(db, d) == {m: 1, a: 2, b: 2, c: 1}
+
+
+def test_team_endpoints(client: TestClient, db: Session, org: dict):
+    today = date.today()
+    leave = crud.create_user_leave(db, schemas.LeaveCreate(
+        from_date=today, to_date=today, leave_type=models.LeaveType.SICK, num_days=1, user_id=org["alice"].id,
+    ), user_id=org["alice"].id)
+    crud.update_leave_admin(db, leave.id, schemas.LeaveEdit(status=models.LeaveStatus.APPROVED))
+
+    r = client.post("/api/token", data={"username": EMAILS[0], "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    response = client.get(f"{API_V1_STR}/team/leaves", headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item["id"] for item in response.json()] == [leave.id]
+
+    response = client.get(f"{API_V1_STR}/team/availability", headers=headers, params={"date": str(today)})
+    assert response.json() == {"date": str(today), "team_size": 4, "on_leave": [org["alice"].id], "wfh": []}
+
+    # Non-admins can't look at someone else's team.
+    response = client.get(f"{API_V1_STR}/team/leaves", headers=headers, params={"manager_id": org["carol"].id})
+    assert response.status_code == 403
+
+
+def test_removing_a_manager_promotes_reports(db: Session, org: dict):
+    d, m, a, b = (org[k].id for k in ("director", "manager", "alice", "bob"))
+    db.query(models.Leave).filter(models.Leave.user_id == a).delete(synchronize_session=False)
+    crud.delete_user(db, m)
+    assert _subtree(db, d) == {a: 1, b: 1, org["carol"].id: 1}
+    db.expire_all()
+    assert db.get(models.User, a).manager_id == d
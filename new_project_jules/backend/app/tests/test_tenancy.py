@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.migrate import migrate
+from app.db import crud, schemas, tenancy
+from app.db.session import SessionLocal, Base, engine, tenants
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "tenantadmin@example.com"
+DEFAULT_EMAIL = "tenantdefault@example.com"
+PASSWORD = "tenantpassword"
+
+
+@pytest.fixture(scope="module")
+def acme(tmp_path_factory):
+    # Register a throwaway tenant with its own SQLite file.
+    tenants._urls["acme"] = f"sqlite:///{tmp_path_factory.mktemp('acme') / 'acme.db'}"
+    migrate(["acme"])
+    with tenancy.use("acme"), SessionLocal() as db:
+        admin = crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    with SessionLocal() as db:
+        crud.create_user(db, schemas.UserCreate(email=DEFAULT_EMAIL, password=PASSWORD))
+    yield admin
+    with SessionLocal() as db:
+        user = crud.get_user_by_email(db, DEFAULT_EMAIL)
+        if user:
+            crud.delete_user(db, user.id)
+    tenants._engines.pop("acme").dispose()
+    del tenants._urls["acme"]
+
+
+@pytest.fixture(scope="module")
+def client(acme) -> TestClient:
+    with TestClient(app) as c:
+        yield c
+
+
+def _token(client: TestClient, email: str, host: str = "testserver") -> str:
+    r = client.post("/api/token", data={"username": email, "password": PASSWORD}, headers={"Host": host})
+    assert r.status_code == 200, r.text
+    return r.json()["access_token"]
+
+
+def test_tenant_from_host_and_token(client: TestClient, acme):
+    # The acme user only exists in acme's database.
+    with SessionLocal() as db:
+        assert crud.get_user_by_email(db, ADMIN_EMAIL) is None
+    r = client.post("/api/token", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    assert r.status_code == 401
+
+    token = _token(client, ADMIN_EMAIL, host="acme.example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    # The tid claim selects the tenant when the host doesn't name one.
+    response = client.get(f"{API_V1_STR}/users/me", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["email"] == ADMIN_EMAIL
+    assert response.json()["id"] == acme.id
+
+    response = client.get(f"{API_V1_STR}/admin/tenants", headers=headers)
+    assert [row["tenant"] for row in response.json()] == ["acme"]
+    assert response.json()[0]["requests"] >= 2
+
+
+def test_token_from_another_tenant_is_rejected(client: TestClient, acme):
+    token = _token(client, DEFAULT_EMAIL)
+    headers = {"Authorization": f"Bearer {token}", "Host": "acme.example.com"}
+    assert client.get(f"{API_V1_STR}/users/me", headers=headers).status_code == 401
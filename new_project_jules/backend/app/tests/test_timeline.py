@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+TEST_USER_EMAIL = "timelineuser@example.com"
+TEST_USER_PASSWORD = "timelinepassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        user = crud.get_user_by_email(db_session, TEST_USER_EMAIL)
+        if user:
+            db_session.query(models.Leave).filter(models.Leave.user_id == user.id).delete(synchronize_session=False)
+            db_session.query(models.WFH).filter(models.WFH.user_id == user.id).delete(synchronize_session=False)
+            db_session.delete(user)
+            db_session.commit()
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def test_user(db: Session) -> models.User:
+    user = crud.get_user_by_email(db, TEST_USER_EMAIL)
+    if not user:
+        user = crud.create_user(db, schemas.UserCreate(email=TEST_USER_EMAIL, password=TEST_USER_PASSWORD))
+    return user
+
+
+@pytest.fixture(scope="module")
+def auth_token_headers(client: TestClient, test_user: models.User) -> dict:
+    r = client.post("/api/token", data={"username": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_timeline_merges_and_pages(client: TestClient, db: Session, test_user: models.User, auth_token_headers: dict):
+    base = date(2030, 3, 1)
+
+    def leave(offset: int):
+        return crud.create_user_leave(db, schemas.LeaveCreate(
+            from_date=base + timedelta(days=offset), to_date=base + timedelta(days=offset + 1),
+            leave_type=models.LeaveType.ANNUAL, num_days=2, user_id=test_user.id,
+        ), user_id=test_user.id)
+
+    def wfh(offset: int):
+        return crud.create_user_wfh(db, schemas.WFHCreate(
+            from_date=base + timedelta(days=offset), to_date=base + timedelta(days=offset),
+            num_days=1, user_id=test_user.id,
+        ), user_id=test_user.id)
+
+    l1, w1, l2, w2 = leave(0), wfh(0), leave(5), wfh(3)
+    outside = leave(60)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"from": str(base), "to": str(base + timedelta(days=30)), "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"{API_V1_STR}/timeline", headers=auth_token_headers, params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        seen.extend((item["kind"], item["id"]) for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [("leave", l1.id), ("wfh", w1.id), ("wfh", w2.id), ("leave", l2.id)]
+    assert ("leave", outside.id) not in seen
+
+
+def test_timeline_rejects_inverted_window(client: TestClient, auth_token_headers: dict):
+    response = client.get(
+        f"{API_V1_STR}/timeline", headers=auth_token_headers, params={"from": "2030-02-01", "to": "2030-01-01"}
+    )
+    assert response.status_code == 400
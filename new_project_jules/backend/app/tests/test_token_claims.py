@@ -0,0 +1,167 @@
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas, models
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core import config, security, revocation
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "claimsadmin@example.com"
+USER_EMAIL = "claimsuser@example.com"
+DELETED_EMAIL = "claimsdeleted@example.com"
+PASSWORD = "claimspassword"
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        db_session.query(models.User).filter(
+            models.User.email.in_([ADMIN_EMAIL, USER_EMAIL, DELETED_EMAIL])
+        ).delete(synchronize_session=False)
+        db_session.commit()
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+def _get_or_create(db: Session, email: str, is_superuser: bool) -> models.User:
+    user = crud.get_user_by_email(db, email=email)
+    if not user:
+        user = crud.create_user(
+            db,
+            schemas.UserCreate(
+                email=email, password=PASSWORD, is_active=True, is_superuser=is_superuser
+            ),
+        )
+    return user
+
+
+def _login(client: TestClient, email: str) -> dict:
+    r = client.post("/api/token", data={"username": email, "password": PASSWORD})
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_token_carries_claims(client: TestClient, db: Session):
+    admin = _get_or_create(db, ADMIN_EMAIL, is_superuser=True)
+    headers = _login(client, ADMIN_EMAIL)
+    token = headers["Authorization"].split()[1]
+    payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+    assert payload["uid"] == admin.id
+    assert payload["permissions"] == "admin"
+    assert payload["ver"] == admin.token_version
+
+
+def test_superuser_check_skips_user_query(client: TestClient, db: Session, monkeypatch):
+    _get_or_create(db, ADMIN_EMAIL, is_superuser=True)
+    headers = _login(client, ADMIN_EMAIL)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("user row should not be loaded")
+
+    monkeypatch.setattr(db, "get", fail)
+    response = client.get(f"{API_V1_STR}/admin/users/0/leaves", headers=headers)
+    # The admin check passes on claims alone; the handler itself reports the missing user.
+    assert response.status_code == 404
+
+
+def test_non_admin_claims_are_forbidden(client: TestClient, db: Session):
+    _get_or_create(db, USER_EMAIL, is_superuser=False)
+    headers = _login(client, USER_EMAIL)
+    response = client.get(f"{API_V1_STR}/users", headers=headers)
+    assert response.status_code == 403
+
+
+def test_edit_user_revokes_old_tokens(client: TestClient, db: Session):
+    user = _get_or_create(db, USER_EMAIL, is_superuser=False)
+    headers = _login(client, USER_EMAIL)
+    assert client.get(f"{API_V1_STR}/users/me", headers=headers).status_code == 200
+
+    crud.edit_user(db, user.id, schemas.UserEdit(is_superuser=True))
+    response = client.get(f"{API_V1_STR}/users/me", headers=headers)
+    assert response.status_code == 401
+
+    # Non-security edits keep existing tokens valid.
+    new_headers = _login(client, USER_EMAIL)
+    crud.edit_user(db, user.id, schemas.UserEdit(first_name="Renamed"))
+    assert client.get(f"{API_V1_STR}/users/me", headers=new_headers).status_code == 200
+
+
+def test_token_version_map_loads_lazily(client: TestClient, db: Session):
+    user = _get_or_create(db, USER_EMAIL, is_superuser=False)
+    headers = _login(client, USER_EMAIL)
+    revocation.clear()
+    assert client.get(f"{API_V1_STR}/users/me", headers=headers).status_code == 200
+    assert revocation.lookup(db, user.id) == (user.token_version, True)
+
+
+def test_cached_versions_expire(client: TestClient, db: Session, monkeypatch):
+    user = _get_or_create(db, USER_EMAIL, is_superuser=False)
+    headers = _login(client, USER_EMAIL)
+    assert client.get(f"{API_V1_STR}/users/me", headers=headers).status_code == 200
+
+    # Changed behind the app's back, e.g. by another worker or by hand.
+    db.query(models.User).filter(models.User.id == user.id).update(
+        {models.User.token_version: models.User.token_version + 1}, synchronize_session=False
+    )
+    db.commit()
+    assert client.get(f"{API_V1_STR}/users/me", headers=headers).status_code == 200
+
+    later = time.monotonic() + config.REVOCATION_CACHE_TTL_SECONDS + 1
+    monkeypatch.setattr(revocation, "_clock", lambda: later)
+    assert client.get(f"{API_V1_STR}/users/me", headers=headers).status_code == 401
+
+
+def test_edit_user_bumps_token_version_only_on_change(client: TestClient, db: Session):
+    user = _get_or_create(db, USER_EMAIL, is_superuser=False)
+    version = crud.edit_user(db, user.id, schemas.UserEdit(first_name="Same")).token_version
+
+    # Security fields set to the values they already have are not a change.
+    edited = crud.edit_user(db, user.id, schemas.UserEdit(email=USER_EMAIL, is_active=True))
+    assert edited.token_version == version
+
+    edited = crud.edit_user(db, user.id, schemas.UserEdit(email=USER_EMAIL, is_active=False))
+    assert edited.token_version == version + 1
+    assert revocation.lookup(db, user.id) == (version + 1, False)
+    crud.edit_user(db, user.id, schemas.UserEdit(is_active=True))
+
+
+def test_edit_unknown_user_is_not_found(client: TestClient, db: Session):
+    for edit in (schemas.UserEdit(first_name="Nobody"), schemas.UserEdit()):
+        with pytest.raises(HTTPException) as e:
+            crud.edit_user(db, 0, edit)
+        assert e.value.status_code == 404
+
+
+def test_delete_user_returns_the_deleted_row(client: TestClient, db: Session):
+    user_id = _get_or_create(db, DELETED_EMAIL, is_superuser=False).id
+    deleted = crud.delete_user(db, user_id)
+    # Still readable after the commit: the values come from the RETURNING row.
+    assert (deleted.id, deleted.email) == (user_id, DELETED_EMAIL)
+    assert db.get(models.User, user_id) is None
+    assert revocation.lookup(db, user_id) is None
+
+    with pytest.raises(HTTPException) as e:
+        crud.delete_user(db, user_id)
+    assert e.value.status_code == 404
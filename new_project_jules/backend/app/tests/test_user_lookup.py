@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.db import crud, schemas
+from app.db.session import SessionLocal, get_db, Base, engine
+from app.core.config import API_V1_STR
+
+
+Base.metadata.create_all(bind=engine)
+
+ADMIN_EMAIL = "typeaheadadmin@example.com"
+PASSWORD = "lookuppassword"
+PEOPLE = [
+    ("Lookupa.Vexley@example.com", "Lookupa", "Vexley", True),
+    ("lookupb.vexton@example.com", "Lookupb", "Vexton", True),
+    ("z.other@example.com", "Vexilla", "Lookupsson", True),
+    ("lookupc.gone@example.com", "Lookupc", "Gone", False),
+]
+
+
+@pytest.fixture(scope="module")
+def db() -> Session:
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    finally:
+        for email in [ADMIN_EMAIL] + [person[0] for person in PEOPLE]:
+            user = crud.get_user_by_email(db_session, email)
+            if user:
+                crud.delete_user(db_session, user.id)
+        db_session.close()
+
+
+@pytest.fixture(scope="module")
+def client(db: Session) -> TestClient:
+    def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    del app.dependency_overrides[get_db]
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient, db: Session) -> dict:
+    crud.create_user(db, schemas.UserCreate(email=ADMIN_EMAIL, password=PASSWORD, is_superuser=True))
+    for email, first_name, last_name, is_active in PEOPLE:
+        crud.create_user(db, schemas.UserCreate(
+            email=email, password=PASSWORD, first_name=first_name, last_name=last_name, is_active=is_active,
+        ))
+    r = client.post("/api/token", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _lookup(client: TestClient, headers: dict, **params):
+    response = client.get(f"{API_V1_STR}/users/lookup", headers=headers, params=params)
+    assert response.status_code == 200, response.text
+    return [user["email"] for user in response.json()]
+
+
+def test_lookup_matches_email_and_name_prefixes(client: TestClient, admin_headers: dict):
+    assert _lookup(client, admin_headers, prefix="LOOKUP") == [
+        "Lookupa.Vexley@example.com", "lookupb.vexton@example.com", "z.other@example.com",
+    ]
+    assert _lookup(client, admin_headers, prefix="lookup", limit=1) == ["Lookupa.Vexley@example.com"]
+    assert _lookup(client, admin_headers, prefix="vex") == [
+        "Lookupa.Vexley@example.com", "lookupb.vexton@example.com", "z.other@example.com",
+    ]
+    assert _lookup(client, admin_headers, prefix="lookupb vext") == ["lookupb.vexton@example.com"]
+    assert "lookupc.gone@example.com" in _lookup(client, admin_headers, prefix="lookupc", include_inactive=True)
+    assert _lookup(client, admin_headers, prefix="lookupc") == []
+
+
+def test_users_list_reports_range_and_cached_total(client: TestClient, db: Session, admin_headers: dict):
+    total = len(crud.get_users(db, limit=10000))
+    response = client.get(f"{API_V1_STR}/users", headers=admin_headers, params={"skip": 1, "limit": 2})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert response.headers["Content-Range"] == f"1-2/{total}"
+
+    user = crud.create_user(db, schemas.UserCreate(email="lookup-count@example.com", password=PASSWORD))
+    response = client.get(f"{API_V1_STR}/users", headers=admin_headers, params={"skip": 10000})
+    assert response.headers["Content-Range"] == f"*/{total + 1}"
+    crud.delete_user(db, user.id)
+    assert crud.count_users(db) == total
@@ -3,7 +3,8 @@ import {
   Box, Typography, Select, MenuItem, FormControl, InputLabel,
   CircularProgress, Grid, Paper, Button, SelectChangeEvent, Modal,
   Dialog, DialogActions, DialogContent, DialogContentText, DialogTitle,
-  List, ListItem, ListItemText, IconButton, Checkbox, FormControlLabel
+  ListItem, ListItemText, IconButton, Checkbox, FormControlLabel,
+  Autocomplete, TextField
 } from '@mui/material';
 import { DataGrid, GridColDef, GridRowsProp } from '@mui/x-data-grid';
 import AddCircleOutlineIcon from '@mui/icons-material/AddCircleOutline';
@@ -45,6 +46,10 @@ interface WFH {
 }
 
 const API_BASE_URL = 'http://localhost:8000/api/v1'; // Assuming API is on port 8000
+const USER_LOOKUP_LIMIT = 20;
+const USER_LOOKUP_DEBOUNCE_MS = 250;
+
+const userLabel = (user: User) => `${user.first_name || ''} ${user.last_name || ''}`.trim() || user.email;
 
 const leaveColumns: GridColDef[] = [
   { field: 'id', headerName: 'ID', width: 70 },
@@ -91,7 +96,8 @@ const wfhColumns: GridColDef[] = [
 
 
 export default function AdminLeaveWFHManagementPage() {
-  const [users, setUsers] = useState<User[]>([]);
+  const [users, setUsers] = useState<User[]>([]); // Matches for userQuery
+  const [userQuery, setUserQuery] = useState<string>('');
   const [selectedUserId, setSelectedUserId] = useState<string>('');
   const [userLeaves, setUserLeaves] = useState<GridRowsProp>([]);
   const [userWFHs, setUserWFHs] = useState<GridRowsProp>([]);
@@ -196,30 +202,38 @@ export default function AdminLeaveWFHManagementPage() {
   };
 
 
-  // Fetch all users
+  // Look up users as the admin types, instead of loading every user up front
   useEffect(() => {
-    const fetchUsers = async () => {
+    const prefix = userQuery.trim();
+    if (!prefix || !token) {
+      setUsers([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
       setLoadingUsers(true);
       setError(null);
       try {
-        const response = await fetch(`${API_BASE_URL}/users`, {
+        const params = new URLSearchParams({ prefix, limit: String(USER_LOOKUP_LIMIT) });
+        const response = await fetch(`${API_BASE_URL}/users/lookup?${params}`, {
           headers: { 'Authorization': `Bearer ${token}` },
+          signal: controller.signal,
         });
         if (!response.ok) throw new Error(`Failed to fetch users: ${response.statusText}`);
         const data: User[] = await response.json();
         setUsers(data);
       } catch (e) {
+        if (controller.signal.aborted) return;
         setError(e instanceof Error ? e.message : String(e));
       } finally {
-        setLoadingUsers(false);
+        if (!controller.signal.aborted) setLoadingUsers(false);
       }
+    }, USER_LOOKUP_DEBOUNCE_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
     };
-    if (token) {
-      fetchUsers();
-    } else {
-      setError("Authentication token not found.");
-    }
-  }, [token]);
+  }, [userQuery, token]);
 
   // Fetch leaves and WFH for selected user
   useEffect(() => {
@@ -247,19 +261,10 @@ export default function AdminLeaveWFHManagementPage() {
 
   }, [selectedUserId, token]);
 
-  const handleUserChange = (event: SelectChangeEvent<string>) => {
-    const newUserId = event.target.value;
-    setSelectedUserId(newUserId);
-    if (newUserId) {
-      // Option 1: Fetch user details immediately on change
-      // fetchUserDetails(newUserId);
-      // Option 2: Or rely on the useEffect above, which is cleaner.
-      // If users array already contains full details, find and set it here.
-      const user = users.find(u => u.id.toString() === newUserId);
-      setSelectedUserDetails(user || null);
-    } else {
-      setSelectedUserDetails(null);
-    }
+  const handleUserChange = (user: User | null) => {
+    setSelectedUserId(user ? String(user.id) : '');
+    // The lookup only returns names; the effect above loads the full details.
+    setSelectedUserDetails(user);
   };
 
   const handleOpenAdjustDaysModal = () => {
@@ -526,35 +531,56 @@ export default function AdminLeaveWFHManagementPage() {
               Create User
             </Button>
           </Box>
-          {loadingUsers && <CircularProgress />}
-          {error && <Typography color="error">Error fetching users: {error}</Typography>}
-          {!loadingUsers && users.length === 0 && !error && <Typography>No users found.</Typography>}
-          {!loadingUsers && users.length > 0 && (
-            <List dense sx={{ maxHeight: 300, overflow: 'auto', border: '1px solid #ddd', borderRadius: 1 }}>
-              {users.map((user) => (
+          <Autocomplete
+            options={users}
+            value={users.find(user => String(user.id) === selectedUserId) || selectedUserDetails}
+            onChange={(_, user) => handleUserChange(user)}
+            inputValue={userQuery}
+            onInputChange={(_, value) => setUserQuery(value)}
+            filterOptions={(options) => options} // Already filtered by /users/lookup
+            getOptionLabel={userLabel}
+            isOptionEqualToValue={(option, value) => option.id === value.id}
+            loading={loadingUsers}
+            noOptionsText={userQuery.trim() ? 'No users found.' : 'Type a name or email'}
+            renderOption={(props, user) => {
+              const { key, ...optionProps } = props;
+              return (
                 <ListItem
-                  key={user.id}
+                  key={key}
+                  {...optionProps}
                   secondaryAction={
-                    <IconButton edge="end" aria-label="delete" onClick={() => handleOpenDeleteUserDialog(user)} disabled={deletingUser && userToDelete?.id === user.id}>
+                    <IconButton
+                      edge="end"
+                      aria-label="delete"
+                      onClick={(event) => { event.stopPropagation(); handleOpenDeleteUserDialog(user); }}
+                      disabled={deletingUser && userToDelete?.id === user.id}
+                    >
                       {deletingUser && userToDelete?.id === user.id ? <CircularProgress size={20} /> : <DeleteForeverIcon />}
                     </IconButton>
                   }
-                  sx={{
-                    backgroundColor: selectedUserId === String(user.id) ? 'action.selected' : 'transparent',
-                    '&:hover': { backgroundColor: 'action.hover' },
-                    cursor: 'pointer',
-                    pr: 8, // Ensure space for the delete icon
-                  }}
-                  onClick={() => handleUserChange({ target: { value: String(user.id) } } as SelectChangeEvent<string>)}
+                  sx={{ pr: 8 }} // Ensure space for the delete icon
                 >
-                  <ListItemText
-                    primary={`${user.first_name || ''} ${user.last_name || ''}`.trim() || user.email}
-                    secondary={`ID: ${user.id} | Email: ${user.email}`}
-                  />
+                  <ListItemText primary={userLabel(user)} secondary={`ID: ${user.id} | Email: ${user.email}`} />
                 </ListItem>
-              ))}
-            </List>
-          )}
+              );
+            }}
+            renderInput={(params) => (
+              <TextField
+                {...params}
+                label="Search users by name or email"
+                InputProps={{
+                  ...params.InputProps,
+                  endAdornment: (
+                    <>
+                      {loadingUsers && <CircularProgress color="inherit" size={20} />}
+                      {params.InputProps.endAdornment}
+                    </>
+                  ),
+                }}
+              />
+            )}
+          />
+          {error && <Typography color="error">Error fetching users: {error}</Typography>}
         </Paper>
 
         <Typography variant="h4" gutterBottom sx={{ mb: 3 }}>
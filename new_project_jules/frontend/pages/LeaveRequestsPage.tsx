@@ -125,6 +125,21 @@ const LeaveRequestsPage: React.FC = () => {
     fetchLeaveRequests();
   }, [fetchLeaveRequests]);
 
+  // Refresh when the server pushes a change to one of our leave requests,
+  // instead of polling the full list.
+  useEffect(() => {
+    const token = localStorage.getItem('accessToken');
+    if (!token) {
+      return;
+    }
+    const source = new EventSource(
+      `http://localhost:8000/api/v1/events?access_token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener('leave', () => fetchLeaveRequests());
+    source.addEventListener('resync', () => fetchLeaveRequests());
+    return () => source.close();
+  }, [fetchLeaveRequests]);
+
 
   const handleOnDutyChange = (event: React.ChangeEvent<HTMLInputElement>) => {
     setOnDuty(event.target.checked);
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import {
   Box, Typography, Grid, TextField, Select, MenuItem, IconButton, InputLabel, FormControl, Paper, Button, Switch, FormGroup, FormControlLabel
 } from '@mui/material';
@@ -13,6 +13,19 @@ import DeleteOutlineIcon from '@mui/icons-material/DeleteOutline';
 // import SyncProblemIcon from '@mui/icons-material/SyncProblem'; // Example for a tilde icon, or use Typography - Not needed for WFH
 import { DataGrid, GridColDef, GridRowsProp } from '@mui/x-data-grid';
 
+// A work from home request as returned by GET /wfh
+interface WorkFromHomeRequest {
+  id: number;
+  user_id: number;
+  from_date: string;
+  to_date: string;
+  num_days: number;
+  status: string;
+  comments: string | null;
+}
+
+const capitalize = (value: string) => value.charAt(0).toUpperCase() + value.slice(1);
+
 const WorkFromHomeRequestsPage: React.FC = () => {
   const [requestType, setRequestType] = useState(''); // Changed from leaveType
   const [days, setDays] = useState(''); // Kept for now, might be relevant for WFH duration
@@ -21,17 +34,72 @@ const WorkFromHomeRequestsPage: React.FC = () => {
   const [statusFilter, setStatusFilter] = useState('');
   // const [onDuty, setOnDuty] = useState(false); // Removed 'On Duty' switch, less relevant for WFH requests
 
-  // Placeholder for request count
-  const requestCount = 5; // Adjusted sample count
+  const [workFromHomeRequests, setWorkFromHomeRequests] = useState<GridRowsProp>([]);
+  const [loading, setLoading] = useState<boolean>(true);
+  const [error, setError] = useState<string | null>(null);
 
-  // Sample Data for Work From Home Requests Table
-  const workFromHomeRequestsData: GridRowsProp = [
-    { id: 1, user: 'Alice Wonderland', requestType: 'Full Week', days: 5, fromDate: '2024-07-22', toDate: '2024-07-26', status: 'Approved', comments: 'Project X deadline focus' },
-    { id: 2, user: 'Bob The Builder', requestType: 'Partial Week', days: 3, fromDate: '2024-07-22', toDate: '2024-07-24', status: 'Pending', comments: 'Doctor appointment on Thursday' },
-    { id: 3, user: 'Charlie Brown', requestType: 'Full Week', days: 5, fromDate: '2024-07-29', toDate: '2024-08-02', status: 'Approved', comments: 'Family visiting' },
-    { id: 4, user: 'Diana Prince', requestType: 'Specific Days', days: 2, fromDate: '2024-08-05', toDate: '2024-08-06', status: 'Rejected', comments: 'Needs to be in office for client meeting' },
-    { id: 5, user: 'Edward Scissorhands', requestType: 'Full Week', days: 5, fromDate: '2024-08-12', toDate: '2024-08-16', status: 'Pending', comments: 'Deep work on new feature' },
-  ];
+  const fetchWorkFromHomeRequests = useCallback(async () => {
+    setLoading(true);
+    setError(null);
+    try {
+      const token = localStorage.getItem('accessToken');
+      if (!token) {
+        setError("Authentication token not found. Please log in again.");
+        return;
+      }
+
+      const response = await fetch('http://localhost:8000/api/v1/wfh', {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        },
+      });
+
+      if (response.status === 401) {
+        setError("Unauthorized: Invalid or expired token. Please log in again.");
+        return;
+      }
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const data: WorkFromHomeRequest[] = await response.json();
+
+      setWorkFromHomeRequests(data.map(req => ({
+        id: req.id,
+        user: `User ${req.user_id}`, // Placeholder, replace with actual user name if available
+        requestType: '-',
+        days: req.num_days,
+        fromDate: new Date(req.from_date).toLocaleDateString(),
+        toDate: new Date(req.to_date).toLocaleDateString(),
+        status: capitalize(req.status), // The status column colours 'Approved' / 'Rejected'
+        comments: req.comments || '-',
+      })));
+    } catch (e) {
+      setError(e instanceof Error ? e.message : 'An unknown error occurred');
+      console.error("Failed to fetch work from home requests:", e);
+    } finally {
+      setLoading(false);
+    }
+  }, []);
+
+  useEffect(() => {
+    fetchWorkFromHomeRequests();
+  }, [fetchWorkFromHomeRequests]);
+
+  // Refresh when the server pushes a change to one of our WFH requests,
+  // instead of polling the full list.
+  useEffect(() => {
+    const token = localStorage.getItem('accessToken');
+    if (!token) {
+      return;
+    }
+    const source = new EventSource(
+      `http://localhost:8000/api/v1/events?access_token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener('wfh', () => fetchWorkFromHomeRequests());
+    source.addEventListener('resync', () => fetchWorkFromHomeRequests());
+    return () => source.close();
+  }, [fetchWorkFromHomeRequests]);
 
   const columns: GridColDef[] = [
     { field: 'user', headerName: 'Employee', width: 180 },
@@ -157,7 +225,7 @@ const WorkFromHomeRequestsPage: React.FC = () => {
               </Select>
             </FormControl>
             <Typography variant="body2" sx={{ color: 'text.secondary' }}>
-              {requestCount} requests
+              {workFromHomeRequests.length} requests
             </Typography>
           </Box>
 
@@ -186,9 +254,12 @@ const WorkFromHomeRequestsPage: React.FC = () => {
           Work From Home Requests List
         </Typography>
 
+        {error && <Typography color="error" sx={{ mb: 2 }}>{error}</Typography>}
+
         <Paper sx={{ height: 600, width: '100%' }}>
           <DataGrid
-            rows={workFromHomeRequestsData} // Changed data source
+            rows={workFromHomeRequests}
+            loading={loading}
             columns={columns}
             initialState={{
               pagination: {